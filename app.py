@@ -1,13 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g
 from flask_login import LoginManager, login_required, current_user
 from config import config
 from database import db
+from events import event_bus
+from group_commit import bet_batcher
+from jobs import job_workers
+from json_provider import MongoJSONProvider
+from scheduler import ledger_compactor, ticket_scheduler
 import os
 
 
 def create_app(config_name=None):
     """Application factory pattern"""
     app = Flask(__name__)
+    app.json = MongoJSONProvider(app)
 
     # Load configuration
     config_name = config_name or os.environ.get('FLASK_ENV', 'default')
@@ -15,6 +21,11 @@ def create_app(config_name=None):
 
     # Initialize database
     db.init_app(app)
+    event_bus.init_app(app)
+    bet_batcher.init_app(app)
+    ticket_scheduler.init_app(app)
+    ledger_compactor.init_app(app)
+    job_workers.init_app(app)
 
     # Initialize extensions
     login_manager = LoginManager()
@@ -23,11 +34,13 @@ def create_app(config_name=None):
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
 
-    # User loader function
+    # User loader function (cached, without the password hash)
+    from models.user import User
+    User.configure_session_cache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
     @login_manager.user_loader
     def load_user(user_id):
-        from models.user import User
-        return User.get_by_id(user_id)
+        return User.get_session_user(user_id)
 
     # Register blueprints
     from routes.auth import auth_bp
@@ -40,6 +53,10 @@ def create_app(config_name=None):
     app.register_blueprint(tickets_bp, url_prefix='/tickets')
     app.register_blueprint(bets_bp, url_prefix='/bets')
 
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
     # Main routes
     @app.route('/')
     def index():
@@ -75,6 +92,18 @@ def create_app(config_name=None):
             return value.strftime('%B %d, %Y at %I:%M %p')
         return 'N/A'
 
+    # Report how many lookups the request-scoped identity map saved
+    @app.after_request
+    def report_identity_map(response):
+        identity_map = g.get('identity_map')
+        if identity_map is not None:
+            app.logger.debug('%s: identity map %d hits, %d misses',
+                             request.endpoint, identity_map.hits, identity_map.misses)
+            if app.debug:
+                response.headers['X-Identity-Map'] = \
+                    f'hits={identity_map.hits}; misses={identity_map.misses}'
+        return response
+
     # Context processors
     @app.context_processor
     def inject_user():
@@ -0,0 +1,49 @@
+"""Helpers shared by the background thread pools in scheduler.py and jobs.py"""
+import os
+import socket
+import threading
+from typing import Callable
+from bson import ObjectId
+
+
+def worker_id() -> str:
+    """A name for the calling worker that is unique across hosts and processes"""
+    return f'{socket.gethostname()}:{os.getpid()}:{ObjectId()}'
+
+
+class ProcessThreads:
+    """A process's daemon threads running target, started on demand.
+
+    ensure_running is cheap enough to call on every request: it only takes
+    the lock to start the threads, which it does again in a forked child or
+    once any of them has died.
+    """
+
+    def __init__(self, target: Callable[[], None], name: str, count: int = 1):
+        self.target = target
+        self.name = name
+        self.count = count
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def running(self) -> bool:
+        """Check whether this process's threads are all alive"""
+        return bool(self._threads) and self._pid == os.getpid() and all(
+            thread.is_alive() for thread in self._threads)
+
+    def ensure_running(self):
+        """Start this process's threads if they are not running"""
+        if self.running():
+            return
+        with self._lock:
+            if self.running():
+                return
+            self._threads = [
+                threading.Thread(target=self.target, daemon=True,
+                                 name=self.name if self.count == 1 else f'{self.name}-{i}')
+                for i in range(self.count)
+            ]
+            self._pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
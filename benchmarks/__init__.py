@@ -0,0 +1 @@
+"""Benchmarks for Fantasy Betting League hot paths"""
@@ -0,0 +1,101 @@
+"""Polling cost of the league JSON APIs with and without conditional requests.
+
+Logs a member in through the real routes and polls the leaderboard, tickets
+and recent-bets APIs the way an open league page does. The plain client
+re-downloads every response; the conditional client sends If-None-Match and
+gets a 304 until the league version changes (every --change-every polls).
+Reports response bytes and server CPU time per request.
+
+    python -m benchmarks.bench_etag --members 200 --polls 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from benchmarks.common import create_bench_app, register_user, seed_league, seed_ticket
+from database import db
+from models.league import League
+from models.stats import STATS_COUNTERS
+
+ENDPOINTS = ('/leagues/api/{}/leaderboard', '/tickets/api/{}/tickets', '/bets/api/{}/recent-bets')
+
+
+def seed(members, tickets):
+    """Seed a league with tickets and one bet per member on each; return its id"""
+    league_id, user_ids = seed_league(members)
+    for _ in range(tickets):
+        ticket_id = seed_ticket(league_id)
+        db.get_collection('bets').insert_many([{
+            'user_id': user_id, 'league_id': league_id, 'ticket_id': ticket_id,
+            'amount': 10.0, 'selected_option': 'Home', 'odds': 2.0,
+            'potential_payout': 20.0, 'status': 'pending',
+            'placed_at': datetime.utcnow(), 'resolved_at': None
+        } for user_id in user_ids])
+    return league_id
+
+
+def join(league_id, username):
+    user = db.get_collection('users').find_one({'username': username}, {'_id': 1})
+    db.get_collection('memberships').insert_one(dict(
+        {'league_id': league_id, 'user_id': user['_id'], 'username': username,
+         'balance': 1000.0, 'joined_at': None}, **dict.fromkeys(STATS_COUNTERS, 0)))
+
+
+def poll(app, league_id, username, polls, change_every, conditional):
+    client = app.test_client()
+    register_user(client, username)
+    join(league_id, username)
+
+    etags = {}
+    statuses = {}
+    body_bytes = 0
+    cpu = 0.0
+    start = time.perf_counter()
+    for i in range(polls):
+        if change_every and i and i % change_every == 0:
+            League.bump_version(league_id)  # Stands in for a bet being placed
+        path = ENDPOINTS[i % len(ENDPOINTS)].format(league_id)
+        headers = {'If-None-Match': etags[path]} if conditional and path in etags else {}
+
+        cpu_start = time.process_time()
+        response = client.get(path, headers=headers)
+        cpu += time.process_time() - cpu_start
+
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        body_bytes += len(response.data)
+        if response.headers.get('ETag'):
+            etags[path] = response.headers['ETag']
+    elapsed = time.perf_counter() - start
+    return {
+        'polls': polls,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'bytes_per_request': round(body_bytes / polls, 1),
+        'cpu_ms_per_request': round(cpu / polls * 1000, 3),
+        'requests_per_second': round(polls / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--tickets', type=int, default=20)
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--change-every', type=int, default=30,
+                        help='bump the league version every N polls (0 = never)')
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    league_id = seed(args.members, args.tickets)
+    results = {
+        'members': args.members,
+        'tickets': args.tickets,
+        'change_every': args.change_every,
+        'unconditional': poll(app, league_id, 'plainpoller', args.polls, args.change_every, False),
+        'conditional': poll(app, league_id, 'etagpoller', args.polls, args.change_every, True)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
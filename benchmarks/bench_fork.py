@@ -0,0 +1,77 @@
+"""Pre-fork workers: every process must get its own MongoDB connections.
+
+Mimics `gunicorn --preload`: the parent creates the app and uses the
+database (so it owns a client with open pools and monitor threads), then
+forks workers. Each worker runs queries and reports the server-side
+connection ids it used. The run fails if any connection id shows up in
+more than one process.
+
+    python -m benchmarks.bench_fork --workers 4 --queries 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from benchmarks.common import connect, reset
+from database import db
+
+
+def connection_ids(samples=20):
+    """Server-side ids of connections this process's pool hands out"""
+    return {db.db.command('hello')['connectionId'] for _ in range(samples)}
+
+
+def worker(queries, results):
+    start = time.perf_counter()
+    for _ in range(queries):
+        db.get_collection('leagues').find_one({'_id': None})
+    elapsed = time.perf_counter() - start
+    results.put({
+        'pid': os.getpid(),
+        'client_id': id(db.client),
+        'connection_ids': sorted(connection_ids()),
+        'queries_per_second': round(queries / elapsed, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    connect()
+    parent = {'pid': os.getpid(), 'client_id': id(db.client),
+              'connection_ids': sorted(connection_ids())}
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(args.queries, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    workers = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    seen = {}
+    for report in [parent] + workers:
+        for connection_id in report['connection_ids']:
+            seen.setdefault(connection_id, set()).add(report['pid'])
+    shared = {cid: sorted(pids) for cid, pids in seen.items() if len(pids) > 1}
+
+    reset()
+    print(json.dumps({
+        'parent': parent,
+        'workers': workers,
+        'shared_connections': shared,
+        'ok': not shared,
+    }, indent=2))
+    if shared:
+        raise SystemExit('Connections were shared across processes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Bet placement under a burst: one request per bet vs. group commit.
+
+--bettors members of one league each place a bet on the same ticket at the
+same moment, one thread per bettor (a game about to start). Every run is
+timed per bet and overall, the MongoDB commands issued are counted, and the
+balances are checked against the bets recorded afterwards.
+
+  per_request   - Bet.place: debit, insert and version bumps for every bet
+  group_commit  - BetBatcher: placements queued per league for a few
+                  milliseconds, then written by Bet.place_many
+
+    python -m benchmarks.bench_group_commit --bettors 50 500 --window-ms 5
+"""
+import argparse
+import json
+import threading
+import time
+
+from pymongo import monitoring
+
+from benchmarks.common import CommandCount, connect, percentiles, reset, seed_league, seed_ticket
+from database import db
+from group_commit import BetBatcher
+from models.bet import Bet
+from models.league import MEMBERSHIPS
+
+STAKE = 10.0
+BALANCE = 1000.0
+
+
+def run(place, bettors, commands):
+    reset()
+    league_id, user_ids = seed_league(bettors, balance=BALANCE)
+    ticket_id = seed_ticket(league_id)
+
+    samples, placed = [], []
+    start_line = threading.Barrier(bettors)
+
+    def bettor(user_id):
+        start_line.wait()
+        start = time.perf_counter()
+        bet = place(user_id, league_id, ticket_id, STAKE, 'Home', 2.0)
+        samples.append(time.perf_counter() - start)
+        placed.append(bet is not None)
+
+    threads = [threading.Thread(target=bettor, args=(user_id,)) for user_id in user_ids]
+    commands.reset()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    issued = commands.total
+
+    bets = db.get_collection('bets').count_documents({'ticket_id': ticket_id})
+    wrong_balances = db.get_collection(MEMBERSHIPS).count_documents(
+        {'league_id': league_id, 'balance': {'$ne': BALANCE - STAKE}})
+    return {
+        'bets_placed': sum(placed),
+        'seconds': round(elapsed, 3),
+        'bets_per_second': round(sum(placed) / elapsed, 1) if elapsed else 0,
+        'latency_ms': percentiles(samples),
+        'commands_per_bet': round(issued / bettors, 2),
+        'bets_recorded': bets,
+        'wrong_balances': wrong_balances
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bettors', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--window-ms', type=float, default=5)
+    parser.add_argument('--max-batch', type=int, default=500)
+    args = parser.parse_args()
+
+    commands = CommandCount()
+    monitoring.register(commands)  # must happen before the client is created
+    connect()
+
+    batcher = BetBatcher()
+    batcher.enabled = True
+    batcher.window = args.window_ms / 1000
+    batcher.max_batch = args.max_batch
+
+    results = []
+    for bettors in args.bettors:
+        results.append({
+            'bettors': bettors,
+            'per_request': run(Bet.place, bettors, commands),
+            'group_commit': run(batcher.place, bettors, commands)
+        })
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
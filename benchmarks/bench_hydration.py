@@ -0,0 +1,104 @@
+"""Model hydration: __dict__ models via __init__ vs. slotted _from_bson.
+
+Builds 100k raw bet documents in memory (no MongoDB needed) and reports
+objects/sec and bytes per object for the previous keyword-constructor
+model and the current slotted Bet.
+
+    python -m benchmarks.bench_hydration --count 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from bson import ObjectId
+
+from models.bet import Bet
+
+
+class DictBet:
+    """Bet as it was before __slots__: per-instance __dict__, built via __init__"""
+
+    def __init__(self, user_id=None, league_id=None, ticket_id=None, amount=None,
+                 selected_option=None, potential_payout=None, status='pending',
+                 placed_at=None, _id=None):
+        self.user_id = user_id
+        self.league_id = league_id
+        self.ticket_id = ticket_id
+        self.amount = amount
+        self.selected_option = selected_option
+        self.potential_payout = potential_payout
+        self.status = status
+        self.placed_at = placed_at or datetime.utcnow()
+        self._id = _id
+
+    @classmethod
+    def _from_dict(cls, data):
+        return cls(
+            _id=data.get('_id'),
+            user_id=data.get('user_id'),
+            league_id=data.get('league_id'),
+            ticket_id=data.get('ticket_id'),
+            amount=data.get('amount'),
+            selected_option=data.get('selected_option'),
+            potential_payout=data.get('potential_payout'),
+            status=data.get('status'),
+            placed_at=data.get('placed_at')
+        )
+
+
+def documents(count):
+    league_id, ticket_id, now = ObjectId(), ObjectId(), datetime.utcnow()
+    return [{
+        '_id': ObjectId(),
+        'user_id': ObjectId(),
+        'league_id': league_id,
+        'ticket_id': ticket_id,
+        'amount': 10.0,
+        'selected_option': 'Home',
+        'potential_payout': 20.0,
+        'status': 'pending',
+        'placed_at': now,
+    } for _ in range(count)]
+
+
+def measure(hydrate, docs, repeat):
+    """Best-of-repeat throughput plus memory retained per hydrated object"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        objects = [hydrate(doc) for doc in docs]
+        best = min(best, time.perf_counter() - start)
+        del objects
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [hydrate(doc) for doc in docs]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # The result list itself is the same for both variants; leave it out
+    retained -= objects.__sizeof__()
+    return {
+        'objects_per_sec': round(len(docs) / best),
+        'bytes_per_object': round(retained / len(docs), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    docs = documents(args.count)
+    results = {
+        'count': args.count,
+        'dict_init': measure(DictBet._from_dict, docs, args.repeat),
+        'slots_from_bson': measure(Bet._from_dict, docs, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Encode throughput of a large leaderboard response: stdlib vs. orjson.
+
+Builds the /leagues/api/<id>/leaderboard payload for a league with
+--members members (ObjectId user ids, datetime join dates, stats counters)
+and encodes it repeatedly with:
+
+  manual  - str()/isoformat() loop, then the stdlib encoder (the old views)
+  stdlib  - MongoJSONProvider without orjson (stdlib encoder + default hook)
+  orjson  - MongoJSONProvider with orjson, if it is installed
+
+No database is needed.
+
+    python -m benchmarks.bench_json --members 10000 --repeat 50
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+import json_provider
+from json_provider import MongoJSONProvider
+from models.stats import STATS_COUNTERS
+from routes.leagues import member_json
+
+
+def leaderboard(members):
+    joined = datetime(2024, 1, 1)
+    return {
+        'league_id': ObjectId(),
+        'league_name': 'Bench League',
+        'leaderboard': [member_json(dict(
+            dict.fromkeys(STATS_COUNTERS, 3),
+            user_id=ObjectId(), username=f'user{i}', balance=1000.0 - i * 0.25,
+            joined_at=joined + timedelta(minutes=i)
+        )) for i in range(members)]
+    }
+
+
+def manual(payload):
+    data = dict(payload, league_id=str(payload['league_id']), leaderboard=[
+        dict(member, user_id=str(member['user_id']), joined_at=member['joined_at'].isoformat())
+        for member in payload['leaderboard']
+    ])
+    return json.dumps(data, ensure_ascii=True, sort_keys=True)
+
+
+def measure(encode, payload, repeat):
+    size = len(encode(payload))  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(payload)
+    elapsed = time.perf_counter() - start
+    return {
+        'ms_per_encode': round(elapsed / repeat * 1000, 3),
+        'encodes_per_second': round(repeat / elapsed, 1),
+        'megabytes_per_second': round(size * repeat / elapsed / 1e6, 1),
+        'bytes': size
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    payload = leaderboard(args.members)
+    provider = MongoJSONProvider(Flask(__name__))
+    orjson = json_provider.orjson
+
+    results = {'members': args.members, 'manual': measure(manual, payload, args.repeat)}
+    try:
+        json_provider.orjson = None
+        results['stdlib'] = measure(provider.dumps, payload, args.repeat)
+    finally:
+        json_provider.orjson = orjson
+    if orjson is not None:
+        results['orjson'] = measure(provider.dumps, payload, args.repeat)
+    else:
+        results['orjson'] = 'not installed'
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Balance write throughput: legacy read-modify-write vs. $inc plus ledger append.
+
+Threads apply --changes balance changes spread over a league's members:
+
+  save    - the previous release's league.save(): read the member's balance
+            and $set it back changed (concurrent changes are lost)
+  ledger  - League.debit_member/credit_member: conditional $inc plus one
+            insert-only ledger entry
+
+After each run every balance is checked against the changes that were
+applied, and for the ledger path against the ledger itself (find_drift).
+Then the ledger is compacted and balance_at latency is timed with and
+without a snapshot to start from.
+
+    python -m benchmarks.bench_ledger --members 200 --changes 20000 --threads 32
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks.common import connect, percentiles, reset, seed_league
+from database import db
+from models import ledger
+from models.league import League, MEMBERSHIPS
+
+BALANCE = 1000.0
+AMOUNTS = (-10.0, -5.0, 5.0, 10.0)
+
+
+def save_change(league_id, user_id, amount):
+    # Copied rather than calling League.save(), which now writes $inc deltas
+    member = db.get_collection(MEMBERSHIPS).find_one(
+        {'league_id': league_id, 'user_id': user_id}, {'balance': 1})
+    db.get_collection(MEMBERSHIPS).update_one(
+        {'league_id': league_id, 'user_id': user_id},
+        {'$set': {'balance': member['balance'] + amount}})
+
+
+def ledger_change(league_id, user_id, amount):
+    if amount < 0:
+        League.debit_member(league_id, user_id, -amount)
+    else:
+        League.credit_member(league_id, user_id, amount)
+
+
+def seed(members):
+    """Seed a league whose members each have an opening ledger entry"""
+    reset()
+    league_id, user_ids = seed_league(members, balance=BALANCE)
+    ledger.append(ledger.entry(league_id, user_id, BALANCE, 'open', f'open:{league_id}:{user_id}')
+                  for user_id in user_ids)
+    return league_id, user_ids
+
+
+def run(change, members, changes, threads):
+    league_id, user_ids = seed(members)
+    rng = random.Random(changes)
+    work = [(rng.choice(user_ids), rng.choice(AMOUNTS)) for _ in range(changes)]
+    expected = {user_id: BALANCE for user_id in user_ids}
+    for user_id, amount in work:
+        expected[user_id] += amount
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda job: change(league_id, *job), work))
+    elapsed = time.perf_counter() - start
+
+    balances = {member['user_id']: member['balance'] for member in
+                db.get_collection(MEMBERSHIPS).find({'league_id': league_id})}
+    return league_id, user_ids, {
+        'seconds': round(elapsed, 3),
+        'changes_per_second': round(changes / elapsed, 1) if elapsed else 0,
+        'members_with_lost_updates': sum(
+            1 for user_id, balance in balances.items() if abs(balance - expected[user_id]) > 1e-9)
+    }
+
+
+def time_balance_at(league_id, user_ids, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        ledger.balance_at(league_id, user_ids[i % len(user_ids)])
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--changes', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    connect()
+    results = {'members': args.members, 'changes': args.changes, 'threads': args.threads}
+    results['save'] = run(save_change, args.members, args.changes, args.threads)[2]
+
+    league_id, user_ids, results['ledger'] = run(ledger_change, args.members, args.changes, args.threads)
+    results['ledger']['members_with_ledger_drift'] = len(ledger.find_drift(league_id))
+    results['ledger']['balance_at_ms'] = time_balance_at(league_id, user_ids, args.repeat)
+
+    start = time.perf_counter()
+    results['ledger']['snapshots_written'] = ledger.compact(
+        league_id, now=datetime.utcnow() + timedelta(seconds=ledger.SETTLE_SECONDS))
+    results['ledger']['compaction_seconds'] = round(time.perf_counter() - start, 3)
+    results['ledger']['balance_at_after_compaction_ms'] = time_balance_at(league_id, user_ids, args.repeat)
+
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
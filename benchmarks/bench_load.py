@@ -0,0 +1,321 @@
+"""HTTP load test of the real routes: bet storm, mass resolution, dashboard browse.
+
+Seeds --users users who all belong to --leagues leagues (user0 is every
+league's admin), each league with --tickets open tickets on which a --bet-share
+of the members already have a pending bet. Then serves the application on a
+local port and drives it over HTTP with --clients concurrent clients, each
+logged in through auth.login with its own session. Every scenario starts
+from a freshly seeded database:
+
+  dashboard_browse  - members browse: dashboard, league detail and the
+                      leaderboard, tickets, recent-bets, user-bets, user-stats
+                      and changes APIs (--requests per client)
+  bet_storm         - a game is about to start: every member bets on each of
+                      --storm-tickets new tickets in the first league at once
+  mass_resolution   - admins resolve every seeded ticket concurrently and
+                      poll each resolution until its bets are settled
+
+Each scenario reports requests/sec, p50/p95/p99 latency and MongoDB commands
+per request, overall and per route, as JSON (logins are reported apart), so
+runs from different releases can be compared:
+
+    python -m benchmarks.bench_load --users 500 --clients 50 > before.json
+
+Pass --set NAME=VALUE to override app config for the run, e.g.
+--set BET_GROUP_COMMIT=true or --set RESOLUTION_WORKERS=2.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from bson import ObjectId
+from pymongo import monitoring
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from benchmarks.common import CommandCount, create_bench_app, percentiles, reset, seed_ticket
+from database import db
+from group_commit import bet_batcher
+from jobs import job_workers
+from models.stats import STATS_COUNTERS
+
+PASSWORD = 'benchmark'
+STAKE = 10.0
+ODDS = 2.0
+# Sent with every request so MongoDB commands can be attributed to a route
+LABEL_HEADER = 'X-Load-Label'
+SCENARIOS = ('dashboard_browse', 'bet_storm', 'mass_resolution')
+
+
+class LabelRequests:
+    """WSGI middleware recording each request's route label for CommandCount"""
+
+    def __init__(self, wsgi_app, commands):
+        self.wsgi_app = wsgi_app
+        self.commands = commands
+
+    def __call__(self, environ, start_response):
+        self.commands.local.label = environ.get('HTTP_' + LABEL_HEADER.upper().replace('-', '_'))
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            self.commands.local.label = None
+
+
+class Recorder:
+    """Latency samples and errors per route label"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, label, seconds, ok):
+        with self.lock:
+            self.samples[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+class Client:
+    """One logged-in browser session"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def request(self, label, method, path, **kwargs):
+        start = time.perf_counter()
+        response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                        headers={LABEL_HEADER: label}, **kwargs)
+        self.recorder.add(label, time.perf_counter() - start, response.status_code < 400)
+        return response
+
+    def login(self, username):
+        response = self.request('auth.login', 'POST', '/auth/login', data={
+            'email': f'{username}@example.com', 'password': PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f'Could not log in as {username}')
+
+
+def seed(args):
+    """Seed users, leagues, tickets and bets; return (user_ids, league_ids, ticket_ids by league)"""
+    reset()
+    password_hash = generate_password_hash(PASSWORD)  # Hashing is slow; share one
+    user_ids = [ObjectId() for _ in range(args.users)]
+    league_ids = [ObjectId() for _ in range(args.leagues)]
+    db.get_collection('users').insert_many([{
+        '_id': user_id, 'username': f'user{i}', 'email': f'user{i}@example.com',
+        'password_hash': password_hash, 'created_at': datetime.utcnow(), 'leagues': league_ids
+    } for i, user_id in enumerate(user_ids)])
+
+    rng = random.Random(args.seed)
+    tickets = {}
+    for n, league_id in enumerate(league_ids):
+        db.get_collection('leagues').insert_one({
+            '_id': league_id, 'name': f'League {n}', 'description': 'load test',
+            'creator_id': user_ids[0], 'admins': user_ids[:1], 'member_count': len(user_ids),
+            'starting_balance': 1000.0, 'status': 'active', 'created_at': datetime.utcnow(),
+            'end_date': None, 'invite_code': f'LOAD{n:04d}', 'version': 0
+        })
+        members = {user_id: dict({'league_id': league_id, 'user_id': user_id, 'username': f'user{i}',
+                                  'balance': 1000.0, 'joined_at': datetime.utcnow()},
+                                 **dict.fromkeys(STATS_COUNTERS, 0))
+                   for i, user_id in enumerate(user_ids)}
+
+        tickets[league_id] = []
+        for _ in range(args.tickets):
+            ticket_id = seed_ticket(league_id, odds=ODDS)
+            db.get_collection('tickets').update_one({'_id': ticket_id}, {'$set': {'created_by': user_ids[0]}})
+            tickets[league_id].append(ticket_id)
+            bettors = rng.sample(user_ids, int(len(user_ids) * args.bet_share))
+            if not bettors:
+                continue
+            db.get_collection('bets').insert_many([{
+                'user_id': user_id, 'league_id': league_id, 'ticket_id': ticket_id,
+                'amount': STAKE, 'selected_option': rng.choice(('Home', 'Away')),
+                'potential_payout': STAKE * ODDS, 'status': 'pending', 'placed_at': datetime.utcnow()
+            } for user_id in bettors])
+            for user_id in bettors:
+                member = members[user_id]
+                member['balance'] -= STAKE
+                member['total_bets'] += 1
+                member['pending_bets'] += 1
+                member['total_wagered'] += STAKE
+
+        db.get_collection('memberships').insert_many(list(members.values()))
+        db.get_collection('ledger').insert_many([{
+            'league_id': league_id, 'user_id': user_id, 'amount': member['balance'], 'kind': 'open',
+            'ref': f'open:{league_id}:{user_id}', 'created_at': datetime.utcnow()
+        } for user_id, member in members.items()])
+    return user_ids, league_ids, tickets
+
+
+def log_in(base_url, usernames, workers):
+    """Log a client in for each username; returns (clients, login recorder)"""
+    recorder = Recorder()
+    clients = [Client(base_url, recorder) for _ in usernames]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda pair: pair[0].login(pair[1]), zip(clients, usernames)))
+    return clients, recorder
+
+
+def dashboard_browse(base_url, args, user_ids, league_ids, tickets):
+    clients, logins = log_in(base_url, [f'user{i}' for i in range(args.clients)], args.clients)
+    rng = random.Random(args.seed)
+    pages = [
+        ('leagues.dashboard', lambda league_id: '/leagues/'),
+        ('leagues.detail', lambda league_id: f'/leagues/{league_id}'),
+        ('leagues.api_leaderboard', lambda league_id: f'/leagues/api/{league_id}/leaderboard'),
+        ('tickets.api_tickets', lambda league_id: f'/tickets/api/{league_id}/tickets'),
+        ('bets.api_recent_bets', lambda league_id: f'/bets/api/{league_id}/recent-bets'),
+        ('bets.api_user_bets', lambda league_id: '/bets/api/user-bets?ticket_ids=' +
+         ','.join(map(str, tickets[league_id]))),
+        ('bets.api_user_stats', lambda league_id: f'/bets/api/{league_id}/user-stats'),
+        ('leagues.api_member_changes', lambda league_id: f'/leagues/api/{league_id}/changes?since=0'),
+    ]
+    plans = [[(rng.choice(pages), rng.choice(league_ids)) for _ in range(args.requests)]
+             for _ in clients]
+
+    def browse(client, plan):
+        for (label, path), league_id in plan:
+            client.request(label, 'GET', path(league_id))
+
+    return clients, plans, browse, logins
+
+
+def bet_storm(base_url, args, user_ids, league_ids, tickets):
+    league_id = league_ids[0]
+    storm_tickets = [seed_ticket(league_id, odds=ODDS) for _ in range(args.storm_tickets)]
+    clients, logins = log_in(base_url, [f'user{i}' for i in range(len(user_ids))], args.clients)
+    rng = random.Random(args.seed)
+    plans = [[(ticket_id, rng.choice(('Home', 'Away'))) for ticket_id in storm_tickets]
+             for _ in clients]
+
+    def storm(client, plan):
+        for ticket_id, option in plan:
+            client.request('bets.place_bet', 'POST', f'/bets/{ticket_id}/place',
+                           data={'amount': STAKE, 'selected_option': option})
+
+    return clients, plans, storm, logins
+
+
+def mass_resolution(base_url, args, user_ids, league_ids, tickets):
+    clients, logins = log_in(base_url, ['user0'] * args.clients, args.clients)
+    rng = random.Random(args.seed)
+    resolutions = [(ticket_id, rng.choice(('Home', 'Away')))
+                   for league_id in league_ids for ticket_id in tickets[league_id]]
+    plans = [resolutions[i::len(clients)] for i in range(len(clients))]
+
+    def resolve(client, plan):
+        for ticket_id, winning_option in plan:
+            client.request('tickets.resolve', 'POST', f'/tickets/{ticket_id}/resolve',
+                           data={'winning_option': winning_option})
+        for ticket_id, _ in plan:
+            # Settlement may run in background jobs; wait for it like the admin page does
+            while True:
+                response = client.request('tickets.api_resolution', 'GET',
+                                          f'/tickets/api/{ticket_id}/resolution')
+                if response.status_code != 200 or response.json()['status'] in ('done', 'failed'):
+                    break
+                time.sleep(args.poll_interval)
+
+    return clients, plans, resolve, logins
+
+
+def summarize(recorder, commands, seconds):
+    """Latency, throughput and MongoDB commands per request, overall and per route"""
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(total / seconds, 1) if seconds else 0,
+        'latency_ms': percentiles([s for samples in recorder.samples.values() for s in samples]),
+        'mongo_commands_per_request': round(commands.total / total, 2) if total else 0,
+        'routes': {
+            label: {
+                'requests': len(samples),
+                'errors': recorder.errors[label],
+                'latency_ms': percentiles(samples),
+                'mongo_commands_per_request': round(commands.by_label[label] / len(samples), 2)
+            } for label, samples in sorted(recorder.samples.items())
+        }
+    }
+
+
+def run(scenario, base_url, args, commands):
+    user_ids, league_ids, tickets = seed(args)
+    clients, plans, work, logins = globals()[scenario](base_url, args, user_ids, league_ids, tickets)
+
+    recorder = Recorder()
+    for client in clients:
+        client.recorder = recorder
+    commands.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(work, clients, plans))
+    elapsed = time.perf_counter() - start
+
+    result = summarize(recorder, commands, elapsed)
+    result['logins'] = {'requests': sum(map(len, logins.samples.values())),
+                        'latency_ms': percentiles(logins.samples['auth.login'])}
+    return result
+
+
+def parse_setting(setting):
+    name, _, value = setting.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--leagues', type=int, default=3)
+    parser.add_argument('--tickets', type=int, default=5, help='Seeded tickets per league')
+    parser.add_argument('--bet-share', type=float, default=0.5,
+                        help='Share of members with a bet on each seeded ticket')
+    parser.add_argument('--storm-tickets', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client when browsing')
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--set', dest='settings', action='append', default=[], metavar='NAME=VALUE')
+    args = parser.parse_args()
+
+    commands = CommandCount()
+    monitoring.register(commands)  # must happen before the client is created
+    settings = dict(map(parse_setting, args.settings))
+    app = create_bench_app(**settings)
+    # The overrides land after create_app; re-read the settings they can change
+    bet_batcher.init_app(app)
+    job_workers.init_app(app)
+    app.wsgi_app = LabelRequests(app.wsgi_app, commands)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key != 'settings'},
+        'settings': settings,
+        'scenarios': {scenario: run(scenario, base_url, args, commands) for scenario in args.scenarios}
+    }
+    server.shutdown()
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Join, bet and leaderboard latency: embedded members array vs. memberships.
+
+For each --sizes entry, seeds a league with that many members in each layout
+and times, per operation:
+
+  join             - load the league by invite code, add a member, save
+  bet              - the conditional balance debit made when placing a bet
+  top_members      - the five richest members (league page, live updates)
+  leaderboard      - every member by balance (leaderboard page and API)
+
+The embedded layout replays the previous release's queries against a league
+document holding the members array. Leagues too big to fit in one 16MB
+document are reported as such instead of timed.
+
+    python -m benchmarks.bench_memberships --sizes 100 10000 100000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DocumentTooLarge, WriteError
+
+from benchmarks.common import connect, percentiles, reset, seed_league
+from database import db
+from models.league import League
+from models.stats import STATS_COUNTERS
+
+STAKE = 1.0
+
+
+def new_member(user_id, username, balance=1000.0):
+    return dict({'user_id': user_id, 'username': username, 'balance': balance,
+                 'joined_at': datetime.utcnow()}, **dict.fromkeys(STATS_COUNTERS, 0))
+
+
+def seed_embedded(member_count):
+    """Insert a league holding its members in an array; return (league_id, user_ids)"""
+    user_ids = [ObjectId() for _ in range(member_count)]
+    league_id = db.get_collection('leagues').insert_one({
+        'name': 'Embedded League',
+        'creator_id': user_ids[0],
+        'admins': user_ids[:1],
+        'members': [new_member(uid, f'user{i}') for i, uid in enumerate(user_ids)],
+        'starting_balance': 1000.0,
+        'status': 'active',
+        'invite_code': ObjectId().binary.hex()[-8:].upper(),
+        'version': 0
+    }).inserted_id
+    return league_id, user_ids
+
+
+class Embedded:
+    """The previous release's member queries"""
+
+    @staticmethod
+    def join(league_id, invite_code, user_id):
+        league = db.get_collection('leagues').find_one({'invite_code': invite_code})
+        if any(member['user_id'] == user_id for member in league['members']):
+            return
+        league['members'].append(new_member(user_id, 'joiner'))
+        db.get_collection('leagues').update_one(
+            {'_id': league['_id']}, {'$set': {'members': league['members']}})
+
+    @staticmethod
+    def bet(league_id, user_id):
+        db.get_collection('leagues').find_one_and_update(
+            {'_id': league_id,
+             'members': {'$elemMatch': {'user_id': user_id, 'balance': {'$gte': STAKE}}}},
+            {'$inc': {'members.$.balance': -STAKE, 'version': 1}},
+            projection={'version': 1}, return_document=ReturnDocument.AFTER)
+
+    @staticmethod
+    def top_members(league_id):
+        return list(db.get_collection('leagues').aggregate([
+            {'$match': {'_id': league_id}},
+            {'$unwind': '$members'},
+            {'$sort': {'members.balance': -1}},
+            {'$limit': 5},
+            {'$replaceRoot': {'newRoot': '$members'}},
+            {'$project': {'_id': 0, 'user_id': 1, 'username': 1, 'balance': 1}}
+        ]))
+
+    @staticmethod
+    def leaderboard(league_id):
+        league = db.get_collection('leagues').find_one({'_id': league_id})
+        return sorted(league['members'], key=lambda x: x['balance'], reverse=True)
+
+
+class Memberships:
+    """The current League member API"""
+
+    @staticmethod
+    def join(league_id, invite_code, user_id):
+        league = League.get_by_invite_code(invite_code)
+        if league.add_member(user_id, 'joiner'):
+            league.save()
+
+    @staticmethod
+    def bet(league_id, user_id):
+        League.debit_member(league_id, user_id, STAKE)
+
+    @staticmethod
+    def top_members(league_id):
+        return League.get_top_members(league_id)
+
+    @staticmethod
+    def leaderboard(league_id):
+        return League.get_by_id(league_id).get_leaderboard()
+
+
+def timed(samples, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    samples.append(time.perf_counter() - start)
+
+
+def run(layout, league_id, user_ids, repeat):
+    invite_code = db.get_collection('leagues').find_one({'_id': league_id})['invite_code']
+    samples = {'join': [], 'bet': [], 'top_members': [], 'leaderboard': []}
+    for i in range(repeat):
+        timed(samples['join'], layout.join, league_id, invite_code, ObjectId())
+        timed(samples['bet'], layout.bet, league_id, user_ids[i % len(user_ids)])
+        timed(samples['top_members'], layout.top_members, league_id)
+        timed(samples['leaderboard'], layout.leaderboard, league_id)
+    return {operation: percentiles(times) for operation, times in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    connect()
+    results = []
+    for size in args.sizes:
+        result = {'members': size}
+
+        reset()
+        try:
+            league_id, user_ids = seed_embedded(size)
+            result['embedded_ms'] = run(Embedded, league_id, user_ids, args.repeat)
+        except (DocumentTooLarge, WriteError) as e:
+            result['embedded_ms'] = f'league does not fit in one document: {e}'
+
+        reset()
+        league_id, user_ids = seed_league(size)
+        result['memberships_ms'] = run(Memberships, league_id, user_ids, args.repeat)
+        results.append(result)
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
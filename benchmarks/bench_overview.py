@@ -0,0 +1,103 @@
+"""League detail page data: separate queries vs. the one-aggregation overview.
+
+Seeds a league with --members members and N bets spread over tickets
+(one run per --sizes entry), then loads the detail page's data for one
+member repeatedly:
+
+  queries   - the previous route: full league load, a page of tickets, a
+              page of the user's bets, stats and the full leaderboard
+  overview  - models.overview.load_league_overview (one aggregation)
+
+Reports p50/p95/p99 latency. Requires MongoDB 5.0+.
+
+    python -m benchmarks.bench_overview --sizes 10 1000 50000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import connect, percentiles, reset, seed_league, seed_ticket
+from database import db
+from models.bet import Bet
+from models.league import League
+from models.overview import TOP_MEMBERS, load_league_overview
+from models.ticket import Ticket
+from routes.leagues import DETAIL_FIELDS
+
+PER_PAGE = 20
+BETS_PER_TICKET = 25
+
+
+def seed(bet_count, member_count):
+    """Seed a league with bet_count bets over enough tickets; return (league_id, user_id)"""
+    reset()
+    league_id, user_ids = seed_league(member_count)
+    ticket_ids = [seed_ticket(league_id) for _ in range(max(1, bet_count // BETS_PER_TICKET))]
+
+    rng = random.Random(bet_count)
+    start = datetime.utcnow() - timedelta(days=30)
+    bets, seen = [], set()
+    while len(bets) < bet_count:
+        user_id, ticket_id = rng.choice(user_ids), rng.choice(ticket_ids)
+        if (user_id, ticket_id) in seen:
+            continue  # One bet per user per ticket
+        seen.add((user_id, ticket_id))
+        bets.append({
+            'user_id': user_id, 'league_id': league_id, 'ticket_id': ticket_id,
+            'amount': 10.0, 'selected_option': 'Home', 'potential_payout': 20.0,
+            'status': 'pending', 'placed_at': start + timedelta(seconds=len(bets))
+        })
+    for chunk in range(0, len(bets), 10000):
+        db.get_collection('bets').insert_many(bets[chunk:chunk + 10000])
+    return league_id, user_ids[0]
+
+
+def separate_queries(league_id, user_id):
+    league = League.get_by_id(league_id)
+    tickets = Ticket.get_league_tickets(league._id, limit=PER_PAGE)
+    user_bets = Bet.get_user_bets(user_id, league._id, limit=PER_PAGE)
+    stats = league.get_member_stats(user_id)
+    leaderboard = league.get_leaderboard()[:TOP_MEMBERS]
+    return league, tickets, user_bets, stats, leaderboard
+
+
+def overview(league_id, user_id):
+    data = load_league_overview(league_id, user_id, DETAIL_FIELDS, PER_PAGE, PER_PAGE)
+    return data, data['league'].get_member_stats(user_id)
+
+
+def measure(func, league_id, user_id, repeat):
+    func(league_id, user_id)  # warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(league_id, user_id)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000])
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    connect()
+    results = []
+    for size in args.sizes:
+        league_id, user_id = seed(size, args.members)
+        results.append({
+            'bets': size,
+            'members': args.members,
+            'queries_ms': measure(separate_queries, league_id, user_id, args.repeat),
+            'overview_ms': measure(overview, league_id, user_id, args.repeat)
+        })
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
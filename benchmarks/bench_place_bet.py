@@ -0,0 +1,104 @@
+"""Concurrent bet placement: legacy read-modify-write path vs. atomic debit.
+
+Every member places one bet on each of several tickets from a pool of worker
+threads, so bets by different members of the same league (and by the same
+member on different tickets) race each other. After each run the member
+balances are compared with the stakes actually recorded in `bets`; any
+difference is a lost update.
+
+    python -m benchmarks.bench_place_bet --members 200 --tickets 5 --threads 32
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import connect, reset, seed_league, seed_ticket
+from database import db
+from models.bet import Bet
+from models.league import League, MEMBERSHIPS
+from models.ticket import Ticket
+
+STAKE = 10.0
+
+
+def legacy_place(ticket_id, user_id):
+    """The pre-atomic place_bet flow: read the balance, insert the bet, write the balance back.
+
+    League.save() now writes $inc deltas, so the previous release's
+    read-modify-$set write is copied here rather than going through the model.
+    """
+    ticket = Ticket.get_by_id(ticket_id)
+    member = db.get_collection(MEMBERSHIPS).find_one(
+        {'league_id': ticket.league_id, 'user_id': user_id}, {'balance': 1})
+    if Bet.get_user_ticket_bet(user_id, ticket._id):
+        return False
+    option = ticket.options[0]
+    bet = Bet.create_bet(user_id, ticket.league_id, ticket._id, STAKE, option['option_text'], option['odds'])
+    if not bet:
+        return False
+    db.get_collection(MEMBERSHIPS).update_one(
+        {'league_id': ticket.league_id, 'user_id': user_id},
+        {'$set': {'balance': member['balance'] - STAKE}})
+    return True
+
+
+def atomic_place(ticket_id, user_id):
+    """The current place_bet flow: conditional $inc debit plus bet insert"""
+    ticket = Ticket.get_by_id(ticket_id)
+    option = ticket.options[0]
+    return Bet.place(user_id, ticket.league_id, ticket._id, STAKE,
+                     option['option_text'], option['odds']) is not None
+
+
+def run(place, members, tickets, threads):
+    reset()
+    league_id, user_ids = seed_league(members)
+    ticket_ids = [seed_ticket(league_id) for _ in range(tickets)]
+    jobs = [(ticket_id, user_id) for ticket_id in ticket_ids for user_id in user_ids]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        placed = sum(pool.map(lambda job: place(*job), jobs))
+    elapsed = time.perf_counter() - start
+
+    # Compare every balance with the stakes recorded for that member
+    staked = {row['_id']: row['total'] for row in db.get_collection('bets').aggregate([
+        {'$match': {'league_id': league_id}},
+        {'$group': {'_id': '$user_id', 'total': {'$sum': '$amount'}}}
+    ])}
+    league = League.get_by_id(league_id)
+    lost_updates = sum(
+        1 for member in league.members
+        if abs(member['balance'] - (league.starting_balance - staked.get(member['user_id'], 0))) > 1e-9
+    )
+
+    return {
+        'bets_placed': placed,
+        'seconds': round(elapsed, 3),
+        'bets_per_second': round(placed / elapsed, 1) if elapsed else 0,
+        'members_with_lost_updates': lost_updates
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--tickets', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    connect()
+    results = {
+        'members': args.members,
+        'tickets': args.tickets,
+        'threads': args.threads,
+        'legacy': run(legacy_place, args.members, args.tickets, args.threads),
+        'atomic': run(atomic_place, args.members, args.tickets, args.threads)
+    }
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
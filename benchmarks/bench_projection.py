@@ -0,0 +1,84 @@
+"""Bytes received from MongoDB for full vs. lean (projected) league loads.
+
+Seeds a user who belongs to several large leagues and measures the size of
+the server replies for the dashboard/profile league listing and for a
+single-league membership check, with and without projections.
+
+    python -m benchmarks.bench_projection --leagues 20 --members 1000
+"""
+import argparse
+import json
+import time
+
+import bson
+from pymongo import monitoring
+
+from benchmarks.common import connect, reset, seed_league
+from database import db
+from models.league import League
+from routes.leagues import DASHBOARD_FIELDS
+
+
+class ReplyBytes(monitoring.CommandListener):
+    """Sum the BSON size of every command reply"""
+
+    def __init__(self):
+        self.total = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.total += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def measure(listener, label, func, repeat=20):
+    listener.total = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    return {label: {'bytes_per_call': listener.total // repeat,
+                    'ms_per_call': round(elapsed / repeat * 1000, 3)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leagues', type=int, default=20)
+    parser.add_argument('--members', type=int, default=1000)
+    args = parser.parse_args()
+
+    listener = ReplyBytes()
+    monitoring.register(listener)  # must happen before the client is created
+    connect()
+    reset()
+
+    league_ids, user_id = [], None
+    for i in range(args.leagues):
+        league_id, user_ids = seed_league(args.members, name=f'League {i}')
+        league_ids.append(league_id)
+        user_id = user_id or user_ids[0]
+        if i:
+            # Make the same user a member of every league
+            db.get_collection('memberships').update_one(
+                {'league_id': league_id, 'user_id': user_ids[0]}, {'$set': {'user_id': user_id}})
+
+    results = {'leagues': args.leagues, 'members_per_league': args.members}
+    results.update(measure(listener, 'dashboard_full', lambda: League.get_user_leagues(user_id)))
+    results.update(measure(listener, 'dashboard_lean',
+                           lambda: League.get_user_leagues(user_id, fields=DASHBOARD_FIELDS)))
+    results.update(measure(listener, 'profile_lean',
+                           lambda: League.get_user_leagues(user_id, fields=['status'])))
+    results.update(measure(listener, 'membership_full',
+                           lambda: League.get_by_id(league_ids[0]).get_member(user_id)))
+    results.update(measure(listener, 'membership_lean',
+                           lambda: League.get_membership(league_ids[0], user_id).get_member(user_id)))
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
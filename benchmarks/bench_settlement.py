@@ -0,0 +1,123 @@
+"""Ticket settlement: per-bet saves vs. the bulk settlement engine.
+
+Seeds one league where every member has a bet on the same ticket, resolves
+the ticket, and checks that each winner was paid exactly once. The bulk
+engine (a ResolutionJob, run inline) is then run a second time to confirm re-running settlement leaves
+balances unchanged.
+
+    python -m benchmarks.bench_settlement --sizes 100 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from benchmarks.common import connect, reset, seed_league, seed_ticket
+from database import db
+from jobs import job_workers
+from models.bet import Bet
+from models.job import ResolutionJob
+from models.league import League
+
+STAKES = (5.0, 10.0, 25.0, 50.0, 100.0)
+ODDS = 2.0
+
+
+def seed(bet_count):
+    """Seed one league/ticket with bet_count bets; return ids and expected balances"""
+    reset()
+    league_id, user_ids = seed_league(bet_count, balance=1000.0)
+    ticket_id = seed_ticket(league_id, odds=ODDS)
+
+    rng = random.Random(bet_count)
+    bets, expected = [], {}
+    for user_id in user_ids:
+        stake = rng.choice(STAKES)
+        option = rng.choice(('Home', 'Away'))
+        bets.append({
+            'user_id': user_id,
+            'league_id': league_id,
+            'ticket_id': ticket_id,
+            'amount': stake,
+            'selected_option': option,
+            'potential_payout': stake * ODDS,
+            'status': 'pending',
+            'placed_at': datetime.utcnow()
+        })
+        expected[user_id] = 1000.0 - stake + (stake * ODDS if option == 'Home' else 0)
+
+    db.get_collection('bets').insert_many(bets)
+    # Stakes were already debited when the bets were placed
+    db.get_collection('memberships').bulk_write([
+        UpdateOne({'league_id': league_id, 'user_id': bet['user_id']},
+                  {'$inc': {'balance': -bet['amount']}})
+        for bet in bets
+    ])
+    return league_id, ticket_id, expected
+
+
+def legacy_settle(league_id, ticket_id):
+    """The pre-bulk flow: save each bet, then rewrite the whole league"""
+    for bet in Bet.get_ticket_bets(ticket_id):
+        if bet.selected_option == 'Home':
+            bet.mark_won()
+        else:
+            bet.mark_lost()
+        bet.save()
+
+    league = League.get_by_id(league_id)
+    for bet in Bet.get_ticket_bets(ticket_id):
+        member = league.get_member(bet.user_id)
+        if member and bet.selected_option == 'Home':
+            league.update_member_balance(bet.user_id, member['balance'] + bet.potential_payout)
+    league.save()
+
+
+def bulk_settle(league_id, ticket_id):
+    job = ResolutionJob.create(ticket_id, league_id, 'Home')
+    if job.status in ('done', 'failed'):
+        job.restart()
+    job_workers.run_inline(job)
+
+
+def mismatches(league_id, expected):
+    league = League.get_by_id(league_id)
+    return sum(1 for member in league.members
+               if abs(member['balance'] - expected[member['user_id']]) > 1e-9)
+
+
+def run(settle, bet_count, rerun=False):
+    league_id, ticket_id, expected = seed(bet_count)
+    start = time.perf_counter()
+    settle(league_id, ticket_id)
+    elapsed = time.perf_counter() - start
+    result = {'seconds': round(elapsed, 3), 'wrong_balances': mismatches(league_id, expected)}
+    if rerun:
+        settle(league_id, ticket_id)
+        result['wrong_balances_after_rerun'] = mismatches(league_id, expected)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='skip the legacy path above this many bets')
+    args = parser.parse_args()
+
+    connect()
+    results = []
+    for size in args.sizes:
+        row = {'bets': size, 'bulk': run(bulk_settle, size, rerun=True)}
+        if size <= args.legacy_max:
+            row['legacy'] = run(legacy_settle, size)
+        results.append(row)
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Per-worker database startup cost: create_index on boot vs. a version read.
+
+Each sample mimics one worker booting: a fresh MongoClient is created, then
+either the old startup sequence runs (server_info() plus the 15
+create_index commands) or the current Database.init_app, which only reads
+the applied schema version. The database is migrated first, so both paths
+find every index already in place, as they would in production.
+
+    python -m benchmarks.bench_startup --workers 50
+"""
+import argparse
+import json
+import time
+
+from flask import Flask
+from pymongo import MongoClient
+
+from benchmarks.common import BENCH_MONGODB_URI, connect, percentiles, reset
+from config import TestingConfig
+from database import Database
+
+# The create_index calls Database.init_app used to make on every start
+LEGACY_INDEXES = {
+    'users': [('email', {'unique': True}), ('username', {'unique': True})],
+    'leagues': [('invite_code', {'unique': True, 'sparse': True}),
+                ('creator_id', {}), ('members.user_id', {})],
+    'tickets': [('league_id', {}), ('status', {}), ('created_by', {}),
+                ([('league_id', 1), ('status', 1)], {})],
+    'bets': [('user_id', {}), ('league_id', {}), ('ticket_id', {}), ('status', {}),
+             ([('user_id', 1), ('league_id', 1)], {})],
+}
+
+
+def legacy_startup(app):
+    client = MongoClient(app.config['MONGODB_URI'])
+    client.server_info()
+    db = client.get_default_database()
+    for collection, indexes in LEGACY_INDEXES.items():
+        for keys, options in indexes:
+            db[collection].create_index(keys, **options)
+    client.close()
+
+
+def current_startup(app):
+    database = Database(app)
+    database.close_connection()
+
+
+def measure(startup, app, workers):
+    samples = []
+    for _ in range(workers):
+        start = time.perf_counter()
+        startup(app)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=50)
+    args = parser.parse_args()
+
+    connect()  # migrates the benchmark database
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config['MONGODB_URI'] = BENCH_MONGODB_URI
+
+    legacy_startup(app)  # the legacy indexes exist on an un-migrated deployment
+    results = {
+        'workers': args.workers,
+        'legacy_ms_per_worker': measure(legacy_startup, app, args.workers),
+        'current_ms_per_worker': measure(current_startup, app, args.workers),
+    }
+    reset()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
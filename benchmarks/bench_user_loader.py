@@ -0,0 +1,49 @@
+"""Authenticated page throughput with and without the user loader cache.
+
+Logs a user in through the real routes and then requests a cheap
+authenticated page repeatedly. With the cache disabled every request runs a
+full users.find_one; with it enabled the loader only hits MongoDB once per
+TTL.
+
+    python -m benchmarks.bench_user_loader --requests 5000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import create_bench_app, register_user
+from models.user import User
+
+
+def run(app, requests, cache_size, cache_ttl, path):
+    User.configure_session_cache(cache_size, cache_ttl)
+    client = app.test_client()
+    register_user(client, f'bench{cache_size}')
+
+    client.get(path)  # warm up
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    return {'requests': requests, 'seconds': round(elapsed, 3),
+            'requests_per_second': round(requests / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--path', default='/auth/profile')
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    results = {
+        'path': args.path,
+        'uncached': run(app, args.requests, 0, 0, args.path),
+        'cached': run(app, args.requests, 10000, 60, args.path)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
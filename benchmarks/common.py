@@ -0,0 +1,160 @@
+"""Shared helpers for benchmarks.
+
+Benchmarks run against a real MongoDB server (default: a scratch database on
+localhost) and are executed from the repository root, e.g.:
+
+    python -m benchmarks.bench_place_bet
+
+Set BENCH_MONGODB_URI to point them somewhere else. The target database is
+dropped before and after each run.
+"""
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from bson import ObjectId
+from flask import Flask
+from pymongo import monitoring
+
+from config import TestingConfig
+from database import db
+from models.stats import STATS_COUNTERS
+from schema import migrate
+
+BENCH_MONGODB_URI = os.environ.get(
+    'BENCH_MONGODB_URI') or 'mongodb://localhost:27017/fantasy_betting_bench'
+
+
+def connect(uri: str = None):
+    """Point the global database at a fresh benchmark database"""
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config['MONGODB_URI'] = uri or BENCH_MONGODB_URI
+    db.init_app(app)
+    reset()
+    return app
+
+
+def create_bench_app(**overrides):
+    """Create the real application bound to the benchmark database"""
+    # app.py builds an app at import time; make that one use the bench database too
+    os.environ['MONGODB_URI'] = BENCH_MONGODB_URI
+    from app import create_app
+
+    app = create_app('testing')
+    app.config.update(WTF_CSRF_ENABLED=False, **overrides)
+    connect()
+    return app
+
+
+def register_user(client, username: str, password: str = 'benchmark'):
+    """Register (and log in) a user through the real auth routes"""
+    return client.post('/auth/register', data={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': password,
+        'confirm_password': password
+    })
+
+
+def reset():
+    """Drop every collection in the benchmark database and re-apply the schema"""
+    for name in db.db.list_collection_names():
+        db.db.drop_collection(name)
+    migrate(db.db)
+
+
+def seed_league(member_count: int, balance: float = 1000.0, name: str = 'Bench League'):
+    """Insert a league with member_count members and return (league_id, user_ids)"""
+    user_ids = [ObjectId() for _ in range(member_count)]
+    league_id = db.get_collection('leagues').insert_one({
+        'name': name,
+        'description': 'benchmark',
+        'creator_id': user_ids[0] if user_ids else None,
+        'admins': user_ids[:1],
+        'member_count': member_count,
+        'starting_balance': balance,
+        'status': 'active',
+        'invite_code': ObjectId().binary.hex()[-8:].upper()
+    }).inserted_id
+    if user_ids:
+        db.get_collection('memberships').insert_many([
+            dict({'league_id': league_id, 'user_id': uid, 'username': f'user{i}',
+                  'balance': balance, 'joined_at': None}, **dict.fromkeys(STATS_COUNTERS, 0))
+            for i, uid in enumerate(user_ids)
+        ])
+    return league_id, user_ids
+
+
+def seed_ticket(league_id: ObjectId, options=('Home', 'Away'), odds: float = 2.0):
+    """Insert an open moneyline ticket and return its id"""
+    from datetime import datetime
+    return db.get_collection('tickets').insert_one({
+        'league_id': league_id,
+        'title': 'Bench ticket',
+        'description': '',
+        'type': 'moneyline',
+        'options': [{'option_text': text, 'odds': odds} for text in options],
+        'target_value': None,
+        'status': 'open',
+        'resolution': None,
+        'created_by': None,
+        'created_at': datetime.utcnow(),
+        'closes_at': None,
+        'resolved_at': None
+    }).inserted_id
+
+
+@contextmanager
+def timed(results: dict, key: str):
+    """Store the wall-clock seconds spent in the block under results[key]"""
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
+
+
+class CommandCount(monitoring.CommandListener):
+    """Count MongoDB commands, in total and per label (set local.label on the issuing thread); thread-safe"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.total = 0
+            self.by_label = defaultdict(int)
+
+    def started(self, event):
+        label = getattr(self.local, 'label', None)
+        with self.lock:
+            self.total += 1
+            if label:
+                self.by_label[label] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentiles(samples):
+    """Return p50/p95/p99 (milliseconds) for a list of second durations"""
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        'p50': round(pick(0.50), 3),
+        'p95': round(pick(0.95), 3),
+        'p99': round(pick(0.99), 3),
+        'mean': round(statistics.fmean(ordered) * 1000, 3)
+    }
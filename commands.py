@@ -0,0 +1,139 @@
+"""Maintenance commands for the Fantasy Betting League application"""
+import click
+from bson import ObjectId
+
+
+def register_commands(app):
+    """Register CLI commands on the application"""
+
+    @app.cli.command('settle-ticket')
+    @click.argument('ticket_id')
+    def settle_ticket(ticket_id):
+        """Re-run settlement for a resolved ticket (safe to repeat)"""
+        from jobs import job_workers
+        from models.job import ResolutionJob
+        from models.ticket import Ticket
+
+        ticket = Ticket.get_by_id(ticket_id)
+        if not ticket:
+            raise click.ClickException('Ticket not found.')
+        if ticket.status != 'resolved' or not ticket.resolution:
+            raise click.ClickException('Ticket has not been resolved yet.')
+
+        job = ResolutionJob.create(ticket._id, ticket.league_id, ticket.resolution)
+        if not job:
+            raise click.ClickException('Could not queue the settlement job.')
+        if job.status in ('done', 'failed'):
+            job.restart()
+
+        job = job_workers.run_inline(job)
+        if not job or job.status != 'done':
+            raise click.ClickException('The settlement job is running elsewhere or failed; '
+                                       'check /tickets/api/<ticket_id>/resolution.')
+        click.echo(f'{job.won} bets won, {job.lost} bets lost.')
+
+    @app.cli.command('run-scheduler')
+    def run_scheduler():
+        """Run the periodic tasks in this process (alongside or instead of the worker threads)"""
+        from scheduler import ledger_compactor, ticket_scheduler
+
+        if ledger_compactor.start():
+            click.echo(f'Compacting the ledger every {ledger_compactor.interval}s while holding its lease.')
+        click.echo(f'Closing due tickets every {ticket_scheduler.interval}s while holding its lease.')
+        ticket_scheduler.run()
+
+    @app.cli.command('compact-ledger')
+    @click.argument('league_id', required=False)
+    def compact_ledger(league_id):
+        """Fold new balance ledger entries into member snapshots now"""
+        from database import get_db
+        from models import ledger
+
+        if league_id:
+            league_ids = [ObjectId(league_id)]
+        else:
+            league_ids = get_db().get_collection('leagues').distinct('_id')
+
+        for league_id in league_ids:
+            click.echo(f'{league_id}: wrote {ledger.compact(league_id)} snapshots')
+
+    @app.cli.command('check-ledger')
+    @click.argument('league_id', required=False)
+    def check_ledger(league_id):
+        """Compare member balances with the ledger and fail on drift"""
+        from database import get_db
+        from models import ledger
+
+        if league_id:
+            league_ids = [ObjectId(league_id)]
+        else:
+            league_ids = get_db().get_collection('leagues').distinct('_id')
+
+        drifted = 0
+        for league_id in league_ids:
+            for member in ledger.find_drift(league_id):
+                drifted += 1
+                click.echo(f'{league_id}: {member["username"]} ({member["user_id"]}) has '
+                           f'{member["balance"]}, ledger says {member["ledger_balance"]}')
+
+        if drifted:
+            raise click.ClickException(f'{drifted} balance(s) differ from the ledger.')
+        click.echo('Every balance matches the ledger.')
+
+    @app.cli.command('run-jobs')
+    def run_jobs():
+        """Run ticket resolution jobs in this process (alongside or instead of the worker threads)"""
+        from jobs import job_workers
+
+        click.echo(f'Settling resolved tickets {job_workers.chunk_size} bets at a time.')
+        job_workers.run()
+
+    @app.cli.command('rebuild-member-stats')
+    @click.argument('league_id', required=False)
+    def rebuild_member_stats(league_id):
+        """Recompute league members' stats counters from the bets collection"""
+        from database import get_db
+        from models.league import League
+
+        if league_id:
+            league_ids = [ObjectId(league_id)]
+        else:
+            league_ids = get_db().get_collection('leagues').distinct('_id')
+
+        for league_id in league_ids:
+            count = League.rebuild_member_stats(league_id)
+            click.echo(f'{league_id}: rebuilt stats for {count} members')
+
+    @app.cli.command('migrate')
+    @click.option('--to', 'target', type=int, default=None,
+                  help='Schema version to migrate to (default: latest).')
+    def migrate(target):
+        """Create indexes and apply pending schema migrations"""
+        from database import get_db
+        from schema import SCHEMA_VERSION, get_schema_version, migrate as apply_migrations
+
+        db = get_db().db
+        applied = apply_migrations(db, target or SCHEMA_VERSION)
+        if applied:
+            click.echo(f'Applied migrations {", ".join(map(str, applied))}.')
+        click.echo(f'Schema is at version {get_schema_version(db)} (latest {SCHEMA_VERSION}).')
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Explain every query shape and fail on collection scans or in-memory sorts"""
+        from database import get_db
+        from schema import BAD_STAGES, QUERY_SHAPES, explain_command, plan_stages
+
+        db = get_db().db
+        failures = 0
+        for name, (collection, shape) in QUERY_SHAPES.items():
+            explain = db.command('explain', explain_command(collection, shape),
+                                 verbosity='queryPlanner')
+            stages = list(plan_stages(explain.get('queryPlanner', explain)))
+            bad = BAD_STAGES.intersection(stages)
+            failures += bool(bad)
+            status = 'FAIL' if bad else 'ok'
+            click.echo(f'{status:4} {name}: {" <- ".join(stages)}')
+
+        if failures:
+            raise click.ClickException(f'{failures} query shape(s) not covered by an index.')
@@ -18,6 +18,14 @@ class Config:
     MONGODB_SERVER_SELECTION_TIMEOUT_MS = 5000  # 5 seconds
     MONGODB_SOCKET_TIMEOUT_MS = 20000  # 20 seconds
 
+    # Connection pool, per worker process (each worker creates its own client)
+    MONGODB_MAX_POOL_SIZE = int(os.environ.get('MONGODB_MAX_POOL_SIZE') or 50)
+    MONGODB_MIN_POOL_SIZE = int(os.environ.get('MONGODB_MIN_POOL_SIZE') or 5)
+    MONGODB_MAX_IDLE_TIME_MS = 30000  # 30 seconds
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = 5000  # 5 seconds
+    # Wire compression, e.g. "zstd,snappy,zlib" (zstd and snappy need extra packages)
+    MONGODB_COMPRESSORS = os.environ.get('MONGODB_COMPRESSORS') or None
+
     # Flask-Mail configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -26,6 +34,44 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
 
+    # Flask-Login user loader cache (set either to 0 to disable)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL') or 60)  # seconds
+
+    # Live updates (Server-Sent Events). Enable the change stream to fan events
+    # out across worker processes; it needs MongoDB running as a replica set.
+    EVENTS_CHANGE_STREAM = os.environ.get('EVENTS_CHANGE_STREAM', 'false').lower() in [
+        'true', 'on', '1']
+    EVENTS_QUEUE_SIZE = 100  # Buffered events per open stream
+    EVENTS_KEEPALIVE_SECONDS = 15
+
+    # Close tickets automatically once closes_at passes. Each worker runs a
+    # scheduler thread; a lease in MongoDB lets one of them at a time work.
+    TICKET_SCHEDULER = os.environ.get('TICKET_SCHEDULER', 'true').lower() in [
+        'true', 'on', '1']
+    TICKET_SCHEDULER_INTERVAL_SECONDS = 30
+    TICKET_SCHEDULER_LEASE_SECONDS = 90  # A dead leader is replaced after this
+
+    # Fold new balance ledger entries into member snapshots, the same way
+    LEDGER_COMPACTION = os.environ.get('LEDGER_COMPACTION', 'true').lower() in [
+        'true', 'on', '1']
+    LEDGER_COMPACTION_INTERVAL_SECONDS = 300
+    LEDGER_COMPACTION_LEASE_SECONDS = 900
+
+    # Settle resolved tickets in background jobs, this many threads per worker
+    # process (0 settles in the resolving request instead).
+    RESOLUTION_WORKERS = int(os.environ.get('RESOLUTION_WORKERS') or 2)
+    RESOLUTION_CHUNK_SIZE = 1000  # Bets settled and checkpointed at a time
+    RESOLUTION_LEASE_SECONDS = 60  # A dead worker's job is resumed after this
+    RESOLUTION_POLL_SECONDS = 5
+
+    # Group commit: queue bet placements per league for a few milliseconds and
+    # write each batch in bulk (helps when many members bet at once)
+    BET_GROUP_COMMIT = os.environ.get('BET_GROUP_COMMIT', 'false').lower() in [
+        'true', 'on', '1']
+    BET_GROUP_COMMIT_WINDOW_MS = 5
+    BET_GROUP_COMMIT_MAX_BATCH = 500
+
     # Application settings
     PER_PAGE = 20  # Items per page for pagination
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -52,6 +98,9 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     MONGODB_URI = 'mongodb://localhost:27017/fantasy_betting_test'
+    TICKET_SCHEDULER = False
+    LEDGER_COMPACTION = False
+    RESOLUTION_WORKERS = 0
 
 
 # Configuration dictionary
@@ -1,7 +1,11 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from config import Config
+from schema import SCHEMA_VERSION, get_schema_version
 import logging
+import os
+import threading
+import weakref
 import certifi
 
 # Configure logging
@@ -10,55 +14,109 @@ logger = logging.getLogger(__name__)
 
 
 class Database:
-    """Database connection manager"""
+    """Database connection manager.
+
+    init_app only records the connection settings. The MongoClient is created
+    on first use in each process and discarded in forked children, so pre-fork
+    servers (gunicorn --preload) never share pools or monitor threads.
+    """
 
     def __init__(self, app=None):
-        self.client = None
-        self.db = None
+        self._uri = None
+        self._options = {}
+        self._db_name = None
+        self._client = None
+        self._database = None
+        self._pid = None
+        self._lock = threading.Lock()
+        _instances.add(self)
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app):
-        """Initialize database connection"""
+        """Record connection settings; the client is created lazily"""
+        mongodb_uri = app.config['MONGODB_URI']
+
+        # Connection options for better reliability; pool sizes are per process
+        connection_options = {
+            'serverSelectionTimeoutMS': app.config.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            'connectTimeoutMS': app.config.get('MONGODB_CONNECT_TIMEOUT_MS', 10000),
+            'socketTimeoutMS': app.config.get('MONGODB_SOCKET_TIMEOUT_MS', 20000),
+            'retryWrites': True,
+            'retryReads': True,
+            'maxPoolSize': app.config.get('MONGODB_MAX_POOL_SIZE', 50),
+            'minPoolSize': app.config.get('MONGODB_MIN_POOL_SIZE', 5),
+            'maxIdleTimeMS': app.config.get('MONGODB_MAX_IDLE_TIME_MS', 30000),
+            'waitQueueTimeoutMS': app.config.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000),
+            'tlsCAFile': certifi.where()  # Use certifi for TLS certificates
+        }
+        compressors = app.config.get('MONGODB_COMPRESSORS')
+        if compressors:
+            connection_options['compressors'] = compressors
+
+        with self._lock:
+            self._discard_client()
+            self._uri = mongodb_uri
+            self._options = connection_options
+            self._db_name = self._extract_database_name(mongodb_uri)
+
+    @property
+    def client(self) -> MongoClient:
+        """This process's MongoClient, created on first use"""
+        self._ensure_connected()
+        return self._client
+
+    @property
+    def db(self):
+        """The application database on this process's client"""
+        self._ensure_connected()
+        return self._database
+
+    def _ensure_connected(self):
+        """Create the client if this process does not have one yet"""
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # A client inherited across fork is never reused
+                    self._client = self._database = None
+                    self._connect()
+
+    def _connect(self):
+        """Create the client for the current process"""
+        if self._uri is None:
+            raise RuntimeError("Database.init_app() has not been called")
         try:
-            # Parse MongoDB URI to extract connection parameters
-            mongodb_uri = app.config['MONGODB_URI']
-
-            # Connection options for better reliability
-            connection_options = {
-                'serverSelectionTimeoutMS': app.config.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
-                'connectTimeoutMS': app.config.get('MONGODB_CONNECT_TIMEOUT_MS', 10000),
-                'socketTimeoutMS': app.config.get('MONGODB_SOCKET_TIMEOUT_MS', 20000),
-                'retryWrites': True,
-                'retryReads': True,
-                'maxPoolSize': 50,
-                'minPoolSize': 5,
-                'maxIdleTimeMS': 30000,
-                'waitQueueTimeoutMS': 5000,
-                'tlsCAFile': certifi.where()  # Use certifi for TLS certificates
-            }
-
-            self.client = MongoClient(mongodb_uri, **connection_options)
-
-            # Test the connection
-            self.client.server_info()
-
-            # Get database name from URI
-            db_name = self._extract_database_name(mongodb_uri)
-            self.db = self.client[db_name]
-
-            # Create indexes for better performance
-            self.create_indexes()
-
-            logger.info(f"✅ Connected to MongoDB database: {db_name}")
+            self._client = MongoClient(self._uri, **self._options)
+            self._database = self._client[self._db_name]
+            self._pid = os.getpid()
+
+            # Indexes are managed by `flask migrate`; a single read of the
+            # applied schema version also tests the connection
+            self.check_schema()
+
+            logger.info(f"✅ Connected to MongoDB database: {self._db_name} (pid {self._pid})")
             logger.info(
-                f"📍 Connection URI: {mongodb_uri.replace(mongodb_uri.split('@')[0].split('://')[1], '***') if '@' in mongodb_uri else mongodb_uri}")
+                f"📍 Connection URI: {self._uri.replace(self._uri.split('@')[0].split('://')[1], '***') if '@' in self._uri else self._uri}")
 
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             logger.error(f"❌ Failed to connect to MongoDB: {e}")
-            logger.error(f"📍 URI: {mongodb_uri}")
+            logger.error(f"📍 URI: {self._uri}")
+            self._discard_client()
             raise
 
+    def _discard_client(self):
+        """Close this process's client, if any"""
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
+        self._client = self._database = None
+        self._pid = None
+
+    def _reset_after_fork(self):
+        """Drop the parent's client in a forked child without touching its sockets"""
+        self._client = self._database = None
+        self._pid = None
+        self._lock = threading.Lock()
+
     def _extract_database_name(self, uri):
         """Extract database name from MongoDB URI"""
         try:
@@ -81,36 +139,14 @@ class Database:
                 f"Could not extract database name from URI, using default: {e}")
             return 'fantasy_betting'
 
-    def create_indexes(self):
-        """Create database indexes for better performance"""
-        try:
-            # Users collection indexes
-            self.db.users.create_index("email", unique=True)
-            self.db.users.create_index("username", unique=True)
-
-            # Leagues collection indexes
-            self.db.leagues.create_index(
-                "invite_code", unique=True, sparse=True)
-            self.db.leagues.create_index("creator_id")
-            self.db.leagues.create_index("members.user_id")
-
-            # Tickets collection indexes
-            self.db.tickets.create_index("league_id")
-            self.db.tickets.create_index("status")
-            self.db.tickets.create_index("created_by")
-            self.db.tickets.create_index([("league_id", 1), ("status", 1)])
-
-            # Bets collection indexes
-            self.db.bets.create_index("user_id")
-            self.db.bets.create_index("league_id")
-            self.db.bets.create_index("ticket_id")
-            self.db.bets.create_index("status")
-            self.db.bets.create_index([("user_id", 1), ("league_id", 1)])
-
-            logger.info("Database indexes created successfully")
-
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
+    def check_schema(self):
+        """Warn if the database is behind the schema this code expects"""
+        version = get_schema_version(self._database)
+        if version < SCHEMA_VERSION:
+            logger.warning(
+                f"⚠️ Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+                f"Run `flask migrate` to create missing indexes.")
+        return version
 
     def get_collection(self, collection_name):
         """Get a collection from the database"""
@@ -118,11 +154,24 @@ class Database:
 
     def close_connection(self):
         """Close database connection"""
-        if self.client:
-            self.client.close()
+        if self._client is not None:
+            with self._lock:
+                self._discard_client()
             logger.info("MongoDB connection closed")
 
 
+# Every Database, so forked children can drop the clients they inherited
+_instances = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for database in list(_instances):
+        database._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 # Global database instance
 db = Database()
 
@@ -0,0 +1,141 @@
+"""Publish/subscribe bus for live league updates, streamed as Server-Sent Events.
+
+Routes publish to a league's channel; each open /leagues/<id>/events stream
+holds a Subscription. By default events only reach subscribers in the same
+process. With EVENTS_CHANGE_STREAM enabled, publish() inserts into the
+`events` collection instead and every process delivers what its change
+stream sees, so all workers stay in sync (requires a replica set).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from database import get_db
+from json_provider import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A bounded queue of events for one channel; use as a context manager"""
+
+    def __init__(self, bus: 'EventBus', channel: str, maxsize: int):
+        self.bus = bus
+        self.channel = channel
+        self.queue = queue.Queue(maxsize)
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for the next event"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventBus:
+    """Fan events out to the subscribers of a channel"""
+
+    def __init__(self):
+        self.change_stream = False
+        self.queue_size = 100
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def init_app(self, app):
+        """Read EVENTS_* settings from the app config"""
+        self.change_stream = app.config.get('EVENTS_CHANGE_STREAM', False)
+        self.queue_size = app.config.get('EVENTS_QUEUE_SIZE', 100)
+
+    def subscribe(self, channel) -> Subscription:
+        """Start receiving events published to channel"""
+        subscription = Subscription(self, str(channel), self.queue_size)
+        with self._lock:
+            self._subscribers[subscription.channel].add(subscription)
+        if self.change_stream:
+            self._ensure_watcher()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event_type: str, data: Dict[str, Any]):
+        """Send an event to every subscriber of channel"""
+        event = {'channel': str(channel), 'type': event_type, 'data': data}
+        if self.change_stream:
+            try:
+                get_db().get_collection('events').insert_one(
+                    dict(event, created_at=datetime.utcnow()))
+                return  # Delivered locally by this process's change stream
+            except Exception as e:
+                logger.error(f"Error publishing {event_type} event, delivering locally: {e}")
+        self._deliver(event)
+
+    def _deliver(self, event: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event['channel'], ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                pass  # Slow client; it resyncs on its next page load
+
+    def _ensure_watcher(self):
+        """Start this process's change stream watcher if it is not running"""
+        with self._lock:
+            if self._watcher_pid == os.getpid() and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, name='event-bus-watcher', daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watch(self):
+        """Deliver every event inserted by any process"""
+        pipeline = [{'$match': {'operationType': 'insert'}}]
+        while True:
+            try:
+                with get_db().get_collection('events').watch(pipeline) as stream:
+                    for change in stream:
+                        document = change['fullDocument']
+                        self._deliver({key: document[key] for key in ('channel', 'type', 'data')})
+            except Exception as e:
+                logger.error(f"Event change stream failed, retrying: {e}")
+                time.sleep(1)
+
+
+def to_sse(event_type: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event_type}\ndata: {dumps(data)}\n\n"
+
+
+# Global event bus instance
+event_bus = EventBus()
+
+
+def publish_ticket_status(ticket):
+    """Push a ticket's current status to the league's live update stream"""
+    event_bus.publish(ticket.league_id, 'ticket', {
+        'id': ticket._id,
+        'title': ticket.title,
+        'status': ticket.status,
+        'resolution': ticket.resolution
+    })
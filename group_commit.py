@@ -0,0 +1,92 @@
+"""Group commit of bet placements, for bursts of betting in one league.
+
+With BET_GROUP_COMMIT on, a bet placement waits up to
+BET_GROUP_COMMIT_WINDOW_MS for other placements in the same league and the
+lot is written by Bet.place_many: one bulk debit of member balances, one
+insert_many of bets and one league version bump, instead of a debit, an
+insert and two version bumps per bet. The first request to arrive leads the
+batch and does the writes; the others wait for it and each get back their
+own result. Batching is per worker process.
+"""
+import threading
+from typing import Optional
+from bson import ObjectId
+from models import identity_map
+from models.bet import Bet
+
+
+class _Batch:
+    """Placements waiting to be written together"""
+
+    __slots__ = ('placements', 'results', 'full', 'done')
+
+    def __init__(self):
+        self.placements = []
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class BetBatcher:
+    """Collect concurrent bet placements per league and write them in bulk"""
+
+    def __init__(self):
+        self.enabled = False
+        self.window = 0.005
+        self.max_batch = 500
+        self.wait_timeout = 20.005
+        self._open = {}  # league_id -> _Batch still taking placements
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read BET_GROUP_COMMIT_* settings"""
+        self.enabled = app.config.get('BET_GROUP_COMMIT', False)
+        self.window = app.config.get('BET_GROUP_COMMIT_WINDOW_MS', 5) / 1000
+        self.max_batch = app.config.get('BET_GROUP_COMMIT_MAX_BATCH', 500)
+        # A leader stuck in place_many would otherwise hold its followers forever
+        self.wait_timeout = self.window + app.config.get('MONGODB_SOCKET_TIMEOUT_MS', 20000) / 1000
+
+    def place(self, user_id: ObjectId, league_id: ObjectId, ticket_id: ObjectId,
+              amount: float, selected_option: str, odds: float) -> Optional[Bet]:
+        """Place a bet, as part of a batch when group commit is on (see Bet.place)"""
+        if not self.enabled:
+            return Bet.place(user_id, league_id, ticket_id, amount, selected_option, odds)
+
+        with self._lock:
+            batch = self._open.get(league_id)
+            leader = batch is None
+            if leader:
+                batch = self._open[league_id] = _Batch()
+            index = len(batch.placements)
+            batch.placements.append({'user_id': user_id, 'ticket_id': ticket_id, 'amount': amount,
+                                     'selected_option': selected_option, 'odds': odds})
+            if len(batch.placements) >= self.max_batch:
+                del self._open[league_id]  # Full: later placements start a new batch
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(league_id) is batch:
+                    del self._open[league_id]
+            try:
+                batch.results = Bet.place_many(league_id, batch.placements)
+            except Exception as e:
+                print(f"Error placing batched bets: {e}")
+                batch.results = [None] * len(batch.placements)
+            finally:
+                batch.done.set()
+        else:
+            if not batch.done.wait(self.wait_timeout):
+                # Reported as failed; the bet may still land if the leader recovers
+                print("Error placing batched bets: timed out waiting for the batch")
+                return None
+            # The leader's writes only cleared its own request's identity map
+            identity_map.invalidate('leagues', league_id)
+            identity_map.invalidate('bets')
+
+        return batch.results[index]
+
+
+# Global batcher instance
+bet_batcher = BetBatcher()
@@ -0,0 +1,99 @@
+"""Background settlement of resolved tickets, kept out of the request path.
+
+Resolving a ticket queues a ResolutionJob (models/job.py) instead of settling
+every bet inside the admin's request. Each worker process runs a small pool
+of threads, started on its first request, that claim queued jobs and settle
+them RESOLUTION_CHUNK_SIZE bets at a time, publishing each chunk's balance
+changes to the league stream as it goes. A job whose worker dies is picked up
+by another one once its lease runs out and carries on from the last chunk
+checkpointed. Idle workers also queue jobs for resolved tickets whose request
+died between resolving the ticket and queuing its job. `flask run-jobs` runs
+a worker in a dedicated process instead.
+"""
+import logging
+import threading
+from background import ProcessThreads, worker_id
+from events import event_bus, publish_ticket_status
+from models.job import ResolutionJob
+from models.league import League
+from models.ticket import Ticket
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorkers:
+    """Run resolution jobs on a pool of threads"""
+
+    def __init__(self):
+        self.workers = 0
+        self.chunk_size = 1000
+        self.lease_seconds = 60
+        self.poll_interval = 5
+        self.threads = ProcessThreads(self.run, 'resolution-worker')
+        self._wake = threading.Event()
+
+    def init_app(self, app):
+        """Read RESOLUTION_* settings and start the threads on the first request"""
+        self.workers = app.config.get('RESOLUTION_WORKERS', 0)
+        self.chunk_size = app.config.get('RESOLUTION_CHUNK_SIZE', 1000)
+        self.lease_seconds = app.config.get('RESOLUTION_LEASE_SECONDS', 60)
+        self.poll_interval = app.config.get('RESOLUTION_POLL_SECONDS', 5)
+        self.threads.count = self.workers
+        if self.workers:
+            app.before_request(self.threads.ensure_running)
+
+    def notify(self):
+        """Wake idle workers so a newly queued job starts straight away"""
+        self._wake.set()
+
+    def run(self):
+        """Claim and run jobs until the process exits; never returns"""
+        worker = worker_id()
+        while True:
+            try:
+                job = ResolutionJob.claim(worker, self.lease_seconds)
+                if job:
+                    self.process(job, worker)
+                    continue
+                if ResolutionJob.queue_missing():
+                    continue
+            except Exception as e:
+                logger.error(f"Resolution worker failed, retrying: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def run_inline(self, job: ResolutionJob):
+        """Claim and run one job in the calling thread (when there are no worker threads)"""
+        worker = worker_id()
+        claimed = ResolutionJob.claim(worker, self.lease_seconds, job.ticket_id)
+        if claimed:
+            self.process(claimed, worker)
+        return ResolutionJob.get_for_ticket(job.ticket_id)
+
+    def process(self, job: ResolutionJob, worker: str):
+        """Settle a claimed job chunk by chunk, publishing each chunk's payouts"""
+        try:
+            while True:
+                payouts = job.run_chunk(worker, self.chunk_size, self.lease_seconds)
+                if payouts is None:
+                    break
+                if payouts:
+                    event_bus.publish(job.league_id, 'balance', {'deltas': {
+                        str(user_id): amount for user_id, amount in payouts.items()
+                    }})
+        except Exception as e:
+            # Left running: another claim resumes it from the checkpoint
+            logger.error(f"Resolution job {job._id} failed at {job.checkpoint}: {e}")
+            return
+
+        if job.status == 'done':
+            event_bus.publish(job.league_id, 'leaderboard',
+                              {'entries': League.get_top_members(job.league_id)})
+            ticket = Ticket.get_by_id(job.ticket_id)
+            if ticket:
+                publish_ticket_status(ticket)
+            logger.info(f"Resolution job {job._id} done: {job.won} won, {job.lost} lost")
+
+
+# Global worker pool instance
+job_workers = JobWorkers()
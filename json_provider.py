@@ -0,0 +1,75 @@
+"""JSON encoding for API responses and live update events.
+
+Serializes ObjectId, datetime, Decimal128 and model objects natively, so
+views can hand documents straight to jsonify. Uses orjson when it is
+installed (`pip install orjson`) and the stdlib encoder otherwise.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+from models.lazy import LazyFieldsMixin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def to_json_compatible(o: Any) -> Any:
+    """Convert a value the JSON encoders don't handle into one they do"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, LazyFieldsMixin):
+        return o.to_dict()
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _orjson_options(sort_keys: bool, indent: bool = False) -> int:
+    options = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        options |= orjson.OPT_SORT_KEYS
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    return options
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider for BSON types and models, with an orjson fast path"""
+
+    default = staticmethod(to_json_compatible)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Callers passing json.dumps options (indent, cls, ...) get the stdlib encoder
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=to_json_compatible,
+                                option=_orjson_options(self.sort_keys)).decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=to_json_compatible,
+                            option=_orjson_options(self.sort_keys, indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON outside a request (e.g. Server-Sent Events)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=to_json_compatible,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=to_json_compatible, separators=(',', ':'))
@@ -1,10 +1,28 @@
 from bson import ObjectId
 from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from database import get_db
+from models import identity_map, ledger
+from models.lazy import LazyFieldsMixin
+from models.league import DEBIT_BATCHES, MEMBERSHIPS, League
+from models.pagination import Page, paginate
+from models.stats import STATS_ACCUMULATORS, build_stats, combine_stats
+from models.sync import SYNC_TOKEN, TOMBSTONES, changed_query, new_token, record_deletion, stamp
 from typing import Optional, List, Dict, Any
 
-class Bet:
+# Member stats counters a bet placement moves
+BET_COUNTERS = ('total_bets', 'pending_bets', 'total_wagered')
+
+class Bet(LazyFieldsMixin):
     """Bet model for managing user bets"""
+
+    _COLLECTION = 'bets'
+    _FIELDS = {field: field for field in (
+        'user_id', 'league_id', 'ticket_id', 'amount', 'selected_option',
+        'potential_payout', 'status', 'placed_at'
+    )}
+    __slots__ = tuple(_FIELDS.values())
     
     def __init__(self, user_id: ObjectId = None, league_id: ObjectId = None,
                  ticket_id: ObjectId = None, amount: float = None,
@@ -19,6 +37,7 @@ class Bet:
         self.status = status  # 'pending', 'won', 'lost'
         self.placed_at = placed_at or datetime.utcnow()
         self._id = _id
+        self._loaded_fields = None
     
     def calculate_payout(self, odds: float) -> float:
         """Calculate potential payout based on odds"""
@@ -50,19 +69,14 @@ class Bet:
         """Check if bet is still pending"""
         return self.status == 'pending'
     
-    def save(self) -> ObjectId:
-        """Save bet to database"""
+    def save(self, sync_token: ObjectId = None) -> ObjectId:
+        """Save bet to database (marked with sync_token if given; the caller then stamps it)"""
         db = get_db()
         bet_data = {
-            'user_id': self.user_id,
-            'league_id': self.league_id,
-            'ticket_id': self.ticket_id,
-            'amount': self.amount,
-            'selected_option': self.selected_option,
-            'potential_payout': self.potential_payout,
-            'status': self.status,
-            'placed_at': self.placed_at
+            field: getattr(self, field) for field in self._FIELDS if self._is_loaded(field)
         }
+        token = sync_token or new_token()
+        bet_data.update({'updated_at': datetime.utcnow(), SYNC_TOKEN: token})
         
         if self._id:
             # Update existing bet
@@ -70,12 +84,17 @@ class Bet:
                 {'_id': self._id},
                 {'$set': bet_data}
             )
-            return self._id if result.modified_count > 0 else None
+            saved = result.modified_count > 0
         else:
             # Create new bet
             result = db.get_collection('bets').insert_one(bet_data)
             self._id = result.inserted_id
-            return self._id
+            saved = True
+        
+        identity_map.invalidate('bets', self._id)
+        if sync_token is None:
+            stamp('bets', {'_id': self._id}, token, League.bump_version(self.league_id))
+        return self._id if saved else None
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert bet to dictionary"""
@@ -95,75 +114,99 @@ class Bet:
     def get_by_id(cls, bet_id: str) -> Optional['Bet']:
         """Get bet by ID"""
         try:
-            db = get_db()
-            bet_data = db.get_collection('bets').find_one({'_id': ObjectId(bet_id)})
-            if bet_data:
-                return cls._from_dict(bet_data)
-            return None
+            bet_id = ObjectId(bet_id)
+            return identity_map.load('bets', bet_id, lambda: cls._find_one({'_id': bet_id}))
         except Exception as e:
             print(f"Error getting bet by ID: {e}")
             return None
     
     @classmethod
-    def get_user_bets(cls, user_id: ObjectId, league_id: ObjectId = None) -> List['Bet']:
-        """Get all bets for a user"""
+    def get_user_bets(cls, user_id: ObjectId, league_id: ObjectId = None,
+                      fields: List[str] = None, limit: int = None, after: str = None) -> Page:
+        """Get a user's bets, newest first, a page at a time when limit is given"""
         try:
-            db = get_db()
             query = {'user_id': user_id}
             if league_id:
                 query['league_id'] = league_id
-            
-            bets_data = db.get_collection('bets').find(query).sort('placed_at', -1)
-            return [cls._from_dict(bet_data) for bet_data in bets_data]
+            return cls._paginate(query, fields, limit, after)
         except Exception as e:
             print(f"Error getting user bets: {e}")
-            return []
+            return Page()
     
     @classmethod
-    def get_ticket_bets(cls, ticket_id: ObjectId) -> List['Bet']:
-        """Get all bets for a specific ticket"""
+    def get_ticket_bets(cls, ticket_id: ObjectId, fields: List[str] = None,
+                        limit: int = None, after: str = None) -> Page:
+        """Get bets for a specific ticket, newest first"""
         try:
-            db = get_db()
-            bets_data = db.get_collection('bets').find({'ticket_id': ticket_id}).sort('placed_at', -1)
-            return [cls._from_dict(bet_data) for bet_data in bets_data]
+            return cls._paginate({'ticket_id': ticket_id}, fields, limit, after)
         except Exception as e:
             print(f"Error getting ticket bets: {e}")
-            return []
+            return Page()
     
     @classmethod
-    def get_league_bets(cls, league_id: ObjectId, status: str = None) -> List['Bet']:
-        """Get all bets for a league"""
+    def get_league_bets(cls, league_id: ObjectId, status: str = None,
+                        fields: List[str] = None, limit: int = None, after: str = None) -> Page:
+        """Get bets for a league, newest first"""
         try:
-            db = get_db()
             query = {'league_id': league_id}
             if status:
                 query['status'] = status
-            
-            bets_data = db.get_collection('bets').find(query).sort('placed_at', -1)
-            return [cls._from_dict(bet_data) for bet_data in bets_data]
+            return cls._paginate(query, fields, limit, after)
         except Exception as e:
             print(f"Error getting league bets: {e}")
+            return Page()
+    
+    @classmethod
+    def get_changes(cls, league_id: ObjectId, since: int = None) -> List['Bet']:
+        """Get a league's bets changed after version since (all of them if None)"""
+        try:
+            db = get_db()
+            bets_data = db.get_collection('bets').find(changed_query(league_id, since))
+            return [cls._from_dict(bet_data) for bet_data in bets_data]
+        except Exception as e:
+            print(f"Error getting bet changes: {e}")
             return []
     
+    @classmethod
+    def _paginate(cls, query: Dict[str, Any], fields: List[str] = None,
+                  limit: int = None, after: str = None) -> Page:
+        """Keyset-paginate bets on (placed_at, _id)"""
+        return paginate(
+            get_db().get_collection('bets'), query, 'placed_at',
+            lambda data: cls._from_dict(data, fields),
+            cls._projection(fields) if fields else None, limit, after
+        )
+    
     @classmethod
     def get_user_ticket_bet(cls, user_id: ObjectId, ticket_id: ObjectId) -> Optional['Bet']:
         """Get user's bet for a specific ticket"""
         try:
-            db = get_db()
-            bet_data = db.get_collection('bets').find_one({
+            return identity_map.load('bets', ('user_ticket', user_id, ticket_id), lambda: cls._find_one({
                 'user_id': user_id,
                 'ticket_id': ticket_id
-            })
-            if bet_data:
-                return cls._from_dict(bet_data)
-            return None
+            }), alias=True)
         except Exception as e:
             print(f"Error getting user ticket bet: {e}")
             return None
     
+    @classmethod
+    def get_user_ticket_bets(cls, user_id: ObjectId, ticket_ids: List[ObjectId]) -> List['Bet']:
+        """Get a user's bets on any of ticket_ids in one query"""
+        try:
+            db = get_db()
+            bets_data = db.get_collection('bets').find({
+                'user_id': user_id,
+                'ticket_id': {'$in': list(ticket_ids)}
+            })
+            return [cls._from_dict(bet_data) for bet_data in bets_data]
+        except Exception as e:
+            print(f"Error getting user ticket bets: {e}")
+            return []
+    
     @classmethod
     def create_bet(cls, user_id: ObjectId, league_id: ObjectId, ticket_id: ObjectId,
-                  amount: float, selected_option: str, odds: float) -> Optional['Bet']:
+                  amount: float, selected_option: str, odds: float,
+                  sync_token: ObjectId = None) -> Optional['Bet']:
         """Create new bet"""
         try:
             potential_payout = amount * odds
@@ -176,7 +219,7 @@ class Bet:
                 selected_option=selected_option,
                 potential_payout=potential_payout
             )
-            bet_id = bet.save()
+            bet_id = bet.save(sync_token)
             
             if bet_id:
                 return bet
@@ -187,89 +230,234 @@ class Bet:
             return None
     
     @classmethod
-    def resolve_bets(cls, ticket_id: ObjectId, winning_option: str) -> Dict[str, int]:
-        """Resolve all bets for a ticket"""
+    def place(cls, user_id: ObjectId, league_id: ObjectId, ticket_id: ObjectId,
+              amount: float, selected_option: str, odds: float) -> Optional['Bet']:
+        """Debit the member's stake and record the bet"""
+        # The debit only matches while the balance still covers the stake,
+        # so concurrent bets can neither overdraw nor overwrite each other
+        counters = {'total_bets': 1, 'pending_bets': 1, 'total_wagered': amount}
+        token = new_token()
+        if not League.debit_member(league_id, user_id, amount, counters, token=token, record=False):
+            return None
+
+        bet = cls.create_bet(user_id, league_id, ticket_id, amount, selected_option, odds, token)
+        if bet:
+            ledger.append([ledger.entry(league_id, user_id, -amount, 'stake', f'stake:{bet._id}')])
+        else:
+            # Bet could not be recorded (e.g. the unique (user_id, ticket_id)
+            # index rejected a second bet on this ticket) - give the stake
+            # back; the ledger only records stakes that bought a bet
+            League.credit_member(league_id, user_id, amount, cls._negate(counters),
+                                 token=token, record=False)
+
+        # The debit and the new bet (or the refund) share one token and one version bump
+        version = League.bump_version(league_id, member_token=token)
+        if bet:
+            stamp('bets', {'_id': bet._id}, token, version)
+        return bet
+
+    @classmethod
+    def place_many(cls, league_id: ObjectId, placements: List[Dict[str, Any]]) -> List[Optional['Bet']]:
+        """Place several bets in one league with a few bulk writes; returns a Bet or None per placement.
+
+        placements are dicts of place()'s user_id, ticket_id, amount,
+        selected_option and odds. Each member's stakes are debited together
+        by one conditional $inc, the bets are inserted by one insert_many and
+        the league version is bumped once for the lot. If anything fails
+        after the debits, every stake taken is given back.
+        """
+        db = get_db()
+        bets = [cls(user_id=placement['user_id'], league_id=league_id,
+                    ticket_id=placement['ticket_id'], amount=placement['amount'],
+                    selected_option=placement['selected_option'],
+                    potential_payout=placement['amount'] * placement['odds'], _id=ObjectId())
+                for placement in placements]
+
+        # Drop bets by non-members or that the balance cannot cover up front,
+        # so the debits below normally all match
+        balances = {member['user_id']: member['balance'] for member in db.get_collection(MEMBERSHIPS).find(
+            {'league_id': league_id, 'user_id': {'$in': list({bet.user_id for bet in bets})}},
+            {'_id': 0, 'user_id': 1, 'balance': 1})}
+        counters, placed = {}, []
+        for bet in bets:
+            if bet.user_id not in balances:
+                continue
+            member_counters = counters.setdefault(bet.user_id, dict.fromkeys(BET_COUNTERS, 0))
+            if member_counters['total_wagered'] + bet.amount <= balances[bet.user_id]:
+                cls._add_counters(member_counters, bet, 1)
+                placed.append(bet)
+        counters = {user_id: member_counters for user_id, member_counters in counters.items()
+                    if member_counters['total_bets']}
+        if not placed:
+            return [None] * len(bets)
+
+        token = new_token()
+        debited, rejected, refunded = set(), [], []
+        try:
+            # Each debit also adds the batch to the member's debit_batches:
+            # unlike the sync token, no other write can take it away, so it
+            # tells which debits matched if some did not
+            result = db.get_collection(MEMBERSHIPS).bulk_write([
+                UpdateOne({'league_id': league_id, 'user_id': user_id,
+                           'balance': {'$gte': member_counters['total_wagered']}},
+                          {'$inc': dict(member_counters, balance=-member_counters['total_wagered']),
+                           '$set': {SYNC_TOKEN: token}, '$addToSet': {DEBIT_BATCHES: token}})
+                for user_id, member_counters in counters.items()
+            ], ordered=False)
+            if result.modified_count == len(counters):
+                debited = set(counters)
+            else:
+                debited = cls._debited_members(league_id, list(counters), token)
+            placed = [bet for bet in placed if bet.user_id in debited]
+
+            # The unique (user_id, ticket_id) index rejects second bets on a
+            # ticket; their stakes are given back
+            now = datetime.utcnow()
+            try:
+                if placed:
+                    db.get_collection('bets').insert_many([
+                        dict({field: getattr(bet, field) for field in cls._FIELDS},
+                             _id=bet._id, updated_at=now, **{SYNC_TOKEN: token})
+                        for bet in placed
+                    ], ordered=False)
+            except BulkWriteError as e:
+                rejected = [placed[error['index']] for error in e.details.get('writeErrors', [])]
+                cls._refund_many(league_id, rejected, token)
+                refunded = rejected
+        except Exception as e:
+            # Like place(), give back every stake taken, whatever got written
+            print(f"Error placing bets: {e}")
+            if not debited:
+                debited = cls._debited_members(league_id, list(counters), token)
+            placed = [bet for bet in placed if bet.user_id in debited]
+            db.get_collection('bets').delete_many({'_id': {'$in': [bet._id for bet in placed]}})
+            refunded_ids = {bet._id for bet in refunded}
+            cls._refund_many(league_id, [bet for bet in placed if bet._id not in refunded_ids], token)
+            rejected = placed
+        finally:
+            try:
+                db.get_collection(MEMBERSHIPS).update_many(
+                    {'league_id': league_id, 'user_id': {'$in': list(counters)}, DEBIT_BATCHES: token},
+                    {'$pull': {DEBIT_BATCHES: token}})
+            except Exception as e:
+                print(f"Error clearing debit batch: {e}")
+
+        # Stakes given straight back leave nothing in the ledger
+        rejected_ids = {bet._id for bet in rejected}
+        placed = [bet for bet in placed if bet._id not in rejected_ids]
+        ledger.append(ledger.entry(league_id, bet.user_id, -bet.amount, 'stake', f'stake:{bet._id}')
+                      for bet in placed)
+        identity_map.invalidate('leagues', league_id)
+        identity_map.invalidate('bets')
+        stamp('bets', {'league_id': league_id}, token, League.bump_version(league_id, member_token=token))
+
+        placed_ids = {bet._id for bet in placed}
+        return [bet if bet._id in placed_ids else None for bet in bets]
+
+    @staticmethod
+    def _debited_members(league_id: ObjectId, user_ids: List[ObjectId], token: ObjectId) -> set:
+        """Get which of user_ids the place_many batch token debited"""
+        members = get_db().get_collection(MEMBERSHIPS).find(
+            {'league_id': league_id, 'user_id': {'$in': user_ids}, DEBIT_BATCHES: token},
+            {'_id': 0, 'user_id': 1})
+        return {member['user_id'] for member in members}
+
+    @classmethod
+    def _refund_many(cls, league_id: ObjectId, bets: List['Bet'], token: ObjectId):
+        """Give back the stakes and stats counters of bets that were debited but not placed"""
+        refunds = {}
+        for bet in bets:
+            cls._add_counters(refunds.setdefault(bet.user_id, dict.fromkeys(BET_COUNTERS, 0)), bet, -1)
+        if refunds:
+            get_db().get_collection(MEMBERSHIPS).bulk_write([
+                UpdateOne({'league_id': league_id, 'user_id': user_id},
+                          {'$inc': dict(member_counters, balance=-member_counters['total_wagered']),
+                           '$set': {SYNC_TOKEN: token}})
+                for user_id, member_counters in refunds.items()
+            ], ordered=False)
+
+    @staticmethod
+    def _add_counters(counters: Dict[str, float], bet: 'Bet', sign: int):
+        """Add (sign 1) or take back (sign -1) one bet's stats counters"""
+        counters['total_bets'] += sign
+        counters['pending_bets'] += sign
+        counters['total_wagered'] += sign * bet.amount
+
+    @classmethod
+    def cancel(cls, bet_id: ObjectId, user_id: ObjectId) -> Optional['Bet']:
+        """Delete a pending bet and refund its stake to the owner"""
         try:
             db = get_db()
-            bets = cls.get_ticket_bets(ticket_id)
-            
-            won_count = 0
-            lost_count = 0
-            
-            for bet in bets:
-                if bet.selected_option == winning_option:
-                    bet.mark_won()
-                    won_count += 1
-                else:
-                    bet.mark_lost()
-                    lost_count += 1
-                
-                bet.save()
-            
-            return {
-                'won': won_count,
-                'lost': lost_count,
-                'total': len(bets)
-            }
-            
+            # Only the request that actually deletes the bet issues the refund
+            bet_data = db.get_collection('bets').find_one_and_delete({
+                '_id': bet_id,
+                'user_id': user_id,
+                'status': 'pending'
+            })
+            if not bet_data:
+                return None
+
+            bet = cls._from_dict(bet_data)
+            identity_map.invalidate('bets', bet._id)
+            token = new_token()
+            record_deletion(bet.league_id, 'bets', bet._id, token)
+            League.credit_member(bet.league_id, bet.user_id, bet.amount, cls._negate(
+                {'total_bets': 1, 'pending_bets': 1, 'total_wagered': bet.amount}),
+                kind='cancel', ref=f'cancel:{bet._id}')
+            stamp(TOMBSTONES, {'league_id': bet.league_id}, token, League.bump_version(bet.league_id))
+            return bet
+
         except Exception as e:
-            print(f"Error resolving bets: {e}")
-            return {'won': 0, 'lost': 0, 'total': 0}
+            print(f"Error cancelling bet: {e}")
+            return None
+
+    @staticmethod
+    def _negate(counters: Dict[str, float]) -> Dict[str, float]:
+        """Invert stats counter increments"""
+        return {key: -value for key, value in counters.items()}
     
     @classmethod
-    def get_user_stats(cls, user_id: ObjectId, league_id: ObjectId = None) -> Dict[str, Any]:
-        """Get user betting statistics"""
+    def get_user_stats(cls, user_id: ObjectId, league_id: ObjectId = None,
+                       by_league: bool = False) -> Dict[str, Any]:
+        """Get user betting statistics.
+
+        Totals are computed by a single $group aggregation. With by_league the
+        same query groups per league and the result gains a 'leagues' dict of
+        per-league stats keyed by league id.
+        """
         try:
-            bets = cls.get_user_bets(user_id, league_id)
-            
-            total_bets = len(bets)
-            won_bets = len([bet for bet in bets if bet.is_winner()])
-            lost_bets = len([bet for bet in bets if bet.is_loser()])
-            pending_bets = len([bet for bet in bets if bet.is_pending()])
-            
-            total_wagered = sum(bet.amount for bet in bets)
-            total_winnings = sum(bet.potential_payout for bet in bets if bet.is_winner())
+            db = get_db()
+            query = {'user_id': user_id}
+            if league_id:
+                query['league_id'] = league_id
             
-            win_rate = (won_bets / total_bets * 100) if total_bets > 0 else 0
+            rows = list(db.get_collection('bets').aggregate([
+                {'$match': query},
+                {'$group': {'_id': '$league_id' if by_league else None, **STATS_ACCUMULATORS}}
+            ]))
             
-            return {
-                'total_bets': total_bets,
-                'won_bets': won_bets,
-                'lost_bets': lost_bets,
-                'pending_bets': pending_bets,
-                'total_wagered': total_wagered,
-                'total_winnings': total_winnings,
-                'win_rate': round(win_rate, 2),
-                'net_profit': total_winnings - total_wagered
-            }
+            stats = combine_stats(rows)
+            if by_league:
+                stats['leagues'] = {row['_id']: build_stats(row) for row in rows}
+            return stats
             
         except Exception as e:
             print(f"Error getting user stats: {e}")
-            return {
-                'total_bets': 0,
-                'won_bets': 0,
-                'lost_bets': 0,
-                'pending_bets': 0,
-                'total_wagered': 0,
-                'total_winnings': 0,
-                'win_rate': 0,
-                'net_profit': 0
-            }
+            stats = build_stats({})
+            if by_league:
+                stats['leagues'] = {}
+            return stats
     
     @classmethod
-    def _from_dict(cls, data: Dict[str, Any]) -> 'Bet':
+    def _find_one(cls, query: Dict[str, Any]) -> Optional['Bet']:
+        """Load a single bet matching query"""
+        bet_data = get_db().get_collection('bets').find_one(query)
+        return cls._from_dict(bet_data) if bet_data else None
+    
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any], fields: List[str] = None) -> 'Bet':
         """Create Bet instance from database data"""
-        return cls(
-            _id=data.get('_id'),
-            user_id=data.get('user_id'),
-            league_id=data.get('league_id'),
-            ticket_id=data.get('ticket_id'),
-            amount=data.get('amount'),
-            selected_option=data.get('selected_option'),
-            potential_payout=data.get('potential_payout'),
-            status=data.get('status'),
-            placed_at=data.get('placed_at')
-        )
+        return cls._from_bson(data, fields)
     
     def __repr__(self):
         return f"<Bet {self.amount} on {self.selected_option}>"
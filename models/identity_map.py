@@ -0,0 +1,94 @@
+"""Request-scoped identity map for model lookups.
+
+Within a request each document is fetched at most once: lookups go through
+an IdentityMap stored on flask.g, keyed by collection and _id. Secondary
+lookups (e.g. a user by email) are recorded as aliases of the _id so every
+path returns the same instance. Outside a request context lookups go
+straight to the database.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from flask import g, has_request_context
+
+_MISSING = object()
+
+
+class IdentityMap:
+    """Per-request cache of loaded model instances"""
+
+    def __init__(self):
+        self._objects: Dict[Tuple[str, Any], Any] = {}
+        self._aliases: Dict[Tuple[str, Any], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, collection: str, key: Any, alias: bool = False) -> Any:
+        """Return the cached instance (or None) for a key, or _MISSING"""
+        if alias:
+            object_id = self._aliases.get((collection, key), _MISSING)
+            if object_id is _MISSING or object_id is None:
+                return object_id
+            key = object_id
+        return self._objects.get((collection, key), _MISSING)
+
+    def add(self, collection: str, key: Any, obj: Any, alias: bool = False) -> Any:
+        """Cache obj under key and return the canonical instance"""
+        if obj is not None:
+            # Keep an already loaded instance so all lookups share it
+            obj = self._objects.setdefault((collection, obj._id), obj)
+            if alias:
+                self._aliases[(collection, key)] = obj._id
+        elif alias:
+            self._aliases[(collection, key)] = None
+        else:
+            self._objects[(collection, key)] = None
+        return obj
+
+    def discard(self, collection: str, object_id: Any = None):
+        """Forget an instance and every alias that points at it.
+
+        Without object_id every instance of the collection is forgotten.
+        """
+        if object_id is None:
+            for key in [key for key in self._objects if key[0] == collection]:
+                del self._objects[key]
+        else:
+            self._objects.pop((collection, object_id), None)
+        for alias_key, target in list(self._aliases.items()):
+            if alias_key[0] == collection and (object_id is None or target in (object_id, None)):
+                del self._aliases[alias_key]
+
+    def clear(self):
+        """Forget everything"""
+        self._objects.clear()
+        self._aliases.clear()
+
+
+def get_identity_map() -> Optional[IdentityMap]:
+    """Get the identity map for the current request, if any"""
+    if not has_request_context():
+        return None
+    if 'identity_map' not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def load(collection: str, key: Any, loader: Callable[[], Any], alias: bool = False) -> Any:
+    """Return the instance for key, calling loader only on the first lookup"""
+    identity_map = get_identity_map()
+    if identity_map is None:
+        return loader()
+
+    cached = identity_map.get(collection, key, alias)
+    if cached is not _MISSING:
+        identity_map.hits += 1
+        return cached
+
+    identity_map.misses += 1
+    return identity_map.add(collection, key, loader(), alias)
+
+
+def invalidate(collection: str, object_id: Any = None):
+    """Drop a document (or a whole collection) from the request's identity map"""
+    identity_map = get_identity_map()
+    if identity_map is not None:
+        identity_map.discard(collection, object_id)
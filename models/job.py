@@ -0,0 +1,269 @@
+from bson import ObjectId
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument, UpdateMany
+from pymongo.errors import DuplicateKeyError
+from database import get_db
+from models import identity_map
+from models.lazy import LazyFieldsMixin
+from models.league import League
+from models.sync import SYNC_TOKEN, new_token, stamp
+from models.ticket import PENDING_JOB
+from typing import Optional, List, Dict, Any
+
+
+class ResolutionJob(LazyFieldsMixin):
+    """Durable job settling a resolved ticket's bets a chunk at a time.
+
+    Jobs live in the `jobs` collection. A worker claims a job by taking its
+    lease, then settles bets in _id order, recording the last bet settled as
+    the job's checkpoint after each chunk. A worker that dies stops renewing
+    the lease and the next one to claim the job resumes after the checkpoint;
+    redoing a chunk is harmless because bets are only updated while pending
+    and members skip tickets already in their settled_tickets.
+    """
+
+    _COLLECTION = 'jobs'
+    _FIELDS = {field: field for field in (
+        'ticket_id', 'league_id', 'winning_option', 'status', 'total', 'processed',
+        'won', 'lost', 'checkpoint', 'worker', 'attempts', 'lease_expires_at',
+        'error', 'created_at', 'updated_at', 'finished_at'
+    )}
+    __slots__ = tuple(_FIELDS.values())
+
+    # Claims after which a job that keeps failing is given up on
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, ticket_id: ObjectId = None, league_id: ObjectId = None,
+                 winning_option: str = None, total: int = 0, _id: ObjectId = None):
+        now = datetime.utcnow()
+        self.ticket_id = ticket_id
+        self.league_id = league_id
+        self.winning_option = winning_option
+        self.status = 'queued'  # 'queued', 'running', 'done', 'failed'
+        self.total = total
+        self.processed = 0
+        self.won = 0
+        self.lost = 0
+        self.checkpoint = None  # _id of the last bet settled
+        self.worker = None
+        self.attempts = 0
+        self.lease_expires_at = now  # Claimable straight away
+        self.error = None
+        self.created_at = now
+        self.updated_at = now
+        self.finished_at = None
+        self._id = _id
+        self._loaded_fields = None
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the ticket's bets settled so far"""
+        if self.status == 'done':
+            return 1.0
+        return min(1.0, self.processed / self.total) if self.total else 0.0
+
+    def run_chunk(self, worker: str, chunk_size: int,
+                  lease_seconds: float) -> Optional[Dict[ObjectId, float]]:
+        """Settle the next chunk of bets and checkpoint it; returns the chunk's payouts.
+
+        Returns None once every bet is settled (the job is then done) or if
+        another worker has taken the job over.
+        """
+        db = get_db()
+        query = {'ticket_id': self.ticket_id}
+        if self.checkpoint is not None:
+            query['_id'] = {'$gt': self.checkpoint}
+        bets = list(db.get_collection('bets').find(
+            query, {'user_id': 1, 'selected_option': 1, 'potential_payout': 1, 'status': 1}
+        ).sort('_id', ASCENDING).limit(chunk_size))
+        if not bets:
+            self._finish(worker)
+            return None
+
+        won = [bet for bet in bets if bet['selected_option'] == self.winning_option]
+        lost = [bet for bet in bets if bet['selected_option'] != self.winning_option]
+        self._settle(won, lost)
+
+        # Compare-and-set on the checkpoint, so each chunk is counted once
+        now = datetime.utcnow()
+        result = db.get_collection('jobs').update_one(
+            {'_id': self._id, 'worker': worker, 'checkpoint': self.checkpoint},
+            {'$set': {'checkpoint': bets[-1]['_id'], 'updated_at': now,
+                      'lease_expires_at': now + timedelta(seconds=lease_seconds)},
+             '$inc': {'processed': len(bets), 'won': len(won), 'lost': len(lost)}}
+        )
+        if not result.modified_count:
+            return None
+
+        self.checkpoint = bets[-1]['_id']
+        self.processed += len(bets)
+        self.won += len(won)
+        self.lost += len(lost)
+        # Bets already settled were paid by an earlier attempt at this chunk
+        return {bet['user_id']: bet['potential_payout'] for bet in won if bet['status'] == 'pending'}
+
+    def _settle(self, won: List[Dict[str, Any]], lost: List[Dict[str, Any]]):
+        """Mark one chunk's bets won/lost and apply them to member balances"""
+        db = get_db()
+        token = new_token()
+        changes = {'updated_at': datetime.utcnow(), SYNC_TOKEN: token}
+        db.get_collection('bets').bulk_write([
+            UpdateMany({'_id': {'$in': [bet['_id'] for bet in bets]}, 'status': 'pending'},
+                       {'$set': dict(changes, status=status)})
+            for status, bets in (('won', won), ('lost', lost)) if bets
+        ])
+        identity_map.invalidate('bets')
+
+        payouts = defaultdict(list)
+        for bet in won:
+            payouts[bet['potential_payout']].append(bet['user_id'])
+        groups = [{'status': 'won', 'amount': amount, 'user_ids': user_ids}
+                  for amount, user_ids in payouts.items()]
+        if lost:
+            groups.append({'status': 'lost', 'amount': 0, 'user_ids': [bet['user_id'] for bet in lost]})
+        if not League.settle_members(self.league_id, self.ticket_id, groups):
+            raise RuntimeError('settling members failed')
+
+        stamp('bets', {'ticket_id': self.ticket_id}, token, League.bump_version(self.league_id))
+
+    def _finish(self, worker: str):
+        """Mark the job done"""
+        now = datetime.utcnow()
+        result = get_db().get_collection('jobs').update_one(
+            {'_id': self._id, 'worker': worker, 'status': 'running'},
+            {'$set': {'status': 'done', 'updated_at': now, 'finished_at': now}}
+        )
+        if result.modified_count:
+            self.status = 'done'
+            self.finished_at = now
+
+    def fail(self, error: str):
+        """Give up on the job, recording why"""
+        now = datetime.utcnow()
+        get_db().get_collection('jobs').update_one(
+            {'_id': self._id},
+            {'$set': {'status': 'failed', 'error': error, 'updated_at': now, 'finished_at': now}}
+        )
+        self.status = 'failed'
+        self.error = error
+
+    def restart(self) -> bool:
+        """Queue a done or failed job to settle the ticket again from its first bet.
+
+        Bets already settled and members already paid are skipped, so a
+        re-run only settles what an earlier run missed.
+        """
+        try:
+            db = get_db()
+            now = datetime.utcnow()
+            total = db.get_collection('bets').count_documents({'ticket_id': self.ticket_id})
+            changes = {'status': 'queued', 'total': total, 'processed': 0, 'won': 0, 'lost': 0,
+                       'checkpoint': None, 'worker': None, 'attempts': 0, 'lease_expires_at': now,
+                       'error': None, 'updated_at': now, 'finished_at': None}
+            result = db.get_collection('jobs').update_one(
+                {'_id': self._id, 'status': {'$in': ['done', 'failed']}}, {'$set': changes})
+            if not result.modified_count:
+                return False
+            for field, value in changes.items():
+                setattr(self, field, value)
+            return True
+        except Exception as e:
+            print(f"Error restarting resolution job: {e}")
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert job to dictionary"""
+        return {
+            '_id': self._id,
+            'ticket_id': self.ticket_id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'won': self.won,
+            'lost': self.lost,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+    @classmethod
+    def create(cls, ticket_id: ObjectId, league_id: ObjectId,
+               winning_option: str) -> Optional['ResolutionJob']:
+        """Queue settlement of a resolved ticket (returns the existing job if already queued)"""
+        try:
+            db = get_db()
+            total = db.get_collection('bets').count_documents({'ticket_id': ticket_id})
+            job = cls(ticket_id=ticket_id, league_id=league_id,
+                      winning_option=winning_option, total=total)
+            job_data = {field: getattr(job, attr) for field, attr in cls._FIELDS.items()}
+            try:
+                job._id = db.get_collection('jobs').insert_one(job_data).inserted_id
+            except DuplicateKeyError:
+                job = cls.get_for_ticket(ticket_id)
+            db.get_collection('tickets').update_one({'_id': ticket_id}, {'$unset': {PENDING_JOB: ''}})
+            return job
+        except Exception as e:
+            print(f"Error creating resolution job: {e}")
+            return None
+
+    @classmethod
+    def queue_missing(cls, limit: int = 100) -> List['ResolutionJob']:
+        """Queue jobs for resolved tickets whose request stopped before queuing one"""
+        try:
+            tickets = get_db().get_collection('tickets').find(
+                {PENDING_JOB: True}, {'league_id': 1, 'resolution': 1}).limit(limit)
+            jobs = [cls.create(ticket['_id'], ticket['league_id'], ticket['resolution'])
+                    for ticket in tickets]
+            return [job for job in jobs if job]
+        except Exception as e:
+            print(f"Error queuing missing resolution jobs: {e}")
+            return []
+
+    @classmethod
+    def claim(cls, worker: str, lease_seconds: float,
+              ticket_id: ObjectId = None) -> Optional['ResolutionJob']:
+        """Take the lease on a queued job, or on a running one whose worker stopped renewing it"""
+        try:
+            now = datetime.utcnow()
+            query = {'status': {'$in': ['queued', 'running']}, 'lease_expires_at': {'$lte': now}}
+            if ticket_id is not None:
+                query['ticket_id'] = ticket_id
+            job_data = get_db().get_collection('jobs').find_one_and_update(
+                query,
+                {'$set': {'status': 'running', 'worker': worker, 'updated_at': now,
+                          'lease_expires_at': now + timedelta(seconds=lease_seconds)},
+                 '$inc': {'attempts': 1}},
+                sort=[('lease_expires_at', ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not job_data:
+                return None
+
+            job = cls._from_dict(job_data)
+            if job.attempts > cls.MAX_ATTEMPTS:
+                job.fail(f'gave up after {cls.MAX_ATTEMPTS} attempts')
+                return None
+            return job
+        except Exception as e:
+            print(f"Error claiming resolution job: {e}")
+            return None
+
+    @classmethod
+    def get_for_ticket(cls, ticket_id: ObjectId) -> Optional['ResolutionJob']:
+        """Get the resolution job for a ticket"""
+        try:
+            job_data = get_db().get_collection('jobs').find_one({'ticket_id': ObjectId(ticket_id)})
+            return cls._from_dict(job_data) if job_data else None
+        except Exception as e:
+            print(f"Error getting resolution job: {e}")
+            return None
+
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any]) -> 'ResolutionJob':
+        """Create ResolutionJob instance from database data"""
+        return cls._from_bson(data)
+
+    def __repr__(self):
+        return f"<ResolutionJob {self.ticket_id} {self.status}>"
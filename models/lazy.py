@@ -0,0 +1,95 @@
+"""Partial (projected) model loading with lazy fetching of missing fields"""
+from typing import Any, Dict, Iterable
+from database import get_db
+
+
+class LazyFieldsMixin:
+    """Lets a model be loaded with only some fields.
+
+    Models define _COLLECTION and _FIELDS (document field -> attribute name).
+    Instances built by _from_bson(data, fields) only hold the listed fields;
+    touching any other field fetches all the missing ones from MongoDB in one
+    query. save() never writes fields that were not loaded.
+
+    Models declare their _FIELDS attributes as __slots__; _loaded_fields holds
+    the document fields present on an instance, None meaning fully loaded.
+    """
+
+    __slots__ = ('_id', '_loaded_fields')
+
+    _COLLECTION: str = None
+    _FIELDS: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._hydrate = staticmethod(_build_hydrator(cls))
+
+    @classmethod
+    def _from_bson(cls, data: Dict[str, Any], fields: Iterable[str] = None):
+        """Map a raw document straight onto a new instance's slots.
+
+        Skips __init__ and its defaults, so it is only meant for documents
+        read back from MongoDB.
+        """
+        if fields is None:
+            return cls._hydrate(data)
+
+        obj = cls.__new__(cls)
+        obj._id = data.get('_id')
+        obj._loaded_fields = set(fields)
+        for field, attr in cls._FIELDS.items():
+            if field in obj._loaded_fields:
+                setattr(obj, attr, data.get(field))
+        return obj
+
+    @classmethod
+    def _projection(cls, fields: Iterable[str]) -> Dict[str, Any]:
+        """Build a find() projection for the given document fields"""
+        return dict.fromkeys(fields, 1)
+
+    def _is_loaded(self, field: str) -> bool:
+        """Check whether a document field is present on this instance"""
+        return self._loaded_fields is None or field in self._loaded_fields
+
+    def _loaded_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Restrict a document about to be saved to the loaded fields"""
+        if self._loaded_fields is None:
+            return data
+        return {field: value for field, value in data.items() if field in self._loaded_fields}
+
+    def __getattr__(self, name: str):
+        # Only reached when normal lookup fails, i.e. for fields not loaded yet
+        if name in self._FIELDS.values() and self._loaded_fields is not None:
+            self._load_remaining()
+            return getattr(self, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _load_remaining(self):
+        """Fetch every field that was left out of the original projection"""
+        missing = [field for field in self._FIELDS if field not in self._loaded_fields]
+        data = get_db().get_collection(self._COLLECTION).find_one(
+            {'_id': self._id}, self._projection(missing)) or {}
+        for field in missing:
+            setattr(self, self._FIELDS[field], data.get(field))
+        self._loaded_fields = None
+
+
+def _build_hydrator(cls):
+    """Compile a straight-line function that fills every slot from a document.
+
+    Unrolling the field assignments is about twice as fast as looping over
+    _FIELDS with setattr, which matters when hydrating 100k bets.
+    """
+    lines = [
+        'def hydrate(data):',
+        '    obj = new(cls)',
+        '    get = data.get',
+        "    obj._id = get('_id')",
+        '    obj._loaded_fields = None',
+    ]
+    lines += [f'    obj.{attr} = get({field!r})' for field, attr in cls._FIELDS.items()]
+    lines.append('    return obj')
+
+    namespace = {'new': cls.__new__, 'cls': cls}
+    exec('\n'.join(lines), namespace)
+    return namespace['hydrate']
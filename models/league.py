@@ -1,12 +1,43 @@
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
+from pymongo import DESCENDING, DeleteMany, ReturnDocument, UpdateMany, UpdateOne
 from database import get_db
+from models import identity_map, ledger
+from models.lazy import LazyFieldsMixin
+from models.sync import SYNC_TOKEN, TOMBSTONES, changed_query, new_token, record_deletion, stamp
+from models.stats import STATS_COUNTERS, STATS_ACCUMULATORS, build_stats
 from typing import Optional, List, Dict, Any
 import secrets
 import string
 
-class League:
+# One document per league member: {league_id, user_id, username, balance,
+# joined_at, stats counters, settled_tickets, debit_batches, version}
+MEMBERSHIPS = 'memberships'
+# Group-commit batches (see Bet.place_many) whose debit of the member is in flight
+DEBIT_BATCHES = 'debit_batches'
+# Member entries as handed out by League (settled_tickets and debit_batches are bookkeeping)
+MEMBER_PROJECTION = {'_id': 0, 'settled_tickets': 0, DEBIT_BATCHES: 0}
+# Leaderboard order, served by the (league_id, balance) index
+BY_BALANCE = [('balance', DESCENDING)]
+
+class League(LazyFieldsMixin):
     """League model for managing betting leagues"""
+
+    _COLLECTION = 'leagues'
+    _FIELDS = {field: field for field in (
+        'name', 'description', 'creator_id', 'admins', 'starting_balance',
+        'status', 'created_at', 'end_date', 'invite_code'
+    )}
+    # Fields loaded by get_membership unless told otherwise
+    HEADER_FIELDS = ['name', 'creator_id', 'admins', 'status']
+    # Members live in the memberships collection: every member once loaded
+    # (None until then), the entries looked up or changed so far, the member
+    # count; the user ids of members added/changed, added or removed since
+    # loading, the balance adjustments made since then, and the members the
+    # last save actually added (a join racing another one adds nobody)
+    __slots__ = tuple(_FIELDS.values()) + (
+        '_members', '_known_members', '_member_count', '_changed_members', '_added_members',
+        '_removed_members', '_balance_adjustments', '_joined_members')
     
     def __init__(self, name: str = None, description: str = None, creator_id: ObjectId = None,
                  starting_balance: float = 1000.0, status: str = 'active',
@@ -16,25 +47,45 @@ class League:
         self.description = description
         self.creator_id = creator_id
         self.admins = [creator_id] if creator_id else []
-        self.members = []
         self.starting_balance = starting_balance
         self.status = status  # 'active', 'completed', 'paused'
         self.created_at = created_at or datetime.utcnow()
         self.end_date = end_date
         self.invite_code = invite_code or self._generate_invite_code()
         self._id = _id
+        self._loaded_fields = None
+        self._members = []
+        self._known_members = {}
+        self._member_count = 0
+        self._changed_members = set()
+        self._added_members = set()
+        self._removed_members = set()
+        self._balance_adjustments = {}
+        self._joined_members = set()
     
     def _generate_invite_code(self) -> str:
         """Generate unique invite code"""
         characters = string.ascii_uppercase + string.digits
         return ''.join(secrets.choice(characters) for _ in range(8))
     
+    @property
+    def members(self) -> List[Dict[str, Any]]:
+        """Every member, loaded from the memberships collection on first use"""
+        if self._members is None:
+            members = {member['user_id']: member
+                       for member in self._find_members({'league_id': self._id})}
+            members.update(self._known_members)  # Unsaved changes win
+            for user_id in self._removed_members:
+                members.pop(user_id, None)
+            self._known_members = members
+            self._members = list(members.values())
+        return self._members
+
     def add_member(self, user_id: ObjectId, user_username: str) -> bool:
         """Add member to league"""
         # Check if user is already a member
-        for member in self.members:
-            if member['user_id'] == user_id:
-                return False
+        if self.get_member(user_id):
+            return False
         
         # Add new member
         member_data = {
@@ -43,32 +94,310 @@ class League:
             'balance': self.starting_balance,
             'joined_at': datetime.utcnow()
         }
-        self.members.append(member_data)
+        member_data.update(dict.fromkeys(STATS_COUNTERS, 0))
+        self._known_members[user_id] = member_data
+        if self._members is not None:
+            self._members.append(member_data)
+        else:
+            self._member_count = (self._member_count or 0) + 1
+        self._changed_members.add(user_id)
+        self._added_members.add(user_id)
+        self._removed_members.discard(user_id)
         return True
     
     def remove_member(self, user_id: ObjectId) -> bool:
         """Remove member from league"""
-        for i, member in enumerate(self.members):
-            if member['user_id'] == user_id:
-                del self.members[i]
-                return True
-        return False
+        member = self.get_member(user_id)
+        if not member:
+            return False
+
+        del self._known_members[user_id]
+        if self._members is not None:
+            self._members.remove(member)
+        else:
+            self._member_count = (self._member_count or 1) - 1
+        self._changed_members.discard(user_id)
+        self._added_members.discard(user_id)
+        self._balance_adjustments.pop(user_id, None)
+        self._removed_members.add(user_id)
+        return True
     
     def get_member(self, user_id: ObjectId) -> Optional[Dict[str, Any]]:
         """Get member data by user ID"""
-        for member in self.members:
-            if member['user_id'] == user_id:
-                return member
-        return None
+        if user_id in self._known_members:
+            return self._known_members[user_id]
+        if self._members is not None or user_id in self._removed_members or not self._id:
+            return None
+
+        member = self._find_member(self._id, user_id)
+        if member:
+            self._known_members[user_id] = member
+        return member
+    
+    @property
+    def member_count(self) -> int:
+        """Number of members, without loading them"""
+        if self._members is not None:
+            return len(self._members)
+        return self._member_count or 0
     
     def update_member_balance(self, user_id: ObjectId, new_balance: float) -> bool:
         """Update member's balance"""
-        for member in self.members:
-            if member['user_id'] == user_id:
-                member['balance'] = new_balance
-                return True
-        return False
+        member = self.get_member(user_id)
+        if not member:
+            return False
+        if user_id not in self._added_members:
+            # Saved as an $inc, so concurrent bets and payouts are kept
+            adjustment = new_balance - member['balance']
+            self._balance_adjustments[user_id] = self._balance_adjustments.get(user_id, 0) + adjustment
+        member['balance'] = new_balance
+        self._changed_members.add(user_id)
+        return True
+    
+    def joined(self, user_id: ObjectId) -> bool:
+        """Check whether the last save added user_id (False if they were already a member)"""
+        return user_id in self._joined_members
+    
+    def get_member_stats(self, user_id: ObjectId) -> Dict[str, Any]:
+        """Get a member's betting stats from their running counters"""
+        return build_stats(self.get_member(user_id) or {})
     
+    @classmethod
+    def _find_member(cls, league_id: ObjectId, user_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """Load one member entry"""
+        try:
+            return get_db().get_collection(MEMBERSHIPS).find_one(
+                {'league_id': league_id, 'user_id': user_id}, MEMBER_PROJECTION)
+        except Exception as e:
+            print(f"Error getting league member: {e}")
+            return None
+
+    @classmethod
+    def _find_members(cls, query: Dict[str, Any], sort: List = None) -> List[Dict[str, Any]]:
+        """Load the member entries matching query"""
+        try:
+            cursor = get_db().get_collection(MEMBERSHIPS).find(query, MEMBER_PROJECTION)
+            return list(cursor.sort(sort) if sort else cursor)
+        except Exception as e:
+            print(f"Error getting league members: {e}")
+            return []
+    
+    @classmethod
+    def debit_member(cls, league_id: ObjectId, user_id: ObjectId, amount: float,
+                     counters: Dict[str, float] = None, kind: str = 'stake',
+                     ref: str = None, token: ObjectId = None, record: bool = True) -> bool:
+        """Atomically deduct amount from a member's balance if it covers it, recording it in the ledger.
+
+        With token the member is marked with it and the caller bumps the
+        league version, so one bump can cover the debit and what it paid for.
+        Without record the caller writes the ledger entry itself, if any.
+        """
+        try:
+            db = get_db()
+            increments = dict(counters or {}, balance=-amount)
+            bump = token is None
+            token = token or new_token()
+            result = db.get_collection(MEMBERSHIPS).update_one(
+                {'league_id': league_id, 'user_id': user_id, 'balance': {'$gte': amount}},
+                {'$inc': increments, '$set': {SYNC_TOKEN: token}}
+            )
+            identity_map.invalidate('leagues', league_id)
+            if not result.modified_count:
+                return False
+            if record:
+                ledger.append([ledger.entry(league_id, user_id, -amount, kind, ref or f'{kind}:{token}')])
+            if bump:
+                cls.bump_version(league_id, member_token=token)
+            return True
+        except Exception as e:
+            print(f"Error debiting member: {e}")
+            return False
+
+    @classmethod
+    def credit_member(cls, league_id: ObjectId, user_id: ObjectId, amount: float,
+                      counters: Dict[str, float] = None, kind: str = 'refund',
+                      ref: str = None, token: ObjectId = None, record: bool = True) -> bool:
+        """Atomically add amount to a member's balance, recording it in the ledger unless record is False.
+
+        As with debit_member, with token the caller bumps the league version.
+        """
+        try:
+            db = get_db()
+            increments = dict(counters or {}, balance=amount)
+            bump = token is None
+            token = token or new_token()
+            result = db.get_collection(MEMBERSHIPS).update_one(
+                {'league_id': league_id, 'user_id': user_id},
+                {'$inc': increments, '$set': {SYNC_TOKEN: token}}
+            )
+            identity_map.invalidate('leagues', league_id)
+            if not result.modified_count:
+                return False
+            if record:
+                ledger.append([ledger.entry(league_id, user_id, amount, kind, ref or f'{kind}:{token}')])
+            if bump:
+                cls.bump_version(league_id, member_token=token)
+            return True
+        except Exception as e:
+            print(f"Error crediting member: {e}")
+            return False
+
+    @classmethod
+    def bump_version(cls, league_id: ObjectId, member_token: ObjectId = None,
+                     members_added: int = 0) -> Optional[int]:
+        """Record that a league's tickets, bets or members changed; returns the new version.
+
+        Call after the write, so a reader never pairs the new version with
+        old data. Members marked with member_token are stamped with the new
+        version (see models.sync); members_added adjusts the member count.
+        """
+        try:
+            db = get_db()
+            increments = {'version': 1}
+            if members_added:
+                increments['member_count'] = members_added
+            league_data = db.get_collection('leagues').find_one_and_update(
+                {'_id': league_id}, {'$inc': increments},
+                projection={'version': 1}, return_document=ReturnDocument.AFTER)
+            identity_map.invalidate('leagues', league_id)
+            if league_data is None:
+                return None
+            if member_token is not None:
+                stamp(MEMBERSHIPS, {'league_id': league_id}, member_token, league_data['version'])
+            return league_data['version']
+        except Exception as e:
+            print(f"Error bumping league version: {e}")
+            return None
+
+    @classmethod
+    def get_member_changes(cls, league_id: ObjectId, since: Optional[int]) -> List[Dict[str, Any]]:
+        """Get a league's members changed after version since (all of them if None)"""
+        return cls._find_members(changed_query(ObjectId(league_id), since))
+
+    @classmethod
+    def get_member_version(cls, league_id: ObjectId, user_id: ObjectId) -> Optional[int]:
+        """Get a league's version, or None if it is missing or user_id is not a member"""
+        try:
+            db = get_db()
+            league_id = ObjectId(league_id)
+            if not db.get_collection(MEMBERSHIPS).find_one(
+                    {'league_id': league_id, 'user_id': user_id}, {'_id': 1}):
+                return None
+            league_data = db.get_collection('leagues').find_one(
+                {'_id': league_id}, {'_id': 0, 'version': 1})
+            return league_data.get('version', 0) if league_data is not None else None
+        except Exception as e:
+            print(f"Error getting league version: {e}")
+            return None
+
+    @classmethod
+    def get_member_league_ids(cls, user_id: ObjectId, league_ids: List[ObjectId]) -> set:
+        """Get which of league_ids user_id is a member of, in one query"""
+        try:
+            db = get_db()
+            memberships = db.get_collection(MEMBERSHIPS).find(
+                {'user_id': user_id, 'league_id': {'$in': list(league_ids)}},
+                {'_id': 0, 'league_id': 1})
+            return {membership['league_id'] for membership in memberships}
+        except Exception as e:
+            print(f"Error getting member leagues: {e}")
+            return set()
+
+    @classmethod
+    def get_member_usernames(cls, league_id: ObjectId, user_ids: List[ObjectId]) -> Dict[ObjectId, str]:
+        """Get the usernames of the members among user_ids in one query"""
+        try:
+            members = get_db().get_collection(MEMBERSHIPS).find(
+                {'league_id': league_id, 'user_id': {'$in': list(user_ids)}},
+                {'_id': 0, 'user_id': 1, 'username': 1})
+            return {member['user_id']: member['username'] for member in members}
+        except Exception as e:
+            print(f"Error getting member usernames: {e}")
+            return {}
+
+    @classmethod
+    def settle_members(cls, league_id: ObjectId, ticket_id: ObjectId,
+                       groups: List[Dict[str, Any]]) -> bool:
+        """Apply a ticket's results to member balances and stats in bulk.
+
+        groups is a list of {'status', 'amount', 'user_ids'} entries where
+        amount is the payout credited to each winner; each group is one
+        update_many. Each settled member records ticket_id in settled_tickets
+        and members that already have it are skipped, so settlement can be
+        safely re-run.
+        """
+        try:
+            db = get_db()
+            token = new_token()
+            operations = []
+            for group in groups:
+                if group['status'] == 'won':
+                    counters = {'balance': group['amount'], 'total_winnings': group['amount'],
+                                'won_bets': 1, 'pending_bets': -1}
+                else:
+                    counters = {'lost_bets': 1, 'pending_bets': -1}
+                operations.append(UpdateMany(
+                    {'league_id': league_id, 'user_id': {'$in': group['user_ids']},
+                     'settled_tickets': {'$ne': ticket_id}},
+                    {'$inc': counters, '$addToSet': {'settled_tickets': ticket_id},
+                     '$set': {SYNC_TOKEN: token}}
+                ))
+            
+            if operations:
+                db.get_collection(MEMBERSHIPS).bulk_write(operations, ordered=False)
+                # Winners who left the league were not paid: only members
+                # holding the ticket in settled_tickets get an entry, one
+                # per winner and ticket, so re-runs add nothing
+                winners = [user_id for group in groups if group['status'] == 'won' and group['amount']
+                           for user_id in group['user_ids']]
+                paid = {member['user_id'] for member in db.get_collection(MEMBERSHIPS).find(
+                    {'league_id': league_id, 'user_id': {'$in': winners}, 'settled_tickets': ticket_id},
+                    {'_id': 0, 'user_id': 1})} if winners else set()
+                ledger.append(
+                    ledger.entry(league_id, user_id, group['amount'], 'payout', f'payout:{ticket_id}:{user_id}')
+                    for group in groups if group['status'] == 'won' and group['amount']
+                    for user_id in group['user_ids'] if user_id in paid
+                )
+                cls.bump_version(league_id, member_token=token)
+            identity_map.invalidate('leagues', league_id)
+            return True
+        except Exception as e:
+            print(f"Error settling members: {e}")
+            return False
+
+    @classmethod
+    def rebuild_member_stats(cls, league_id: ObjectId) -> int:
+        """Recompute members' stats counters from the bets collection"""
+        try:
+            db = get_db()
+            rows = db.get_collection('bets').aggregate([
+                {'$match': {'league_id': league_id}},
+                {'$group': {'_id': '$user_id', **STATS_ACCUMULATORS}}
+            ])
+            totals = {row['_id']: row for row in rows}
+            
+            token = new_token()
+            operations = []
+            members = db.get_collection(MEMBERSHIPS).find(
+                {'league_id': league_id}, {'_id': 0, 'user_id': 1})
+            for member in members:
+                row = totals.get(member['user_id'], {})
+                counters = {key: row.get(key, 0) for key in STATS_COUNTERS}
+                counters[SYNC_TOKEN] = token
+                operations.append(UpdateOne(
+                    {'league_id': league_id, 'user_id': member['user_id']},
+                    {'$set': counters}
+                ))
+            
+            if operations:
+                db.get_collection(MEMBERSHIPS).bulk_write(operations, ordered=False)
+                cls.bump_version(league_id, member_token=token)
+            identity_map.invalidate('leagues', league_id)
+            return len(operations)
+        except Exception as e:
+            print(f"Error rebuilding member stats: {e}")
+            return 0
+
     def is_admin(self, user_id: ObjectId) -> bool:
         """Check if user is admin"""
         return user_id in self.admins
@@ -89,22 +418,28 @@ class League:
     
     def get_leaderboard(self) -> List[Dict[str, Any]]:
         """Get sorted leaderboard by balance"""
+        if self._members is None and not self._changed_members and not self._removed_members:
+            # Read in order off the index rather than sorting every member here
+            return self._find_members({'league_id': self._id}, sort=BY_BALANCE)
         return sorted(self.members, key=lambda x: x['balance'], reverse=True)
     
+    @classmethod
+    def get_top_members(cls, league_id: ObjectId, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the top members by balance without loading the whole league"""
+        try:
+            db = get_db()
+            return list(db.get_collection(MEMBERSHIPS).find(
+                {'league_id': league_id}, {'_id': 0, 'user_id': 1, 'username': 1, 'balance': 1}
+            ).sort(BY_BALANCE).limit(limit))
+        except Exception as e:
+            print(f"Error getting top members: {e}")
+            return []
+    
     def save(self) -> ObjectId:
         """Save league to database"""
         db = get_db()
         league_data = {
-            'name': self.name,
-            'description': self.description,
-            'creator_id': self.creator_id,
-            'admins': self.admins,
-            'members': self.members,
-            'starting_balance': self.starting_balance,
-            'status': self.status,
-            'created_at': self.created_at,
-            'end_date': self.end_date,
-            'invite_code': self.invite_code
+            field: getattr(self, field) for field in self._FIELDS if self._is_loaded(field)
         }
         
         if self._id:
@@ -113,12 +448,77 @@ class League:
                 {'_id': self._id},
                 {'$set': league_data}
             )
-            return self._id if result.modified_count > 0 else None
+            saved = result.modified_count > 0
         else:
             # Create new league
             result = db.get_collection('leagues').insert_one(league_data)
             self._id = result.inserted_id
-            return self._id
+            saved = True
+        
+        token = new_token()
+        members_added = 0
+        self._joined_members = set()
+        if self._changed_members or self._removed_members:
+            members_added = self._save_members(token)
+            saved = True
+        version = self.bump_version(self._id, member_token=token, members_added=members_added)
+        stamp(TOMBSTONES, {'league_id': self._id}, token, version)
+        self._changed_members, self._added_members, self._removed_members = set(), set(), set()
+        self._balance_adjustments = {}
+        return self._id if saved else None
+
+    def _save_members(self, token: ObjectId) -> int:
+        """Write added members and balance adjustments and delete removed members; returns the net members added"""
+        db = get_db()
+        added = list(self._added_members)
+        # A join only inserts: joining twice, or racing another join, leaves
+        # the existing membership (and its balance) alone
+        operations = [
+            UpdateOne({'league_id': self._id, 'user_id': user_id},
+                      {'$setOnInsert': dict(self._known_members[user_id], **{SYNC_TOKEN: token})},
+                      upsert=True)
+            for user_id in added
+        ]
+        adjustments = {user_id: amount for user_id, amount in self._balance_adjustments.items() if amount}
+        operations.extend(
+            UpdateOne({'league_id': self._id, 'user_id': user_id},
+                      {'$inc': {'balance': amount}, '$set': {SYNC_TOKEN: token}})
+            for user_id, amount in adjustments.items()
+        )
+        entries = [
+            ledger.entry(self._id, user_id, amount, 'adjust', f'adjust:{token}:{user_id}')
+            for user_id, amount in adjustments.items()
+        ]
+        if self._removed_members:
+            removed = list(self._removed_members)
+            # Leaving takes the remaining balance with it
+            entries.extend(
+                ledger.entry(self._id, member['user_id'], -member['balance'], 'leave',
+                             f'leave:{token}:{member["user_id"]}')
+                for member in db.get_collection(MEMBERSHIPS).find(
+                    {'league_id': self._id, 'user_id': {'$in': removed}},
+                    {'_id': 0, 'user_id': 1, 'balance': 1})
+            )
+            operations.append(DeleteMany({'league_id': self._id, 'user_id': {'$in': removed}}))
+            for user_id in removed:
+                record_deletion(self._id, 'members', user_id, token)
+        if not operations:
+            return 0
+
+        result = db.get_collection(MEMBERSHIPS).bulk_write(operations, ordered=False)
+        self._joined_members = {added[index] for index in result.upserted_ids}
+        for user_id in self._joined_members:
+            entries.append(ledger.entry(self._id, user_id, self._known_members[user_id]['balance'],
+                                        'join', f'join:{token}:{user_id}'))
+        for user_id in set(added) - self._joined_members:
+            # Already a member: forget the entry built for the join
+            member = self._known_members.pop(user_id)
+            if self._members is not None:
+                self._members.remove(member)
+            else:
+                self._member_count -= 1
+        ledger.append(entries)
+        return result.upserted_count - result.deleted_count
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert league to dictionary"""
@@ -128,7 +528,7 @@ class League:
             'description': self.description,
             'creator_id': self.creator_id,
             'admins': self.admins,
-            'members': self.members,
+            'member_count': self.member_count,
             'starting_balance': self.starting_balance,
             'status': self.status,
             'created_at': self.created_at,
@@ -137,40 +537,68 @@ class League:
         }
     
     @classmethod
-    def get_by_id(cls, league_id: str) -> Optional['League']:
-        """Get league by ID"""
+    def get_by_id(cls, league_id: str, fields: List[str] = None) -> Optional['League']:
+        """Get league by ID, optionally loading only some fields (see lean_projection)"""
         try:
-            db = get_db()
-            league_data = db.get_collection('leagues').find_one({'_id': ObjectId(league_id)})
-            if league_data:
-                return cls._from_dict(league_data)
-            return None
+            league_id = ObjectId(league_id)
+            return identity_map.load('leagues', league_id,
+                                     lambda: cls._find_one({'_id': league_id}, fields))
         except Exception as e:
             print(f"Error getting league by ID: {e}")
             return None
     
+    @classmethod
+    def get_membership(cls, league_id: str, user_id: ObjectId,
+                       fields: List[str] = None) -> Optional['League']:
+        """Get a league's header and the user's own member entry, or None if they are not a member.
+
+        Two indexed point reads, one membership and one league header, so
+        authorizing a request never touches the rest of the members.
+        """
+        try:
+            league_id = ObjectId(league_id)
+            fields = fields or cls.HEADER_FIELDS
+            
+            def find():
+                member = cls._find_member(league_id, user_id)
+                if not member:
+                    return None
+                league = cls._find_one({'_id': league_id}, fields)
+                if league:
+                    league._known_members[user_id] = member
+                return league
+            
+            return identity_map.load('leagues', ('member', league_id, user_id), find, alias=True)
+        except Exception as e:
+            print(f"Error getting league membership: {e}")
+            return None
+    
     @classmethod
     def get_by_invite_code(cls, invite_code: str) -> Optional['League']:
         """Get league by invite code"""
         try:
-            db = get_db()
-            league_data = db.get_collection('leagues').find_one({'invite_code': invite_code})
-            if league_data:
-                return cls._from_dict(league_data)
-            return None
+            return identity_map.load('leagues', ('invite_code', invite_code),
+                                     lambda: cls._find_one({'invite_code': invite_code}), alias=True)
         except Exception as e:
             print(f"Error getting league by invite code: {e}")
             return None
     
     @classmethod
-    def get_user_leagues(cls, user_id: ObjectId) -> List['League']:
-        """Get all leagues for a user"""
+    def get_user_leagues(cls, user_id: ObjectId, fields: List[str] = None) -> List['League']:
+        """Get all leagues for a user, optionally loading only some fields"""
         try:
             db = get_db()
+            members = {member['league_id']: member
+                       for member in cls._find_members({'user_id': user_id})}
+            if not members:
+                return []
+
+            projection = cls.lean_projection(fields) if fields else None
             leagues_data = db.get_collection('leagues').find({
-                'members.user_id': user_id
-            })
-            return [cls._from_dict(league_data) for league_data in leagues_data]
+                '_id': {'$in': list(members)}
+            }, projection)
+            return [cls._from_dict(league_data, fields, members[league_data['_id']])
+                    for league_data in leagues_data]
         except Exception as e:
             print(f"Error getting user leagues: {e}")
             return []
@@ -197,22 +625,32 @@ class League:
             return None
     
     @classmethod
-    def _from_dict(cls, data: Dict[str, Any]) -> 'League':
-        """Create League instance from database data"""
-        league = cls(
-            _id=data.get('_id'),
-            name=data.get('name'),
-            description=data.get('description'),
-            creator_id=data.get('creator_id'),
-            starting_balance=data.get('starting_balance'),
-            status=data.get('status'),
-            created_at=data.get('created_at'),
-            end_date=data.get('end_date'),
-            invite_code=data.get('invite_code')
-        )
-        # Restore members and admins from database
-        league.members = data.get('members', [])
-        league.admins = data.get('admins', [league.creator_id] if league.creator_id else [])
+    def lean_projection(cls, fields: List[str]) -> Dict[str, Any]:
+        """Projection for fields plus the member count"""
+        projection = cls._projection(fields)
+        projection['member_count'] = 1
+        return projection
+    
+    @classmethod
+    def _find_one(cls, query: Dict[str, Any], fields: List[str] = None) -> Optional['League']:
+        """Load a single league matching query"""
+        projection = cls.lean_projection(fields) if fields else None
+        league_data = get_db().get_collection('leagues').find_one(query, projection)
+        return cls._from_dict(league_data, fields) if league_data else None
+    
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any], fields: List[str] = None,
+                   member: Dict[str, Any] = None) -> 'League':
+        """Create League instance from database data and, optionally, one member's entry"""
+        league = cls._from_bson(data, fields)
+        league._members = None
+        league._known_members = {member['user_id']: member} if member else {}
+        league._member_count = data.get('member_count')
+        league._changed_members = set()
+        league._added_members = set()
+        league._removed_members = set()
+        league._balance_adjustments = {}
+        league._joined_members = set()
         return league
     
     def __repr__(self):
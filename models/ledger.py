@@ -0,0 +1,201 @@
+"""Append-only ledger of member balance changes, with periodic snapshots.
+
+Every debit or credit of a member's balance (joining, stakes, refunds,
+cancellations, payouts, leaving) is also recorded as an insert-only entry in
+the `ledger` collection, so a balance can be explained and reconstructed at
+any point in time. Each entry carries a unique `ref` naming the event it
+records, which makes re-recording the same event (e.g. when settlement is
+re-run) a no-op.
+
+The memberships' `balance` fields stay the fast, authoritative read used by
+the conditional debit and the leaderboard. Compaction periodically folds each
+member's new entries into a `ledger_snapshots` document, so reconstructing a
+balance never sums more than one compaction interval of entries, and
+find_drift compares the two to catch balances the ledger cannot account for.
+A snapshot as_of a time covers the entries appended before it, found by _id
+(ObjectIds start with the second they were made in), so an entry stamped
+before a compaction but appended after it is folded in by the next one.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from database import get_db
+
+LEDGER = 'ledger'
+SNAPSHOTS = 'ledger_snapshots'
+
+# Entries whose _id is younger than this may still be in flight (or come
+# from a server whose clock is behind), so compaction leaves them for the next run
+SETTLE_SECONDS = 60
+# Balance differences below this are float rounding, not drift
+TOLERANCE = 1e-6
+
+
+def entry(league_id: ObjectId, user_id: ObjectId, amount: float, kind: str,
+          ref: str) -> Dict[str, Any]:
+    """Build a ledger entry; amount is signed (negative for debits)"""
+    return {
+        'league_id': league_id,
+        'user_id': user_id,
+        'amount': amount,
+        'kind': kind,  # 'join', 'stake', 'refund', 'cancel', 'payout', 'adjust', 'leave', 'open'
+        'ref': ref,
+        'created_at': datetime.utcnow()
+    }
+
+
+def append(entries: Iterable[Dict[str, Any]]) -> int:
+    """Insert ledger entries, skipping any whose ref is already recorded; returns the number added"""
+    entries = list(entries)
+    if not entries:
+        return 0
+    try:
+        result = get_db().get_collection(LEDGER).insert_many(entries, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != 11000 for error in errors):
+            print(f"Error appending ledger entries: {e}")
+        return e.details.get('nInserted', 0)
+    except Exception as e:
+        print(f"Error appending ledger entries: {e}")
+        return 0
+
+
+def _latest_snapshots(league_id: ObjectId, user_ids: List[ObjectId] = None,
+                      before: datetime = None) -> Dict[ObjectId, Dict[str, Any]]:
+    """Get each member's most recent snapshot (taken no later than before)"""
+    query = {'league_id': league_id}
+    if user_ids is not None:
+        query['user_id'] = {'$in': user_ids}
+    if before is not None:
+        query['as_of'] = {'$lte': before}
+    rows = get_db().get_collection(SNAPSHOTS).aggregate([
+        {'$match': query},
+        {'$sort': {'league_id': 1, 'user_id': 1, 'as_of': -1}},
+        {'$group': {'_id': '$user_id', 'balance': {'$first': '$balance'}, 'as_of': {'$first': '$as_of'}}}
+    ])
+    return {row['_id']: row for row in rows}
+
+
+def _appended_before(as_of: datetime) -> ObjectId:
+    """Smallest _id of an entry appended at or after as_of (a whole second)"""
+    return ObjectId.from_datetime(as_of)
+
+
+def _fold(league_id: ObjectId, snapshots: Dict[ObjectId, Dict[str, Any]],
+          user_ids: List[ObjectId] = None, until: datetime = None,
+          appended_before: ObjectId = None) -> Dict[ObjectId, float]:
+    """Add each member's entries appended after their snapshot to its balance.
+
+    until leaves out entries created from then on, appended_before those
+    appended from then on.
+    """
+    query = {'league_id': league_id}
+    if user_ids is not None:
+        query['user_id'] = {'$in': user_ids}
+    starts = {user_id: _appended_before(snapshot['as_of']) for user_id, snapshot in snapshots.items()}
+    if starts and (user_ids is None or len(starts) == len(user_ids)):
+        # Entries appended before every snapshot are folded in already
+        # (members without a snapshot only have entries newer than the last compaction)
+        query['_id'] = {'$gte': min(starts.values())}
+    if appended_before is not None:
+        query.setdefault('_id', {})['$lt'] = appended_before
+    if until is not None:
+        query['created_at'] = {'$lt': until}
+
+    balances = {user_id: snapshot['balance'] for user_id, snapshot in snapshots.items()}
+    entries = get_db().get_collection(LEDGER).find(query, {'user_id': 1, 'amount': 1})
+    for ledger_entry in entries:
+        start = starts.get(ledger_entry['user_id'])
+        if start is None or ledger_entry['_id'] >= start:
+            balances[ledger_entry['user_id']] = balances.get(ledger_entry['user_id'], 0) + ledger_entry['amount']
+    return balances
+
+
+def balance_at(league_id: ObjectId, user_id: ObjectId, at: datetime = None) -> Optional[float]:
+    """Reconstruct a member's balance as of at (now if None); None if the ledger has no record of them"""
+    try:
+        snapshots = _latest_snapshots(league_id, [user_id], before=at)
+        return _fold(league_id, snapshots, [user_id], until=at).get(user_id)
+    except Exception as e:
+        print(f"Error getting ledger balance: {e}")
+        return None
+
+
+def compact(league_id: ObjectId, now: datetime = None) -> int:
+    """Fold a league's settled entries into new member snapshots; returns the number written.
+
+    Only members with entries since the league's last compaction get a new
+    snapshot. Snapshots are keyed by (member, as_of), so a compaction that is
+    interrupted and re-run writes each one once.
+    """
+    try:
+        db = get_db()
+        # Whole seconds, so as_of and the _ids appended before it match exactly
+        cutoff = ((now or datetime.utcnow()) - timedelta(seconds=SETTLE_SECONDS)).replace(microsecond=0)
+        league_data = db.get_collection('leagues').find_one(
+            {'_id': league_id}, {'_id': 0, 'ledger_compacted_at': 1})
+        if league_data is None:
+            return 0
+        previous = league_data.get('ledger_compacted_at')
+        if previous is not None and previous >= cutoff:
+            return 0
+
+        window = {'$lt': _appended_before(cutoff)}
+        if previous is not None:
+            window['$gte'] = _appended_before(previous)
+        user_ids = db.get_collection(LEDGER).distinct(
+            'user_id', {'league_id': league_id, '_id': window})
+
+        written = 0
+        if user_ids:
+            snapshots = _latest_snapshots(league_id, user_ids)
+            balances = _fold(league_id, snapshots, user_ids, appended_before=window['$lt'])
+            try:
+                result = db.get_collection(SNAPSHOTS).insert_many([
+                    {'league_id': league_id, 'user_id': user_id, 'balance': balance,
+                     'as_of': cutoff, 'created_at': datetime.utcnow()}
+                    for user_id, balance in balances.items()
+                ], ordered=False)
+                written = len(result.inserted_ids)
+            except BulkWriteError as e:
+                written = e.details.get('nInserted', 0)
+
+        db.get_collection('leagues').update_one(
+            {'_id': league_id, 'ledger_compacted_at': previous},
+            {'$set': {'ledger_compacted_at': cutoff}}
+        )
+        return written
+    except Exception as e:
+        print(f"Error compacting ledger: {e}")
+        return 0
+
+
+def find_drift(league_id: ObjectId) -> List[Dict[str, Any]]:
+    """Get the members whose balance differs from what the ledger says it should be.
+
+    A balance changed within the last moments may show up until its entry
+    is appended; re-check before acting on a small, recent difference.
+    """
+    try:
+        snapshots = _latest_snapshots(league_id)
+        ledger_balances = _fold(league_id, snapshots)
+        members = get_db().get_collection('memberships').find(
+            {'league_id': league_id}, {'_id': 0, 'user_id': 1, 'username': 1, 'balance': 1})
+
+        drift = []
+        for member in members:
+            ledger_balance = ledger_balances.get(member['user_id'])
+            if ledger_balance is None or abs(member['balance'] - ledger_balance) > TOLERANCE:
+                drift.append({
+                    'user_id': member['user_id'],
+                    'username': member.get('username'),
+                    'balance': member['balance'],
+                    'ledger_balance': ledger_balance
+                })
+        return drift
+    except Exception as e:
+        print(f"Error checking ledger drift: {e}")
+        return []
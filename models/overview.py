@@ -0,0 +1,77 @@
+"""Everything the league detail page shows, loaded in one aggregation"""
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from database import get_db
+from models.bet import Bet
+from models.league import BY_BALANCE, MEMBER_PROJECTION, MEMBERSHIPS, League
+from models.pagination import keyset_stages, to_page
+from models.ticket import Ticket
+
+# Members shown in the league page's leaderboard
+TOP_MEMBERS = 5
+
+
+def overview_pipeline(league_id: ObjectId, user_id: ObjectId, fields: List[str],
+                      tickets_limit: int, bets_limit: int, tickets_after: str = None,
+                      bets_after: str = None, top: int = TOP_MEMBERS) -> List[Dict[str, Any]]:
+    """Aggregation on leagues producing one overview document (see load_league_overview)"""
+    projection = League.lean_projection(fields)
+    return [
+        {'$match': {'_id': league_id}},
+        {'$project': projection},
+        # localField/foreignField plus a pipeline: each lookup is an indexed
+        # (and for pages, already-sorted) range read, the same as the models do.
+        # First only the caller's own entry, as after a lean load; none, no member
+        {'$lookup': {
+            'from': MEMBERSHIPS, 'localField': '_id', 'foreignField': 'league_id',
+            'pipeline': [{'$match': {'user_id': user_id}}, {'$project': MEMBER_PROJECTION}],
+            'as': 'members'
+        }},
+        {'$match': {'members': {'$ne': []}}},
+        {'$lookup': {
+            'from': MEMBERSHIPS, 'localField': '_id', 'foreignField': 'league_id',
+            'pipeline': [{'$sort': dict(BY_BALANCE)}, {'$limit': top},
+                         {'$project': {'_id': 0, 'user_id': 1, 'username': 1, 'balance': 1}}],
+            'as': 'leaderboard'
+        }},
+        {'$lookup': {
+            'from': 'tickets', 'localField': '_id', 'foreignField': 'league_id',
+            'pipeline': keyset_stages('created_at', tickets_limit, tickets_after),
+            'as': 'tickets'
+        }},
+        {'$lookup': {
+            'from': 'bets', 'localField': '_id', 'foreignField': 'league_id',
+            'pipeline': [{'$match': {'user_id': user_id}}] + keyset_stages('placed_at', bets_limit, bets_after),
+            'as': 'user_bets'
+        }},
+    ]
+
+
+def load_league_overview(league_id: str, user_id: ObjectId, fields: List[str],
+                         tickets_limit: int, bets_limit: int, tickets_after: str = None,
+                         bets_after: str = None, top: int = TOP_MEMBERS) -> Optional[Dict[str, Any]]:
+    """Load a league with a page of its tickets, a page of the user's bets and the top members.
+
+    Returns {'league', 'tickets', 'user_bets', 'leaderboard'} from a single
+    round trip, or None if the league does not exist or user_id is not a
+    member. league is a lean League holding fields, the member count and the
+    user's own member entry (so get_member/get_member_stats need no query).
+    The cursors must be valid (see pagination.valid_cursor).
+    """
+    try:
+        league_id = ObjectId(league_id)
+        pipeline = overview_pipeline(league_id, user_id, fields, tickets_limit, bets_limit,
+                                     tickets_after, bets_after, top)
+        data = next(get_db().get_collection('leagues').aggregate(pipeline), None)
+        if data is None:
+            return None
+
+        return {
+            'league': League._from_dict(data, fields, data['members'][0]),
+            'tickets': to_page(data['tickets'], tickets_limit, 'created_at', Ticket._from_dict),
+            'user_bets': to_page(data['user_bets'], bets_limit, 'placed_at', Bet._from_dict),
+            'leaderboard': data['leaderboard']
+        }
+    except Exception as e:
+        print(f"Error loading league overview: {e}")
+        return None
@@ -0,0 +1,103 @@
+"""Keyset (cursor) pagination over a (sort field, _id) pair, newest first"""
+import base64
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from bson import ObjectId
+
+# Upper bound on page size accepted from API clients
+MAX_PAGE_SIZE = 100
+
+
+class Page(list):
+    """One page of results plus the opaque cursor for the next (older) page"""
+
+    def __init__(self, items=(), next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(value: datetime, object_id: ObjectId) -> str:
+    """Encode the sort key of the last item on a page"""
+    raw = f"{value.isoformat()}|{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a cursor from encode_cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, object_id = raw.split('|')
+        return datetime.fromisoformat(value), ObjectId(object_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def valid_cursor(cursor: Optional[str]) -> Optional[str]:
+    """cursor if it decodes, else None (the first page)"""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+            return cursor
+        except ValueError:
+            pass
+    return None
+
+
+def page_params(args: Mapping[str, str], default_limit: int,
+                cursor_param: str = 'after') -> Tuple[int, Optional[str]]:
+    """Read (limit, cursor) from request args, clamping limit to MAX_PAGE_SIZE"""
+    try:
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        limit = default_limit
+    return max(1, min(limit, MAX_PAGE_SIZE)), args.get(cursor_param) or None
+
+
+def keyset_filter(sort_field: str, after: Optional[str]) -> Dict[str, Any]:
+    """Query conditions selecting the items after a cursor ({} for the first page)"""
+    if not after:
+        return {}
+    value, object_id = decode_cursor(after)
+    # Equivalent to sort_field < value or (== value and _id < object_id),
+    # but the $lte keeps the index bounds tight so no blocking sort is needed
+    return {
+        sort_field: {'$lte': value},
+        '$or': [{sort_field: {'$lt': value}}, {'_id': {'$lt': object_id}}]
+    }
+
+
+def keyset_stages(sort_field: str, limit: int, after: str = None) -> List[Dict[str, Any]]:
+    """Aggregation stages selecting one page (plus one extra document, see to_page)"""
+    stages = [{'$match': keyset_filter(sort_field, after)}] if after else []
+    return stages + [{'$sort': {sort_field: -1, '_id': -1}}, {'$limit': limit + 1}]
+
+
+def to_page(documents: List[Dict[str, Any]], limit: int, sort_field: str,
+            hydrate: Callable[[Dict[str, Any]], Any]) -> Page:
+    """Build a Page from up to limit + 1 documents sorted newest first"""
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = encode_cursor(last[sort_field], last['_id'])
+    return Page((hydrate(data) for data in documents), next_cursor)
+
+
+def paginate(collection, query: Dict[str, Any], sort_field: str,
+             hydrate: Callable[[Dict[str, Any]], Any], projection: Dict[str, Any] = None,
+             limit: int = None, after: str = None) -> Page:
+    """Run query newest first, returning at most limit items after the cursor.
+
+    Without a limit every matching document is returned in one Page.
+    """
+    if after:
+        query = dict(query, **keyset_filter(sort_field, after))
+    if projection is not None:
+        projection = dict(projection, **{sort_field: 1})
+
+    cursor = collection.find(query, projection).sort([(sort_field, -1), ('_id', -1)])
+    if limit is None:
+        return Page(hydrate(data) for data in cursor)
+
+    # Fetch one extra document to know whether another page exists
+    return to_page(list(cursor.limit(limit + 1)), limit, sort_field, hydrate)
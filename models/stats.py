@@ -0,0 +1,48 @@
+"""Betting statistics helpers shared by the Bet and League models"""
+from typing import Dict, Any
+
+# Raw counters kept per league member and summed by Bet.get_user_stats
+STATS_COUNTERS = ('total_bets', 'won_bets', 'lost_bets', 'pending_bets',
+                  'total_wagered', 'total_winnings')
+
+# $group accumulators producing STATS_COUNTERS from bet documents
+STATS_ACCUMULATORS = {
+    'total_bets': {'$sum': 1},
+    'won_bets': {'$sum': {'$cond': [{'$eq': ['$status', 'won']}, 1, 0]}},
+    'lost_bets': {'$sum': {'$cond': [{'$eq': ['$status', 'lost']}, 1, 0]}},
+    'pending_bets': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+    'total_wagered': {'$sum': '$amount'},
+    'total_winnings': {'$sum': {'$cond': [{'$eq': ['$status', 'won']}, '$potential_payout', 0]}}
+}
+
+
+def build_stats(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive the stats dictionary from raw counters"""
+    counters = {key: totals.get(key) or 0 for key in STATS_COUNTERS}
+    total_bets = counters['total_bets']
+    win_rate = (counters['won_bets'] / total_bets * 100) if total_bets > 0 else 0
+    net_profit = counters['total_winnings'] - counters['total_wagered']
+
+    return {
+        'total_bets': total_bets,
+        'won_bets': counters['won_bets'],
+        'lost_bets': counters['lost_bets'],
+        'pending_bets': counters['pending_bets'],
+        'total_wagered': counters['total_wagered'],
+        'total_winnings': counters['total_winnings'],
+        'win_rate': round(win_rate, 2),
+        'net_profit': net_profit,
+        # Names used by the betting history page
+        'wins': counters['won_bets'],
+        'losses': counters['lost_bets'],
+        'net_winnings': net_profit
+    }
+
+
+def combine_stats(counter_sets) -> Dict[str, Any]:
+    """Build one stats dictionary from several sets of raw counters"""
+    totals = dict.fromkeys(STATS_COUNTERS, 0)
+    for counters in counter_sets:
+        for key in STATS_COUNTERS:
+            totals[key] += counters.get(key) or 0
+    return build_stats(totals)
@@ -0,0 +1,85 @@
+"""Change tracking for delta sync of tickets, bets and league memberships.
+
+Each of them records the league `version` of its last change, and deletions
+leave a tombstone that does the same. A write marks everything it touches
+with a fresh sync_token, bumps the league version once the write is done
+and then stamps the marked documents with that version, clearing the token.
+Anything still carrying a token is in flight and counts as changed, so a
+reader that takes the league version *before* querying can use it as the
+next `since` without ever missing a change.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional
+from bson import ObjectId
+from database import get_db
+
+SYNC_TOKEN = 'sync_token'
+TOMBSTONES = 'tombstones'
+
+
+def new_token() -> ObjectId:
+    """Token marking the documents changed by one write"""
+    return ObjectId()
+
+
+def since_param(args: Mapping[str, str]) -> Optional[int]:
+    """Read the `since` version from request args; raises ValueError if it is not an integer"""
+    since = args.get('since')
+    return int(since) if since not in (None, '') else None
+
+
+def checked_since(since: Optional[int], version: int) -> Optional[int]:
+    """since, or None (a full listing) if it is ahead of the league's version.
+
+    Such a since cannot come from this league's history (e.g. the database
+    was restored from a backup), so the client has to replace its copy.
+    """
+    return since if since is not None and since <= version else None
+
+
+def changed_query(league_id: ObjectId, since: Optional[int]) -> Dict[str, Any]:
+    """Filter for a league's documents changed after version since (all if None)"""
+    query = {'league_id': league_id}
+    if since is not None:
+        query['$or'] = [{'version': {'$gt': since}}, {SYNC_TOKEN: {'$exists': True}}]
+    return query
+
+
+def stamp(collection: str, query: Dict[str, Any], token: ObjectId, version: Optional[int]):
+    """Give the documents marked with token their league version"""
+    if version is None:
+        return  # Version bump failed; the token keeps them in every delta instead
+    try:
+        get_db().get_collection(collection).update_many(
+            dict(query, **{SYNC_TOKEN: token}),
+            {'$set': {'version': version}, '$unset': {SYNC_TOKEN: ''}}
+        )
+    except Exception as e:
+        print(f"Error stamping {collection} version: {e}")
+
+
+def record_deletion(league_id: ObjectId, kind: str, doc_id: ObjectId, token: ObjectId):
+    """Leave a tombstone for a deleted ticket, bet or member"""
+    try:
+        get_db().get_collection(TOMBSTONES).insert_one({
+            'league_id': league_id,
+            'kind': kind,
+            'doc_id': doc_id,
+            'deleted_at': datetime.utcnow(),
+            SYNC_TOKEN: token
+        })
+    except Exception as e:
+        print(f"Error recording {kind} deletion: {e}")
+
+
+def get_deletions(league_id: ObjectId, kind: str, since: Optional[int]) -> List[ObjectId]:
+    """Ids of a league's tickets, bets or members deleted after version since"""
+    if since is None:
+        return []  # A full listing has no deletions to report
+    try:
+        query = dict(changed_query(league_id, since), kind=kind)
+        tombstones = get_db().get_collection(TOMBSTONES).find(query, {'_id': 0, 'doc_id': 1})
+        return [tombstone['doc_id'] for tombstone in tombstones]
+    except Exception as e:
+        print(f"Error getting {kind} deletions: {e}")
+        return []
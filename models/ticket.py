@@ -1,12 +1,33 @@
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 from database import get_db
+from models import identity_map
+from models.lazy import LazyFieldsMixin
+from models.league import League
+from models.pagination import Page, paginate
+from models.sync import SYNC_TOKEN, changed_query, new_token, stamp
 from typing import Optional, List, Dict, Any
 
+# Set on a ticket when it is resolved and unset once its ResolutionJob is
+# queued, so resolved tickets whose job was never created can be found
+PENDING_JOB = 'pending_job'
 
-class Ticket:
+
+class Ticket(LazyFieldsMixin):
     """Ticket model for managing betting tickets"""
 
+    _COLLECTION = 'tickets'
+    _FIELDS = {
+        'league_id': 'league_id', 'title': 'title', 'description': 'description',
+        'type': 'ticket_type', 'options': 'options', 'target_value': 'target_value',
+        'status': 'status', 'resolution': 'resolution', 'created_by': 'created_by',
+        'created_at': 'created_at', 'closes_at': 'closes_at', 'resolved_at': 'resolved_at'
+    }
+    __slots__ = tuple(_FIELDS.values())
+
+    # Due tickets closed per update_many by close_due_tickets
+    CLOSE_BATCH_SIZE = 500
+
     def __init__(self, league_id: ObjectId = None, title: str = None, description: str = None,
                  ticket_type: str = 'moneyline', options: List[Dict] = None,
                  target_value: float = None, status: str = 'open',
@@ -22,10 +43,11 @@ class Ticket:
         self.status = status  # 'open', 'closed', 'resolved'
         self.resolution = resolution
         self.created_by = created_by
-        self.created_at = created_at or datetime.now(datetime.timezone.utc)
+        self.created_at = created_at or datetime.utcnow()
         self.closes_at = closes_at
         self.resolved_at = resolved_at
         self._id = _id
+        self._loaded_fields = None
 
     def add_option(self, option_text: str, odds: float) -> bool:
         """Add betting option to ticket"""
@@ -80,6 +102,51 @@ class Ticket:
             return True
         return False
 
+    def resolve_atomically(self, winning_option: str) -> bool:
+        """Resolve the ticket with one conditional update; False if it was already resolved"""
+        try:
+            db = get_db()
+            now = datetime.utcnow()
+            token = new_token()
+            # Only the first of several concurrent resolutions matches
+            result = db.get_collection('tickets').update_one(
+                {'_id': self._id, 'status': {'$in': ['open', 'closed']}},
+                {'$set': {'status': 'resolved', 'resolution': winning_option, 'resolved_at': now,
+                          'updated_at': now, PENDING_JOB: True, SYNC_TOKEN: token}}
+            )
+            identity_map.invalidate('tickets', self._id)
+            if not result.modified_count:
+                return False
+            self.status = 'resolved'
+            self.resolution = winning_option
+            self.resolved_at = now
+            stamp('tickets', {'_id': self._id}, token, League.bump_version(self.league_id))
+            return True
+        except Exception as e:
+            print(f"Error resolving ticket: {e}")
+            return False
+
+    def close_atomically(self) -> bool:
+        """Close the ticket for new bets with one conditional update; False if it was not open"""
+        try:
+            db = get_db()
+            now = datetime.utcnow()
+            token = new_token()
+            # Never reopens a ticket that was resolved meanwhile
+            result = db.get_collection('tickets').update_one(
+                {'_id': self._id, 'status': 'open'},
+                {'$set': {'status': 'closed', 'updated_at': now, SYNC_TOKEN: token}}
+            )
+            identity_map.invalidate('tickets', self._id)
+            if not result.modified_count:
+                return False
+            self.status = 'closed'
+            stamp('tickets', {'_id': self._id}, token, League.bump_version(self.league_id))
+            return True
+        except Exception as e:
+            print(f"Error closing ticket: {e}")
+            return False
+
     def is_expired(self) -> bool:
         """Check if ticket is past its closing time"""
         if self.closes_at:
@@ -88,25 +155,19 @@ class Ticket:
 
     def can_place_bets(self) -> bool:
         """Check if users can still place bets"""
+        # The scheduler closes due tickets within an interval; until then
+        # closes_at is still enforced here
         return self.status == 'open' and not self.is_expired()
 
     def save(self) -> ObjectId:
         """Save ticket to database"""
         db = get_db()
         ticket_data = {
-            'league_id': self.league_id,
-            'title': self.title,
-            'description': self.description,
-            'type': self.ticket_type,
-            'options': self.options,
-            'target_value': self.target_value,
-            'status': self.status,
-            'resolution': self.resolution,
-            'created_by': self.created_by,
-            'created_at': self.created_at,
-            'closes_at': self.closes_at,
-            'resolved_at': self.resolved_at
+            field: getattr(self, attr) for field, attr in self._FIELDS.items()
+            if self._is_loaded(field)
         }
+        token = new_token()
+        ticket_data.update({'updated_at': datetime.utcnow(), SYNC_TOKEN: token})
 
         if self._id:
             # Update existing ticket
@@ -114,12 +175,16 @@ class Ticket:
                 {'_id': self._id},
                 {'$set': ticket_data}
             )
-            return self._id if result.modified_count > 0 else None
+            saved = result.modified_count > 0
         else:
             # Create new ticket
             result = db.get_collection('tickets').insert_one(ticket_data)
             self._id = result.inserted_id
-            return self._id
+            saved = True
+
+        identity_map.invalidate('tickets', self._id)
+        stamp('tickets', {'_id': self._id}, token, League.bump_version(self.league_id))
+        return self._id if saved else None
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert ticket to dictionary"""
@@ -140,33 +205,72 @@ class Ticket:
         }
 
     @classmethod
-    def get_by_id(cls, ticket_id: str) -> Optional['Ticket']:
-        """Get ticket by ID"""
+    def get_by_id(cls, ticket_id: str, fields: List[str] = None) -> Optional['Ticket']:
+        """Get ticket by ID, optionally loading only some fields"""
         try:
-            db = get_db()
-            ticket_data = db.get_collection('tickets').find_one(
-                {'_id': ObjectId(ticket_id)})
-            if ticket_data:
-                return cls._from_dict(ticket_data)
-            return None
+            ticket_id = ObjectId(ticket_id)
+            return identity_map.load('tickets', ticket_id,
+                                     lambda: cls._find_one({'_id': ticket_id}, fields))
         except Exception as e:
             print(f"Error getting ticket by ID: {e}")
             return None
 
     @classmethod
-    def get_league_tickets(cls, league_id: ObjectId, status: str = None) -> List['Ticket']:
-        """Get all tickets for a league"""
+    def get_league_tickets(cls, league_id: ObjectId, status: str = None,
+                           fields: List[str] = None, limit: int = None,
+                           after: str = None) -> Page:
+        """Get a league's tickets, newest first, a page at a time when limit is given"""
         try:
-            db = get_db()
             query = {'league_id': league_id}
             if status:
                 query['status'] = status
 
-            tickets_data = db.get_collection(
-                'tickets').find(query).sort('created_at', -1)
-            return [cls._from_dict(ticket_data) for ticket_data in tickets_data]
+            return paginate(
+                get_db().get_collection('tickets'), query, 'created_at',
+                lambda data: cls._from_dict(data, fields),
+                cls._projection(fields) if fields else None, limit, after
+            )
         except Exception as e:
             print(f"Error getting league tickets: {e}")
+            return Page()
+
+    @classmethod
+    def get_changes(cls, league_id: ObjectId, since: int = None) -> List['Ticket']:
+        """Get a league's tickets changed after version since (all of them if None)"""
+        try:
+            db = get_db()
+            tickets_data = db.get_collection('tickets').find(changed_query(league_id, since))
+            return [cls._from_dict(ticket_data) for ticket_data in tickets_data]
+        except Exception as e:
+            print(f"Error getting ticket changes: {e}")
+            return []
+
+    @classmethod
+    def close_due_tickets(cls, now: datetime = None) -> List['Ticket']:
+        """Close up to CLOSE_BATCH_SIZE open tickets past closes_at in one update; returns them"""
+        try:
+            db = get_db()
+            now = now or datetime.utcnow()
+            due = [ticket_data['_id'] for ticket_data in db.get_collection('tickets').find(
+                {'status': 'open', 'closes_at': {'$lt': now}}, {'_id': 1}
+            ).limit(cls.CLOSE_BATCH_SIZE)]
+            if not due:
+                return []
+
+            # Tickets closed or resolved by an admin meanwhile keep their status
+            token = new_token()
+            db.get_collection('tickets').update_many(
+                {'_id': {'$in': due}, 'status': 'open'},
+                {'$set': {'status': 'closed', 'updated_at': now, SYNC_TOKEN: token}}
+            )
+            identity_map.invalidate('tickets')
+            closed = [cls._from_dict(ticket_data) for ticket_data in
+                      db.get_collection('tickets').find({'_id': {'$in': due}, SYNC_TOKEN: token})]
+            for league_id in {ticket.league_id for ticket in closed}:
+                stamp('tickets', {'league_id': league_id}, token, League.bump_version(league_id))
+            return closed
+        except Exception as e:
+            print(f"Error closing due tickets: {e}")
             return []
 
     @classmethod
@@ -236,23 +340,16 @@ class Ticket:
             return None
 
     @classmethod
-    def _from_dict(cls, data: Dict[str, Any]) -> 'Ticket':
+    def _find_one(cls, query: Dict[str, Any], fields: List[str] = None) -> Optional['Ticket']:
+        """Load a single ticket matching query"""
+        projection = cls._projection(fields) if fields else None
+        ticket_data = get_db().get_collection('tickets').find_one(query, projection)
+        return cls._from_dict(ticket_data, fields) if ticket_data else None
+
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any], fields: List[str] = None) -> 'Ticket':
         """Create Ticket instance from database data"""
-        return cls(
-            _id=data.get('_id'),
-            league_id=data.get('league_id'),
-            title=data.get('title'),
-            description=data.get('description'),
-            ticket_type=data.get('type'),
-            options=data.get('options', []),
-            target_value=data.get('target_value'),
-            status=data.get('status'),
-            resolution=data.get('resolution'),
-            created_by=data.get('created_by'),
-            created_at=data.get('created_at'),
-            closes_at=data.get('closes_at'),
-            resolved_at=data.get('resolved_at')
-        )
+        return cls._from_bson(data, fields)
 
     def __repr__(self):
         return f"<Ticket {self.title}>"
@@ -3,10 +3,25 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
 from datetime import datetime
 from database import get_db
+from models import identity_map
+from models.cache import TTLCache
+from models.lazy import LazyFieldsMixin
 from typing import Optional, List, Dict, Any
 
-class User(UserMixin):
+# Projected user documents for the Flask-Login user loader, keyed by id
+_session_cache = TTLCache()
+
+
+class User(LazyFieldsMixin, UserMixin):
     """User model for authentication and profile management"""
+
+    _COLLECTION = 'users'
+    _FIELDS = {field: field for field in ('username', 'email', 'password_hash', 'created_at', 'leagues')}
+    # UserMixin has no __slots__, so users still get a __dict__; fields live in slots
+    __slots__ = tuple(_FIELDS.values())
+
+    # Fields loaded for the logged-in session user (no password hash or leagues)
+    SESSION_FIELDS = ('username', 'email', 'created_at')
     
     def __init__(self, username: str = None, email: str = None, password_hash: str = None, 
                  created_at: datetime = None, leagues: List[ObjectId] = None, _id: ObjectId = None):
@@ -16,6 +31,7 @@ class User(UserMixin):
         self.created_at = created_at or datetime.utcnow()
         self.leagues = leagues or []
         self._id = _id
+        self._loaded_fields = None
     
     def get_id(self):
         """Required by Flask-Login"""
@@ -33,37 +49,43 @@ class User(UserMixin):
         """Save user to database"""
         db = get_db()
         user_data = {
-            'username': self.username,
-            'email': self.email,
-            'password_hash': self.password_hash,
-            'created_at': self.created_at,
-            'leagues': self.leagues
+            field: getattr(self, field) for field in self._FIELDS if self._is_loaded(field)
         }
         
         if self._id:
             # Update existing user
             result = db.get_collection('users').update_one(
                 {'_id': self._id},
-                {'$set': user_data}
+                {'$set': self._loaded_data(user_data)}
             )
+            identity_map.invalidate('users', self._id)
+            _session_cache.pop(str(self._id))
             return self._id if result.modified_count > 0 else None
         else:
             # Create new user
             result = db.get_collection('users').insert_one(user_data)
             self._id = result.inserted_id
+            identity_map.invalidate('users', self._id)
             return self._id
     
     def add_league(self, league_id: ObjectId):
         """Add league to user's league list"""
-        if league_id not in self.leagues:
+        if self._is_loaded('leagues') and league_id not in self.leagues:
             self.leagues.append(league_id)
-            self.save()
+        self._update_leagues({'$addToSet': {'leagues': league_id}})
     
     def remove_league(self, league_id: ObjectId):
         """Remove league from user's league list"""
-        if league_id in self.leagues:
+        if self._is_loaded('leagues') and league_id in self.leagues:
             self.leagues.remove(league_id)
-            self.save()
+        self._update_leagues({'$pull': {'leagues': league_id}})
+    
+    def _update_leagues(self, update: Dict[str, Any]):
+        """Apply an atomic update to the stored league list"""
+        db = get_db()
+        db.get_collection('users').update_one({'_id': self._id}, update)
+        identity_map.invalidate('users', self._id)
+        _session_cache.pop(str(self._id))
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert user to dictionary"""
@@ -76,27 +98,46 @@ class User(UserMixin):
         }
     
     @classmethod
-    def get_by_id(cls, user_id: str) -> Optional['User']:
-        """Get user by ID"""
+    def get_by_id(cls, user_id: str, fields: List[str] = None) -> Optional['User']:
+        """Get user by ID, optionally loading only some fields"""
         try:
-            db = get_db()
-            user_data = db.get_collection('users').find_one({'_id': ObjectId(user_id)})
-            if user_data:
-                return cls._from_dict(user_data)
-            return None
+            user_id = ObjectId(user_id)
+            return identity_map.load('users', user_id,
+                                     lambda: cls._find_one({'_id': user_id}, fields))
         except Exception as e:
             print(f"Error getting user by ID: {e}")
             return None
     
+    @classmethod
+    def get_session_user(cls, user_id: str) -> Optional['User']:
+        """Get the logged-in user for Flask-Login with only SESSION_FIELDS loaded"""
+        try:
+            user_data = _session_cache.get(user_id)
+            if user_data is None:
+                user_data = get_db().get_collection('users').find_one(
+                    {'_id': ObjectId(user_id)},
+                    cls._projection(cls.SESSION_FIELDS)
+                )
+                if not user_data:
+                    return None
+                _session_cache.set(user_id, user_data)
+            
+            return cls._from_dict(user_data, cls.SESSION_FIELDS)
+        except Exception as e:
+            print(f"Error getting session user: {e}")
+            return None
+    
+    @classmethod
+    def configure_session_cache(cls, maxsize: int, ttl: float):
+        """Set the size and TTL of the session user cache"""
+        _session_cache.configure(maxsize, ttl)
+    
     @classmethod
     def get_by_email(cls, email: str) -> Optional['User']:
         """Get user by email"""
         try:
-            db = get_db()
-            user_data = db.get_collection('users').find_one({'email': email})
-            if user_data:
-                return cls._from_dict(user_data)
-            return None
+            return identity_map.load('users', ('email', email),
+                                     lambda: cls._find_one({'email': email}), alias=True)
         except Exception as e:
             print(f"Error getting user by email: {e}")
             return None
@@ -105,11 +146,8 @@ class User(UserMixin):
     def get_by_username(cls, username: str) -> Optional['User']:
         """Get user by username"""
         try:
-            db = get_db()
-            user_data = db.get_collection('users').find_one({'username': username})
-            if user_data:
-                return cls._from_dict(user_data)
-            return None
+            return identity_map.load('users', ('username', username),
+                                     lambda: cls._find_one({'username': username}), alias=True)
         except Exception as e:
             print(f"Error getting user by username: {e}")
             return None
@@ -137,16 +175,16 @@ class User(UserMixin):
             return None
     
     @classmethod
-    def _from_dict(cls, data: Dict[str, Any]) -> 'User':
+    def _find_one(cls, query: Dict[str, Any], fields: List[str] = None) -> Optional['User']:
+        """Load a single user matching query"""
+        projection = cls._projection(fields) if fields else None
+        user_data = get_db().get_collection('users').find_one(query, projection)
+        return cls._from_dict(user_data, fields) if user_data else None
+    
+    @classmethod
+    def _from_dict(cls, data: Dict[str, Any], fields: List[str] = None) -> 'User':
         """Create User instance from database data"""
-        return cls(
-            _id=data.get('_id'),
-            username=data.get('username'),
-            email=data.get('email'),
-            password_hash=data.get('password_hash'),
-            created_at=data.get('created_at'),
-            leagues=data.get('leagues', [])
-        )
+        return cls._from_bson(data, fields)
     
     def __repr__(self):
         return f"<User {self.username}>"
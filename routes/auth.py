@@ -128,7 +128,7 @@ def profile():
     """User profile page"""
     # Get user's leagues with basic stats
     from models.league import League
-    user_leagues = League.get_user_leagues(current_user._id)
+    user_leagues = League.get_user_leagues(current_user._id, fields=['status'])
     
     # Calculate basic stats
     total_leagues = len(user_leagues)
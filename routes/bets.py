@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, g
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import FloatField, StringField, SubmitField
@@ -6,6 +6,12 @@ from wtforms.validators import DataRequired, NumberRange
 from models.league import League
 from models.ticket import Ticket
 from models.bet import Bet
+from models.pagination import MAX_PAGE_SIZE, page_params
+from models.sync import checked_since, get_deletions, since_param
+from routes.conditional import league_etag
+from events import event_bus
+from group_commit import bet_batcher
+from models.stats import build_stats, combine_stats
 from bson import ObjectId
 
 bets_bp = Blueprint('bets', __name__)
@@ -19,6 +25,28 @@ class PlaceBetForm(FlaskForm):
     selected_option = StringField('Selected Option', validators=[DataRequired()])
     submit = SubmitField('Place Bet')
 
+def bet_json(bet):
+    """JSON representation of a bet in a league's bet list"""
+    return {
+        'id': bet._id,
+        'user_id': bet.user_id,
+        'amount': bet.amount,
+        'selected_option': bet.selected_option,
+        'status': bet.status,
+        'placed_at': bet.placed_at
+    }
+
+def user_bet_json(bet):
+    """JSON representation of the current user's bet on a ticket"""
+    return {
+        'id': bet._id,
+        'amount': bet.amount,
+        'selected_option': bet.selected_option,
+        'potential_payout': bet.potential_payout,
+        'status': bet.status,
+        'placed_at': bet.placed_at
+    }
+
 @bets_bp.route('/<ticket_id>/place', methods=['POST'])
 @login_required
 def place_bet(ticket_id):
@@ -30,13 +58,6 @@ def place_bet(ticket_id):
             flash('Ticket not found.', 'error')
             return redirect(url_for('leagues.dashboard'))
         
-        # Get league and check membership
-        league = League.get_by_id(ticket.league_id)
-        
-        if not league or not league.get_member(current_user._id):
-            flash('You are not a member of this league.', 'error')
-            return redirect(url_for('leagues.dashboard'))
-        
         # Check if ticket is open for betting
         if not ticket.can_place_bets():
             flash('This ticket is no longer accepting bets.', 'error')
@@ -46,45 +67,28 @@ def place_bet(ticket_id):
         amount = float(request.form.get('amount', 0))
         selected_option = request.form.get('selected_option', '').strip()
         
-        # Validate bet amount
-        user_member = league.get_member(current_user._id)
-        user_balance = user_member['balance']
-        
         if amount <= 0:
             flash('Bet amount must be greater than zero.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=ticket_id))
         
-        if amount > user_balance:
-            flash(f'Insufficient balance. You have ${user_balance:.2f} available.', 'error')
-            return redirect(url_for('tickets.detail', ticket_id=ticket_id))
-        
-        # Validate selected option
-        valid_options = [option['option_text'] for option in ticket.options]
-        if selected_option not in valid_options:
+        # Get odds for selected option
+        option = ticket.get_option(selected_option)
+        if not option:
             flash('Invalid option selected.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=ticket_id))
         
-        # Check if user already has a bet on this ticket
-        existing_bet = Bet.get_user_ticket_bet(current_user._id, ticket._id)
-        if existing_bet:
-            flash('You already have a bet on this ticket.', 'error')
-            return redirect(url_for('tickets.detail', ticket_id=ticket_id))
-        
-        # Get odds for selected option
-        option_odds = None
-        for option in ticket.options:
-            if option['option_text'] == selected_option:
-                option_odds = option['odds']
-                break
-        
+        option_odds = option['odds']
         if not option_odds:
             flash('Invalid odds for selected option.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=ticket_id))
         
-        # Create bet
-        bet = Bet.create_bet(
+        # Debit balance and create bet; membership and balance are enforced
+        # by the conditional debit, one bet per ticket by the unique
+        # (user_id, ticket_id) index. Batched with other bets in the league
+        # when group commit is on
+        bet = bet_batcher.place(
             user_id=current_user._id,
-            league_id=league._id,
+            league_id=ticket.league_id,
             ticket_id=ticket._id,
             amount=amount,
             selected_option=selected_option,
@@ -92,12 +96,25 @@ def place_bet(ticket_id):
         )
         
         if bet:
-            # Deduct bet amount from user's balance
-            new_balance = user_balance - amount
-            league.update_member_balance(current_user._id, new_balance)
-            league.save()
-            
+            event_bus.publish(ticket.league_id, 'balance',
+                              {'deltas': {str(current_user._id): -amount}})
             flash(f'Bet placed successfully! Potential payout: ${bet.potential_payout:.2f}', 'success')
+            return redirect(url_for('tickets.detail', ticket_id=ticket_id))
+        
+        # Work out why the bet was rejected
+        if Bet.get_user_ticket_bet(current_user._id, ticket._id):
+            flash('You already have a bet on this ticket.', 'error')
+            return redirect(url_for('tickets.detail', ticket_id=ticket_id))
+        
+        league = League.get_membership(ticket.league_id, current_user._id)
+        user_member = league.get_member(current_user._id) if league else None
+        
+        if not user_member:
+            flash('You are not a member of this league.', 'error')
+            return redirect(url_for('leagues.dashboard'))
+        
+        if amount > user_member['balance']:
+            flash(f'Insufficient balance. You have ${user_member["balance"]:.2f} available.', 'error')
         else:
             flash('Failed to place bet. Please try again.', 'error')
         
@@ -137,20 +154,13 @@ def cancel_bet(bet_id):
             flash('Cannot cancel bet - ticket is no longer accepting bets.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=str(bet.ticket_id)))
         
-        # Get league and refund bet amount
-        league = League.get_by_id(bet.league_id)
-        if league:
-            user_member = league.get_member(current_user._id)
-            if user_member:
-                new_balance = user_member['balance'] + bet.amount
-                league.update_member_balance(current_user._id, new_balance)
-                league.save()
-        
-        # Delete bet
-        from database import get_db
-        db = get_db()
-        db.get_collection('bets').delete_one({'_id': bet._id})
+        # Delete bet and refund bet amount
+        if not Bet.cancel(bet._id, current_user._id):
+            flash('Only pending bets can be cancelled.', 'error')
+            return redirect(url_for('tickets.detail', ticket_id=str(bet.ticket_id)))
         
+        event_bus.publish(bet.league_id, 'balance',
+                          {'deltas': {str(current_user._id): bet.amount}})
         flash('Bet cancelled successfully. Amount refunded to your balance.', 'success')
         return redirect(url_for('tickets.detail', ticket_id=str(bet.ticket_id)))
         
@@ -164,28 +174,39 @@ def history():
     """User's betting history"""
     try:
         league_id = request.args.get('league_id')
+        limit, after = page_params(request.args, current_app.config['PER_PAGE'])
         
         if league_id:
             # Get bets for specific league
-            league = League.get_by_id(league_id)
-            if not league or not league.get_member(current_user._id):
+            league = League.get_membership(league_id, current_user._id)
+            if not league:
                 flash('League not found or access denied.', 'error')
                 return redirect(url_for('leagues.dashboard'))
             
-            bets = Bet.get_user_bets(current_user._id, league._id)
+            bets = Bet.get_user_bets(current_user._id, league._id, limit=limit, after=after)
             league_name = league.name
+            user_stats = league.get_member_stats(current_user._id)
+            league_names = {}
         else:
             # Get all user bets
-            bets = Bet.get_user_bets(current_user._id)
+            bets = Bet.get_user_bets(current_user._id, limit=limit, after=after)
             league_name = None
-        
-        # Get user stats
-        user_stats = Bet.get_user_stats(current_user._id, league_id and ObjectId(league_id))
+            
+            # Overall and per-league stats from each league's member counters
+            user_leagues = League.get_user_leagues(current_user._id, fields=['name'])
+            league_names = {l._id: l.name for l in user_leagues}
+            members = {l._id: l.get_member(current_user._id) or {} for l in user_leagues}
+            user_stats = combine_stats(members.values())
+            user_stats['leagues'] = {
+                league_id: build_stats(member)
+                for league_id, member in members.items() if member.get('total_bets')
+            }
         
         return render_template('bets/history.html',
                              bets=bets,
                              user_stats=user_stats,
-                             league_name=league_name)
+                             league_name=league_name,
+                             league_names=league_names)
         
     except Exception as e:
         flash('An error occurred while loading betting history.', 'error')
@@ -196,16 +217,16 @@ def history():
 def api_user_stats(league_id):
     """API endpoint for user betting stats"""
     try:
-        league = League.get_by_id(league_id)
+        league = League.get_membership(league_id, current_user._id)
         
-        if not league or not league.get_member(current_user._id):
+        if not league:
             return jsonify({'error': 'League not found or access denied'}), 404
         
         user_stats = Bet.get_user_stats(current_user._id, league._id)
         
         return jsonify({
-            'league_id': str(league._id),
-            'user_id': str(current_user._id),
+            'league_id': league._id,
+            'user_id': current_user._id,
             'stats': user_stats
         })
         
@@ -223,9 +244,9 @@ def api_user_bet(ticket_id):
             return jsonify({'error': 'Ticket not found'}), 404
         
         # Get league and check membership
-        league = League.get_by_id(ticket.league_id)
+        league = League.get_membership(ticket.league_id, current_user._id)
         
-        if not league or not league.get_member(current_user._id):
+        if not league:
             return jsonify({'error': 'Access denied'}), 403
         
         # Get user's bet
@@ -233,58 +254,94 @@ def api_user_bet(ticket_id):
         
         if user_bet:
             return jsonify({
-                'ticket_id': str(ticket._id),
-                'bet': {
-                    'id': str(user_bet._id),
-                    'amount': user_bet.amount,
-                    'selected_option': user_bet.selected_option,
-                    'potential_payout': user_bet.potential_payout,
-                    'status': user_bet.status,
-                    'placed_at': user_bet.placed_at.isoformat()
-                }
+                'ticket_id': ticket._id,
+                'bet': user_bet_json(user_bet)
             })
         else:
             return jsonify({
-                'ticket_id': str(ticket._id),
+                'ticket_id': ticket._id,
                 'bet': None
             })
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch user bet'}), 500
 
+@bets_bp.route('/api/user-bets')
+@login_required
+def api_user_bets():
+    """API endpoint for the user's bets on many tickets (?ticket_ids=id1,id2,...)"""
+    try:
+        ticket_ids = [ObjectId(ticket_id) for ticket_id in
+                      request.args.get('ticket_ids', '').split(',') if ticket_id]
+    except Exception:
+        return jsonify({'error': 'Invalid ticket id'}), 400
+    
+    if len(ticket_ids) > MAX_PAGE_SIZE:
+        return jsonify({'error': f'At most {MAX_PAGE_SIZE} tickets per request'}), 400
+    
+    try:
+        # One $in query for the bets, then one membership check covering
+        # every league they belong to. Tickets without a visible bet map to None.
+        bets = Bet.get_user_ticket_bets(current_user._id, ticket_ids)
+        member_leagues = League.get_member_league_ids(
+            current_user._id, {bet.league_id for bet in bets}) if bets else set()
+        
+        user_bets = dict.fromkeys(map(str, ticket_ids))
+        for bet in bets:
+            if bet.league_id in member_leagues:
+                user_bets[str(bet.ticket_id)] = user_bet_json(bet)
+        
+        return jsonify({'bets': user_bets})
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch user bets'}), 500
+
 @bets_bp.route('/api/<league_id>/recent-bets')
 @login_required
+@league_etag
 def api_recent_bets(league_id):
     """API endpoint for recent bets in a league"""
     try:
-        league = League.get_by_id(league_id)
+        # Membership was checked by league_etag
+        league_id = ObjectId(league_id)
         
-        if not league or not league.get_member(current_user._id):
-            return jsonify({'error': 'League not found or access denied'}), 404
-        
-        # Get recent bets (last 10)
-        from database import get_db
-        db = get_db()
-        
-        bets_data = db.get_collection('bets').find({
-            'league_id': league._id
-        }).sort('placed_at', -1).limit(10)
-        
-        recent_bets = []
-        for bet_data in bets_data:
-            recent_bets.append({
-                'id': str(bet_data['_id']),
-                'user_id': str(bet_data['user_id']),
-                'amount': bet_data['amount'],
-                'selected_option': bet_data['selected_option'],
-                'status': bet_data['status'],
-                'placed_at': bet_data['placed_at'].isoformat()
-            })
+        # Get recent bets, 10 per page by default
+        limit, after = page_params(request.args, 10)
+        bets = Bet.get_league_bets(league_id, limit=limit, after=after)
         
         return jsonify({
-            'league_id': str(league._id),
-            'recent_bets': recent_bets
+            'league_id': league_id,
+            'recent_bets': [bet_json(bet) for bet in bets],
+            'next': bets.next_cursor
         })
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch recent bets'}), 500
+
+@bets_bp.route('/api/<league_id>/changes')
+@login_required
+@league_etag
+def api_bet_changes(league_id):
+    """API endpoint for league bets placed, settled or cancelled after ?since=<version>"""
+    try:
+        since = since_param(request.args)
+    except ValueError:
+        return jsonify({'error': 'since must be a league version'}), 400
+    
+    try:
+        # Membership was checked by league_etag
+        league_id = ObjectId(league_id)
+        since = checked_since(since, g.league_version)
+        bets = Bet.get_changes(league_id, since)
+        deleted = get_deletions(league_id, 'bets', since)
+        
+        return jsonify({
+            'league_id': league_id,
+            'version': g.league_version,
+            'full': since is None,
+            'bets': [dict(bet_json(bet), ticket_id=bet.ticket_id) for bet in bets],
+            'deleted': deleted
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch bet changes'}), 500
@@ -0,0 +1,39 @@
+"""Conditional GET (ETag / 304) support for league JSON APIs"""
+import hashlib
+from functools import wraps
+from flask import current_app, g, jsonify, make_response, request
+from flask_login import current_user
+from models.league import League
+
+
+def league_etag(view):
+    """Serve a league API view with a strong ETag derived from the league version.
+
+    Checks membership and reads the version with two small indexed reads. A
+    matching If-None-Match gets a 304 without running the view, so none of
+    its ticket or bet queries run. The view can read the version as g.league_version.
+    """
+    @wraps(view)
+    def wrapper(league_id, *args, **kwargs):
+        version = League.get_member_version(league_id, current_user._id)
+        if version is None:
+            return jsonify({'error': 'League not found or access denied'}), 404
+        g.league_version = version
+
+        # Different endpoints and query strings (pages) are different representations
+        etag = f'{league_id}-{version}-{request.endpoint}'
+        if request.query_string:
+            etag += '-' + hashlib.sha1(request.query_string).hexdigest()[:12]
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(league_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return wrapper
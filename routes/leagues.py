@@ -1,17 +1,29 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, g
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, FloatField, SubmitField, DateTimeField
 from wtforms.validators import DataRequired, Length, NumberRange
+from models import ledger
 from models.league import League
 from models.user import User
-from models.ticket import Ticket
-from models.bet import Bet
+from models.overview import load_league_overview
+from models.pagination import page_params, valid_cursor
+from models.stats import STATS_COUNTERS
+from models.sync import checked_since, get_deletions, since_param
+from events import event_bus, to_sse
+from routes.conditional import league_etag
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 leagues_bp = Blueprint('leagues', __name__)
 
+# League fields shown on the dashboard; members are not loaded
+DASHBOARD_FIELDS = ['name', 'description', 'status', 'created_at', 'end_date']
+# League fields shown on the detail page; only the user's own member entry is loaded
+DETAIL_FIELDS = DASHBOARD_FIELDS + ['creator_id', 'admins', 'starting_balance', 'invite_code']
+# League fields edited or shown on the settings page
+SETTINGS_FIELDS = League.HEADER_FIELDS + ['description', 'starting_balance', 'end_date', 'invite_code']
+
 class CreateLeagueForm(FlaskForm):
     """Form for creating a new league"""
     name = StringField('League Name', validators=[
@@ -36,11 +48,18 @@ class JoinLeagueForm(FlaskForm):
     ])
     submit = SubmitField('Join League')
 
+def member_json(member):
+    """JSON representation of a league member for the APIs"""
+    data = {key: member.get(key, 0) for key in STATS_COUNTERS}
+    data.update(user_id=member['user_id'], username=member['username'],
+                balance=member['balance'], joined_at=member.get('joined_at'))
+    return data
+
 @leagues_bp.route('/')
 @login_required
 def dashboard():
     """User's leagues dashboard"""
-    user_leagues = League.get_user_leagues(current_user._id)
+    user_leagues = League.get_user_leagues(current_user._id, fields=DASHBOARD_FIELDS)
     
     # Get basic stats
     total_leagues = len(user_leagues)
@@ -106,7 +125,10 @@ def join():
                         league.save()
                         current_user.add_league(league._id)
                         
-                        flash(f'Successfully joined "{league.name}"!', 'success')
+                        if league.joined(current_user._id):
+                            flash(f'Successfully joined "{league.name}"!', 'success')
+                        else:
+                            flash('You are already a member of this league.', 'warning')
                         return redirect(url_for('leagues.detail', league_id=str(league._id)))
                     else:
                         flash('Failed to join league. Please try again.', 'error')
@@ -123,37 +145,29 @@ def join():
 def detail(league_id):
     """League detail page"""
     try:
-        league = League.get_by_id(league_id)
-        
-        if not league:
-            flash('League not found.', 'error')
+        # League, a page each of tickets and the user's bets, and the top of
+        # the leaderboard, in one aggregation
+        per_page = current_app.config['PER_PAGE']
+        tickets_limit, tickets_after = page_params(request.args, per_page, 'tickets_after')
+        bets_limit, bets_after = page_params(request.args, per_page, 'bets_after')
+        # A mangled page link shows the first page rather than failing the load
+        overview = load_league_overview(league_id, current_user._id, DETAIL_FIELDS,
+                                        tickets_limit, bets_limit,
+                                        valid_cursor(tickets_after), valid_cursor(bets_after))
+        
+        if not overview:
+            flash('League not found or you are not a member.', 'error')
             return redirect(url_for('leagues.dashboard'))
         
-        # Check if user is a member
-        user_member = league.get_member(current_user._id)
-        if not user_member:
-            flash('You are not a member of this league.', 'error')
-            return redirect(url_for('leagues.dashboard'))
-        
-        # Get league tickets
-        tickets = Ticket.get_league_tickets(league._id)
-        
-        # Get user's bets for this league
-        user_bets = Bet.get_user_bets(current_user._id, league._id)
-        
-        # Get user stats
-        user_stats = Bet.get_user_stats(current_user._id, league._id)
-        
-        # Get leaderboard
-        leaderboard = league.get_leaderboard()
+        league = overview['league']
         
         return render_template('leagues/detail.html',
                              league=league,
-                             tickets=tickets,
-                             user_bets=user_bets,
-                             user_stats=user_stats,
-                             leaderboard=leaderboard,
-                             user_member=user_member)
+                             tickets=overview['tickets'],
+                             user_bets=overview['user_bets'],
+                             user_stats=league.get_member_stats(current_user._id),
+                             leaderboard=overview['leaderboard'],
+                             user_member=league.get_member(current_user._id))
         
     except Exception as e:
         flash('An error occurred while loading the league.', 'error')
@@ -199,10 +213,10 @@ def leave(league_id):
 def settings(league_id):
     """League settings page (admin only)"""
     try:
-        league = League.get_by_id(league_id)
+        league = League.get_membership(league_id, current_user._id, fields=SETTINGS_FIELDS)
         
         if not league:
-            flash('League not found.', 'error')
+            flash('League not found or you are not a member.', 'error')
             return redirect(url_for('leagues.dashboard'))
         
         # Check if user is admin
@@ -258,25 +272,117 @@ def leaderboard(league_id):
 
 @leagues_bp.route('/api/<league_id>/leaderboard')
 @login_required
+@league_etag
 def api_leaderboard(league_id):
     """API endpoint for leaderboard data"""
     try:
+        # Membership was checked by league_etag
         league = League.get_by_id(league_id)
         
-        if not league or not league.get_member(current_user._id):
+        if not league:
             return jsonify({'error': 'League not found or access denied'}), 404
         
         leaderboard_data = league.get_leaderboard()
         
         return jsonify({
-            'league_id': str(league._id),
+            'league_id': league._id,
             'league_name': league.name,
-            'leaderboard': leaderboard_data
+            'leaderboard': [member_json(member) for member in leaderboard_data]
         })
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch leaderboard'}), 500
 
+@leagues_bp.route('/api/<league_id>/changes')
+@login_required
+@league_etag
+def api_member_changes(league_id):
+    """API endpoint for members who joined, changed or left after ?since=<version>"""
+    try:
+        since = since_param(request.args)
+    except ValueError:
+        return jsonify({'error': 'since must be a league version'}), 400
+    
+    try:
+        # Membership was checked by league_etag
+        league_id = ObjectId(league_id)
+        since = checked_since(since, g.league_version)
+        members = League.get_member_changes(league_id, since)
+        deleted = get_deletions(league_id, 'members', since)
+        
+        return jsonify({
+            'league_id': league_id,
+            'version': g.league_version,
+            'full': since is None,
+            'members': [member_json(member) for member in members],
+            'deleted': deleted
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch member changes'}), 500
+
+@leagues_bp.route('/api/<league_id>/balance')
+@login_required
+def api_balance(league_id):
+    """API endpoint for the user's balance as of ?at=<ISO datetime, UTC> (default now), from the ledger"""
+    try:
+        at = datetime.fromisoformat(request.args['at']) if request.args.get('at') else None
+        if at and at.tzinfo:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        return jsonify({'error': 'at must be an ISO 8601 datetime'}), 400
+    
+    try:
+        league = League.get_membership(league_id, current_user._id)
+        
+        if not league:
+            return jsonify({'error': 'League not found or access denied'}), 404
+        
+        return jsonify({
+            'league_id': league._id,
+            'user_id': current_user._id,
+            'at': at or datetime.utcnow(),
+            'balance': ledger.balance_at(league._id, current_user._id, at)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch balance'}), 500
+
+@leagues_bp.route('/<league_id>/events')
+@login_required
+def events(league_id):
+    """Server-Sent Events stream of live updates for a league"""
+    league = League.get_membership(league_id, current_user._id)
+    
+    if not league:
+        return jsonify({'error': 'League not found or access denied'}), 404
+    
+    user_id = str(current_user._id)
+    keepalive = current_app.config['EVENTS_KEEPALIVE_SECONDS']
+    subscription = event_bus.subscribe(league._id)
+    
+    def stream():
+        with subscription:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = subscription.get(timeout=keepalive)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                
+                data = event['data']
+                if event['type'] == 'balance':
+                    # Members only see their own balance changes
+                    if user_id not in data['deltas']:
+                        continue
+                    data = {'deltas': {user_id: data['deltas'][user_id]}}
+                yield to_sse(event['type'], data)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+    })
+
 @leagues_bp.route('/api/join/<invite_code>', methods=['POST'])
 @login_required
 def api_join(invite_code):
@@ -298,9 +404,11 @@ def api_join(invite_code):
             league.save()
             current_user.add_league(league._id)
             
+            if not league.joined(current_user._id):
+                return jsonify({'error': 'Already a member of this league'}), 400
             return jsonify({
                 'success': True,
-                'league_id': str(league._id),
+                'league_id': league._id,
                 'league_name': league.name
             })
         else:
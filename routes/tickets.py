@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, g
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, FloatField, SubmitField, DateTimeField, SelectField, FieldList, FormField
 from wtforms.validators import DataRequired, Length, NumberRange
 from models.league import League
 from models.ticket import Ticket
+from models.job import ResolutionJob
+from models.pagination import page_params
+from models.sync import checked_since, get_deletions, since_param
+from routes.conditional import league_etag
+from events import publish_ticket_status
+from jobs import job_workers
 from bson import ObjectId
 from datetime import datetime, timedelta
 
@@ -46,15 +52,28 @@ class CreateTicketForm(FlaskForm):
     closes_at = DateTimeField('Closes At', format='%Y-%m-%dT%H:%M')
     submit = SubmitField('Create Ticket')
 
+def ticket_json(ticket):
+    """JSON representation of a ticket for the APIs"""
+    return {
+        'id': ticket._id,
+        'title': ticket.title,
+        'description': ticket.description,
+        'type': ticket.ticket_type,
+        'status': ticket.status,
+        'created_at': ticket.created_at,
+        'closes_at': ticket.closes_at,
+        'options': ticket.options
+    }
+
 @tickets_bp.route('/<league_id>/create', methods=['GET', 'POST'])
 @login_required
 def create(league_id):
     """Create new ticket (admin only)"""
     try:
-        league = League.get_by_id(league_id)
+        league = League.get_membership(league_id, current_user._id)
         
         if not league:
-            flash('League not found.', 'error')
+            flash('League not found or you are not a member.', 'error')
             return redirect(url_for('leagues.dashboard'))
         
         # Check if user is admin
@@ -105,6 +124,7 @@ def create(league_id):
                     )
                 
                 if ticket:
+                    publish_ticket_status(ticket)
                     flash(f'Ticket "{ticket.title}" created successfully!', 'success')
                     return redirect(url_for('leagues.detail', league_id=league_id))
                 else:
@@ -131,9 +151,9 @@ def detail(ticket_id):
             return redirect(url_for('leagues.dashboard'))
         
         # Get league and check membership
-        league = League.get_by_id(ticket.league_id)
+        league = League.get_membership(ticket.league_id, current_user._id)
         
-        if not league or not league.get_member(current_user._id):
+        if not league:
             flash('You are not a member of this league.', 'error')
             return redirect(url_for('leagues.dashboard'))
         
@@ -141,16 +161,20 @@ def detail(ticket_id):
         from models.bet import Bet
         user_bet = Bet.get_user_ticket_bet(current_user._id, ticket._id)
         
-        # Get all bets for this ticket (for admin view)
-        all_bets = []
+        # Get a page of bets for this ticket (for admin view), with the
+        # bettors' usernames in one query
+        all_bets, usernames = [], {}
         if league.is_admin(current_user._id):
-            all_bets = Bet.get_ticket_bets(ticket._id)
+            limit, after = page_params(request.args, current_app.config['PER_PAGE'])
+            all_bets = Bet.get_ticket_bets(ticket._id, limit=limit, after=after)
+            usernames = League.get_member_usernames(league._id, {bet.user_id for bet in all_bets})
         
         return render_template('tickets/detail.html',
                              ticket=ticket,
                              league=league,
                              user_bet=user_bet,
-                             all_bets=all_bets)
+                             all_bets=all_bets,
+                             usernames=usernames)
         
     except Exception as e:
         flash('An error occurred while loading the ticket.', 'error')
@@ -168,7 +192,7 @@ def resolve(ticket_id):
             return redirect(url_for('leagues.dashboard'))
         
         # Get league and check admin permissions
-        league = League.get_by_id(ticket.league_id)
+        league = League.get_membership(ticket.league_id, current_user._id)
         
         if not league or not league.is_admin(current_user._id):
             flash('You do not have permission to resolve this ticket.', 'error')
@@ -186,18 +210,20 @@ def resolve(ticket_id):
             flash('Invalid winning option selected.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=ticket_id))
         
-        # Resolve ticket
-        if ticket.resolve_ticket(winning_option):
-            ticket.save()
-            
-            # Resolve all bets for this ticket
-            from models.bet import Bet
-            result = Bet.resolve_bets(ticket._id, winning_option)
-            
-            # Update user balances
-            update_user_balances(ticket, winning_option, league)
+        # Resolve ticket; the job is only queued by the request that resolved it,
+        # or by a resolution worker if this request dies before queuing it
+        if ticket.resolve_atomically(winning_option):
+            # Bets are settled and winners paid by a background job
+            job = ResolutionJob.create(ticket._id, league._id, winning_option)
             
-            flash(f'Ticket resolved! {result["won"]} bets won, {result["lost"]} bets lost.', 'success')
+            if not job:
+                flash('Ticket resolved, but settling its bets could not be queued.', 'error')
+            elif job_workers.workers:
+                job_workers.notify()
+                flash(f'Ticket resolved! Settling {job.total} bets in the background.', 'success')
+            else:
+                job = job_workers.run_inline(job)
+                flash(f'Ticket resolved! {job.won} bets won, {job.lost} bets lost.', 'success')
         else:
             flash('Failed to resolve ticket.', 'error')
         
@@ -207,26 +233,6 @@ def resolve(ticket_id):
         flash('An error occurred while resolving the ticket.', 'error')
         return redirect(url_for('leagues.dashboard'))
 
-def update_user_balances(ticket, winning_option, league):
-    """Update user balances after ticket resolution"""
-    try:
-        from models.bet import Bet
-        bets = Bet.get_ticket_bets(ticket._id)
-        
-        for bet in bets:
-            user_member = league.get_member(bet.user_id)
-            if user_member:
-                if bet.selected_option == winning_option:
-                    # User won - add winnings to balance
-                    new_balance = user_member['balance'] + bet.potential_payout
-                    league.update_member_balance(bet.user_id, new_balance)
-                # If user lost, balance remains the same (bet amount was already deducted)
-        
-        league.save()
-        
-    except Exception as e:
-        print(f"Error updating user balances: {e}")
-
 @tickets_bp.route('/<ticket_id>/close', methods=['POST'])
 @login_required
 def close(ticket_id):
@@ -239,14 +245,14 @@ def close(ticket_id):
             return redirect(url_for('leagues.dashboard'))
         
         # Get league and check admin permissions
-        league = League.get_by_id(ticket.league_id)
+        league = League.get_membership(ticket.league_id, current_user._id)
         
         if not league or not league.is_admin(current_user._id):
             flash('You do not have permission to close this ticket.', 'error')
             return redirect(url_for('tickets.detail', ticket_id=ticket_id))
         
-        if ticket.close_ticket():
-            ticket.save()
+        if ticket.close_atomically():
+            publish_ticket_status(ticket)
             flash('Ticket closed for new bets.', 'success')
         else:
             flash('Failed to close ticket.', 'error')
@@ -257,35 +263,66 @@ def close(ticket_id):
         flash('An error occurred while closing the ticket.', 'error')
         return redirect(url_for('leagues.dashboard'))
 
+@tickets_bp.route('/api/<ticket_id>/resolution')
+@login_required
+def api_resolution(ticket_id):
+    """API endpoint for the progress of a ticket's resolution job"""
+    try:
+        job = ResolutionJob.get_for_ticket(ticket_id)
+        
+        if not job or not League.get_membership(job.league_id, current_user._id):
+            return jsonify({'error': 'Resolution not found'}), 404
+        
+        return jsonify(job.to_dict())
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch resolution progress'}), 500
+
 @tickets_bp.route('/api/<league_id>/tickets')
 @login_required
+@league_etag
 def api_tickets(league_id):
     """API endpoint for league tickets"""
     try:
-        league = League.get_by_id(league_id)
-        
-        if not league or not league.get_member(current_user._id):
-            return jsonify({'error': 'League not found or access denied'}), 404
-        
-        tickets = Ticket.get_league_tickets(league._id)
-        
-        tickets_data = []
-        for ticket in tickets:
-            tickets_data.append({
-                'id': str(ticket._id),
-                'title': ticket.title,
-                'description': ticket.description,
-                'type': ticket.ticket_type,
-                'status': ticket.status,
-                'created_at': ticket.created_at.isoformat(),
-                'closes_at': ticket.closes_at.isoformat() if ticket.closes_at else None,
-                'options': ticket.options
-            })
+        # Membership was checked by league_etag
+        league_id = ObjectId(league_id)
+        
+        limit, after = page_params(request.args, current_app.config['PER_PAGE'])
+        tickets = Ticket.get_league_tickets(league_id, limit=limit, after=after)
         
         return jsonify({
-            'league_id': str(league._id),
-            'tickets': tickets_data
+            'league_id': league_id,
+            'tickets': [ticket_json(ticket) for ticket in tickets],
+            'next': tickets.next_cursor
         })
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch tickets'}), 500
+
+@tickets_bp.route('/api/<league_id>/changes')
+@login_required
+@league_etag
+def api_ticket_changes(league_id):
+    """API endpoint for league tickets created, modified or deleted after ?since=<version>"""
+    try:
+        since = since_param(request.args)
+    except ValueError:
+        return jsonify({'error': 'since must be a league version'}), 400
+    
+    try:
+        # Membership was checked by league_etag
+        league_id = ObjectId(league_id)
+        since = checked_since(since, g.league_version)
+        tickets = Ticket.get_changes(league_id, since)
+        deleted = get_deletions(league_id, 'tickets', since)
+        
+        return jsonify({
+            'league_id': league_id,
+            'version': g.league_version,
+            'full': since is None,
+            'tickets': [ticket_json(ticket) for ticket in tickets],
+            'deleted': deleted
+        })
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch ticket changes'}), 500
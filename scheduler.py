@@ -0,0 +1,148 @@
+"""Periodic background tasks, kept out of the request path.
+
+A ticket past its closes_at is closed by TicketScheduler, which finds due
+tickets through the (status, closes_at) index, closes them in bulk and
+publishes the status changes to the league streams. LedgerCompactor folds
+each league's new balance ledger entries into member snapshots.
+
+Every worker process runs a thread per task, started on its first request,
+but only the holder of the task's lease document in the `leases` collection
+does any work, so each run happens once however many workers there are. If
+the leader dies its lease runs out and another worker takes over.
+`flask run-scheduler` runs the same loops in a dedicated process instead.
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from background import ProcessThreads, worker_id
+from database import get_db
+from events import publish_ticket_status
+from models import ledger
+from models.ticket import Ticket
+
+logger = logging.getLogger(__name__)
+
+LEASES = 'leases'
+
+
+class Lease:
+    """A named lease held by at most one process at a time"""
+
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.seconds = seconds
+        self.holder = worker_id()
+
+    def acquire(self) -> bool:
+        """Take the lease, or renew it if already held; False if another process holds it"""
+        now = datetime.utcnow()
+        try:
+            get_db().get_collection(LEASES).update_one(
+                {'_id': self.name, '$or': [{'holder': self.holder}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'holder': self.holder, 'expires_at': now + timedelta(seconds=self.seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False  # Held by someone else, and not expired
+
+    def release(self):
+        """Give the lease up early so another process can take over"""
+        get_db().get_collection(LEASES).delete_one({'_id': self.name, 'holder': self.holder})
+
+
+class PeriodicTask(ABC):
+    """Run work() every interval in whichever process holds the task's lease.
+
+    Subclasses set name (also the lease name) and config_prefix, which
+    names the <prefix>, <prefix>_INTERVAL_SECONDS and <prefix>_LEASE_SECONDS
+    settings.
+    """
+
+    name = None
+    config_prefix = None
+
+    def __init__(self, interval: float, lease_seconds: float):
+        self.enabled = False
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.thread = ProcessThreads(self.run, self.name)
+
+    def init_app(self, app):
+        """Read the task's settings and start the thread on the first request"""
+        self.enabled = app.config.get(self.config_prefix, False)
+        self.interval = app.config.get(f'{self.config_prefix}_INTERVAL_SECONDS', self.interval)
+        self.lease_seconds = app.config.get(f'{self.config_prefix}_LEASE_SECONDS', self.lease_seconds)
+        if self.enabled:
+            app.before_request(self.thread.ensure_running)
+
+    def start(self) -> bool:
+        """Start the task thread if the task is enabled; returns whether it is running"""
+        if self.enabled:
+            self.thread.ensure_running()
+        return self.enabled
+
+    def run(self):
+        """Do the work every interval while holding the lease; never returns"""
+        lease = Lease(self.name, self.lease_seconds)
+        try:
+            while True:
+                try:
+                    if lease.acquire():
+                        self.work()
+                except Exception as e:
+                    logger.error(f"{self.name} run failed, retrying: {e}")
+                time.sleep(self.interval)
+        finally:
+            lease.release()
+
+    @abstractmethod
+    def work(self):
+        """One run of the task"""
+
+
+class TicketScheduler(PeriodicTask):
+    """Close tickets once their closes_at has passed"""
+
+    name = 'ticket-scheduler'
+    config_prefix = 'TICKET_SCHEDULER'
+
+    def work(self):
+        closed = self.close_due_tickets()
+        if closed:
+            logger.info(f"Closed {closed} due ticket(s)")
+
+    def close_due_tickets(self) -> int:
+        """Close every due ticket a batch at a time and publish each change"""
+        total = 0
+        while True:
+            closed = Ticket.close_due_tickets()
+            for ticket in closed:
+                publish_ticket_status(ticket)
+            total += len(closed)
+            if len(closed) < Ticket.CLOSE_BATCH_SIZE:
+                return total
+
+
+class LedgerCompactor(PeriodicTask):
+    """Fold new balance ledger entries into member snapshots"""
+
+    name = 'ledger-compactor'
+    config_prefix = 'LEDGER_COMPACTION'
+
+    def work(self):
+        written = self.compact()
+        if written:
+            logger.info(f"Wrote {written} ledger snapshot(s)")
+
+    def compact(self) -> int:
+        """Compact every league's ledger"""
+        league_ids = get_db().get_collection('leagues').distinct('_id')
+        return sum(ledger.compact(league_id) for league_id in league_ids)
+
+
+# Global scheduler instances
+ticket_scheduler = TicketScheduler(interval=30, lease_seconds=90)
+ledger_compactor = LedgerCompactor(interval=300, lease_seconds=900)
@@ -0,0 +1,441 @@
+"""Declarative MongoDB index spec, schema migrations and query shapes.
+
+Indexes are built out of band by `flask migrate`, which applies MIGRATIONS in
+order and records the applied version in the meta collection; app startup
+only reads that version. Every query issued from models/ and routes/ is
+listed in QUERY_SHAPES; `flask check-query-plans` and tests/test_query_plans.py
+explain each one and fail if MongoDB would answer it with a collection scan or
+an in-memory sort.
+"""
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Sample values for explain(); plans do not depend on the actual ids
+_ID = ObjectId('000000000000000000000000')
+_WHEN = datetime(2000, 1, 1)
+
+# Newest first on (field, _id), as used by keyset pagination
+_PLACED = [('placed_at', DESCENDING), ('_id', DESCENDING)]
+_CREATED = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+
+def _sync_indexes(*keys):
+    """Indexes for delta sync reads: by version, and the few in-flight documents"""
+    keys = [(key, ASCENDING) for key in keys]
+    return [
+        IndexModel(keys + [('version', ASCENDING)]),
+        IndexModel(keys + [('sync_token', ASCENDING)],
+                   partialFilterExpression={'sync_token': {'$exists': True}}),
+    ]
+
+
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], unique=True),
+        IndexModel([('username', ASCENDING)], unique=True),
+    ],
+    'leagues': [
+        IndexModel([('invite_code', ASCENDING)], unique=True, sparse=True),
+    ],
+    'memberships': [
+        # One entry per user per league; also serves every single-member read
+        IndexModel([('league_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
+        IndexModel([('league_id', ASCENDING), ('balance', DESCENDING)]),
+        IndexModel([('user_id', ASCENDING), ('league_id', ASCENDING)]),
+        *_sync_indexes('league_id'),
+    ],
+    'tickets': [
+        IndexModel([('league_id', ASCENDING)] + _CREATED),
+        IndexModel([('league_id', ASCENDING), ('status', ASCENDING)] + _CREATED),
+        # Due tickets for the auto-close scheduler
+        IndexModel([('status', ASCENDING), ('closes_at', ASCENDING)]),
+        # Resolved tickets whose resolution job has not been queued yet
+        IndexModel([('pending_job', ASCENDING)], partialFilterExpression={'pending_job': True}),
+        *_sync_indexes('league_id'),
+    ],
+    'bets': [
+        # One bet per user per ticket; also serves get_user_ticket_bet
+        IndexModel([('user_id', ASCENDING), ('ticket_id', ASCENDING)], unique=True),
+        IndexModel([('user_id', ASCENDING)] + _PLACED),
+        IndexModel([('user_id', ASCENDING), ('league_id', ASCENDING)] + _PLACED),
+        IndexModel([('ticket_id', ASCENDING)] + _PLACED),
+        # A ticket's bets in the order resolution jobs settle them
+        IndexModel([('ticket_id', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('league_id', ASCENDING)] + _PLACED),
+        *_sync_indexes('league_id'),
+    ],
+    'tombstones': _sync_indexes('league_id', 'kind'),
+    'ledger': [
+        # One entry per balance-changing event
+        IndexModel([('ref', ASCENDING)], unique=True),
+        # Entries in insertion (_id) order, as snapshots cover them
+        IndexModel([('league_id', ASCENDING), ('user_id', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('league_id', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    'ledger_snapshots': [
+        IndexModel([('league_id', ASCENDING), ('user_id', ASCENDING), ('as_of', DESCENDING)],
+                   unique=True),
+    ],
+    'jobs': [
+        # At most one resolution job per ticket
+        IndexModel([('ticket_id', ASCENDING)], unique=True),
+        IndexModel([('status', ASCENDING), ('lease_expires_at', ASCENDING)]),
+    ],
+    'events': [
+        # Live update events only matter to streams that are open right now
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=3600),
+    ],
+}
+
+
+# Indexes created by earlier releases that the compound indexes above supersede
+LEGACY_INDEXES = {
+    'leagues': ['creator_id_1', 'members.user_id_1'],
+    'tickets': ['league_id_1', 'status_1', 'created_by_1', 'league_id_1_status_1'],
+    'bets': ['user_id_1', 'league_id_1', 'ticket_id_1', 'status_1', 'user_id_1_league_id_1'],
+    'ledger': ['league_id_1_user_id_1_created_at_1', 'league_id_1_created_at_1'],
+}
+
+# Single document in META_COLLECTION holding the applied schema version
+META_COLLECTION = 'meta'
+SCHEMA_DOC_ID = 'schema'
+
+
+def create_indexes(db):
+    """Create every index in INDEXES (a no-op for indexes that already exist)"""
+    for collection, indexes in INDEXES.items():
+        db[collection].create_indexes(indexes)
+
+
+def set_aside_duplicate_bets(db) -> int:
+    """Move all but the first of each user's bets on a ticket to duplicate_bets.
+
+    Bets placed twice by the old read-then-insert race would make building
+    the unique (user_id, ticket_id) index fail. Pending duplicates have their
+    stake refunded; settled ones are already reflected in the balance and are
+    kept in duplicate_bets for the record. Returns the number set aside.
+    """
+    groups = db.bets.aggregate([
+        {'$sort': {'placed_at': ASCENDING, '_id': ASCENDING}},
+        {'$group': {'_id': {'user_id': '$user_id', 'ticket_id': '$ticket_id'},
+                    'bet_ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}}
+    ], allowDiskUse=True)
+
+    moved = 0
+    for group in groups:
+        for bet in db.bets.find({'_id': {'$in': group['bet_ids'][1:]}}):
+            db.duplicate_bets.replace_one({'_id': bet['_id']}, bet, upsert=True)
+            if bet.get('status') == 'pending':
+                _refund_duplicate(db, bet)
+            db.bets.delete_one({'_id': bet['_id']})
+            moved += 1
+    if moved:
+        logger.warning(f"Set aside {moved} duplicate bet(s) in duplicate_bets")
+    return moved
+
+
+def _refund_duplicate(db, bet):
+    """Refund a duplicate bet's stake, in whichever member layout the league has"""
+    result = db.leagues.update_one(
+        {'_id': bet['league_id'], 'members.user_id': bet['user_id']},
+        {'$inc': {'members.$.balance': bet['amount']}})
+    if not result.matched_count:
+        db.memberships.update_one(
+            {'league_id': bet['league_id'], 'user_id': bet['user_id']},
+            {'$inc': {'balance': bet['amount']}})
+
+
+def create_first_indexes(db):
+    """Set aside duplicate bets, then create every index in INDEXES"""
+    set_aside_duplicate_bets(db)
+    create_indexes(db)
+
+
+def drop_legacy_indexes(db):
+    """Drop the indexes listed in LEGACY_INDEXES where present"""
+    for collection, names in LEGACY_INDEXES.items():
+        for name in names:
+            try:
+                db[collection].drop_index(name)
+            except OperationFailure:
+                pass  # Never created, or already dropped
+
+
+# Members copied per bulk write when moving a league's embedded array
+MOVE_MEMBERS_BATCH = 1000
+
+
+def _move_league_members(db, league):
+    """Copy one league's embedded members into memberships, then drop the array.
+
+    The array is only removed if it is unchanged since it was read, so a
+    write still in flight from the previous release when it was stopped is
+    never lost: the league is read and copied again instead.
+    """
+    while league is not None:
+        members = league['members']
+        for start in range(0, len(members), MOVE_MEMBERS_BATCH):
+            db.memberships.bulk_write([
+                UpdateOne({'league_id': league['_id'], 'user_id': member['user_id']},
+                          {'$set': member}, upsert=True)
+                for member in members[start:start + MOVE_MEMBERS_BATCH]
+            ], ordered=False)
+
+        result = db.leagues.update_one(
+            {'_id': league['_id'], 'members': members},
+            {'$unset': {'members': ''}, '$set': {'member_count': len(members)}})
+        if result.modified_count:
+            return
+
+        league = db.leagues.find_one(
+            {'_id': league['_id'], 'members': {'$exists': True}}, {'members': 1})
+        if league is not None:
+            # Members removed from the array since the last copy
+            db.memberships.delete_many({
+                'league_id': league['_id'],
+                'user_id': {'$nin': [member['user_id'] for member in league['members']]}
+            })
+
+
+def move_league_members(db):
+    """Move every league's embedded members array into the memberships collection.
+
+    The previous release must be stopped first: its league.save() writes the
+    whole members array back onto a league that has already moved, and this
+    release never reads that array. Works one league at a time and can be
+    interrupted and re-run: leagues already moved have no array left.
+    """
+    create_indexes(db)
+    for league in db.leagues.find({'members': {'$exists': True}}, {'_id': 1}):
+        _move_league_members(db, db.leagues.find_one(
+            {'_id': league['_id'], 'members': {'$exists': True}}, {'members': 1}))
+
+    recreated = db.leagues.count_documents({'members': {'$exists': True}})
+    if recreated:
+        raise RuntimeError(
+            f'{recreated} league(s) got a members array back during the move, so a server '
+            f'running the previous release is still writing. Stop it, then run `flask migrate` again.')
+    drop_legacy_indexes(db)
+
+
+def open_ledger(db):
+    """Record every member's current balance as the opening entry of their ledger.
+
+    Run before workers that write ledger entries start, so no balance change
+    is counted twice. Opening entries have a fixed ref per member, so this
+    can be interrupted and re-run.
+    """
+    create_indexes(db)
+    now = datetime.utcnow()
+    batch = []
+    for member in db.memberships.find({}, {'_id': 0, 'league_id': 1, 'user_id': 1, 'balance': 1}):
+        batch.append(UpdateOne(
+            {'ref': f'open:{member["league_id"]}:{member["user_id"]}'},
+            {'$setOnInsert': {'league_id': member['league_id'], 'user_id': member['user_id'],
+                              'amount': member['balance'], 'kind': 'open', 'created_at': now}},
+            upsert=True))
+        if len(batch) == MOVE_MEMBERS_BATCH:
+            db.ledger.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        db.ledger.bulk_write(batch, ordered=False)
+
+
+def rebase_ledger_snapshots(db):
+    """Index ledger entries by _id and drop the snapshots taken by created_at.
+
+    Snapshots now cover the entries appended before their as_of, not those
+    created before it. They are only a cache of the ledger, so the compactor
+    simply takes them again from the first entry.
+    """
+    create_indexes(db)
+    drop_legacy_indexes(db)
+    db.ledger_snapshots.delete_many({})
+    db.leagues.update_many({'ledger_compacted_at': {'$exists': True}},
+                           {'$unset': {'ledger_compacted_at': ''}})
+
+
+# (version, description, apply(db)) in order; append to change the schema
+MIGRATIONS = [
+    (1, 'Create indexes from schema.INDEXES', create_first_indexes),
+    (2, 'Drop indexes superseded by compound indexes', drop_legacy_indexes),
+    (3, 'Add TTL index on live update events', create_indexes),
+    (4, 'Add delta sync indexes on tickets, bets and tombstones', create_indexes),
+    (5, 'Move league members into the memberships collection', move_league_members),
+    (6, 'Add (status, closes_at) index for the ticket scheduler', create_indexes),
+    (7, 'Add indexes for ticket resolution jobs', create_indexes),
+    (8, 'Open the balance ledger with every member\'s current balance', open_ledger),
+    (9, 'Add index on resolved tickets waiting for a resolution job', create_indexes),
+    (10, 'Compact the balance ledger in insertion order', rebase_ledger_snapshots),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(db) -> int:
+    """Read the applied schema version (0 for a fresh database)"""
+    meta = db[META_COLLECTION].find_one({'_id': SCHEMA_DOC_ID}, {'version': 1})
+    return meta['version'] if meta else 0
+
+
+def migrate(db, target: int = SCHEMA_VERSION):
+    """Apply pending migrations up to target and return the versions applied"""
+    current = get_schema_version(db)
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if current < version <= target:
+            logger.info(f"Applying schema migration {version}: {description}")
+            apply(db)
+            db[META_COLLECTION].update_one({'_id': SCHEMA_DOC_ID}, {
+                '$set': {'version': version},
+                '$push': {'history': {
+                    'version': version,
+                    'description': description,
+                    'applied_at': datetime.utcnow()
+                }}
+            }, upsert=True)
+            applied.append(version)
+    return applied
+
+
+def _after(sort_field):
+    """Filter for the second page of a keyset-paginated query"""
+    return {sort_field: {'$lte': _WHEN},
+            '$or': [{sort_field: {'$lt': _WHEN}}, {'_id': {'$lt': _ID}}]}
+
+
+def _changed(**query):
+    """Filter for a delta sync read (see models.sync.changed_query)"""
+    return dict(query, **{'$or': [{'version': {'$gt': 1}}, {'sync_token': {'$exists': True}}]})
+
+
+_SORT_PLACED = dict(_PLACED)
+_SORT_CREATED = dict(_CREATED)
+_SORT_BALANCE = {'balance': DESCENDING}
+_SORT_ID = {'_id': ASCENDING}
+_SORT_LEASE = {'lease_expires_at': ASCENDING}
+
+# name -> (collection, explain command body without the collection name)
+QUERY_SHAPES = {
+    # Users
+    'user by id': ('users', {'find': {'_id': _ID}}),
+    'user by email': ('users', {'find': {'email': 'user@example.com'}}),
+    'user by username': ('users', {'find': {'username': 'user'}}),
+
+    # Leagues
+    'league by id': ('leagues', {'find': {'_id': _ID}}),
+    'league by invite code': ('leagues', {'find': {'invite_code': 'ABCDEFGH'}}),
+    'leagues by ids': ('leagues', {'find': {'_id': {'$in': [_ID]}}}),
+
+    # Memberships
+    'league member': ('memberships', {'find': {'league_id': _ID, 'user_id': _ID}}),
+    'league members': ('memberships', {'find': {'league_id': _ID}}),
+    'user memberships': ('memberships', {'find': {'user_id': _ID}}),
+    'member leagues': ('memberships', {'find': {'user_id': _ID, 'league_id': {'$in': [_ID]}}}),
+    'member debit': ('memberships', {'find': {
+        'league_id': _ID, 'user_id': _ID, 'balance': {'$gte': 1}}}),
+    'leaderboard': ('memberships', {'find': {'league_id': _ID}, 'sort': _SORT_BALANCE}),
+    'settle members': ('memberships', {'find': {
+        'league_id': _ID, 'user_id': {'$in': [_ID]}, 'settled_tickets': {'$ne': _ID}}}),
+    'member usernames': ('memberships', {'find': {'league_id': _ID, 'user_id': {'$in': [_ID]}}}),
+    'settled members': ('memberships', {'find': {
+        'league_id': _ID, 'user_id': {'$in': [_ID]}, 'settled_tickets': _ID}}),
+    'member changes': ('memberships', {'find': _changed(league_id=_ID)}),
+    'stamp members': ('memberships', {'find': {'league_id': _ID, 'sync_token': _ID}}),
+    'batch debited members': ('memberships', {'find': {
+        'league_id': _ID, 'user_id': {'$in': [_ID]}, 'debit_batches': _ID}}),
+
+    # Tickets
+    'ticket by id': ('tickets', {'find': {'_id': _ID}}),
+    'league tickets': ('tickets', {'find': {'league_id': _ID}, 'sort': _SORT_CREATED}),
+    'league tickets, next page': ('tickets', {
+        'find': {'league_id': _ID, **_after('created_at')}, 'sort': _SORT_CREATED}),
+    'league tickets by status': ('tickets', {
+        'find': {'league_id': _ID, 'status': 'open'}, 'sort': _SORT_CREATED}),
+    'ticket changes': ('tickets', {'find': _changed(league_id=_ID)}),
+    'stamp ticket': ('tickets', {'find': {'_id': _ID, 'sync_token': _ID}}),
+    'due tickets': ('tickets', {'find': {'status': 'open', 'closes_at': {'$lt': _WHEN}}}),
+    'closed due tickets': ('tickets', {'find': {'_id': {'$in': [_ID]}, 'sync_token': _ID}}),
+    'stamp league tickets': ('tickets', {'find': {'league_id': _ID, 'sync_token': _ID}}),
+    'tickets pending a job': ('tickets', {'find': {'pending_job': True}}),
+
+    # Bets
+    'bet by id': ('bets', {'find': {'_id': _ID}}),
+    'user bet on ticket': ('bets', {'find': {'user_id': _ID, 'ticket_id': _ID}}),
+    'user bets on tickets': ('bets', {'find': {'user_id': _ID, 'ticket_id': {'$in': [_ID]}}}),
+    'cancel pending bet': ('bets', {'find': {'_id': _ID, 'user_id': _ID, 'status': 'pending'}}),
+    'user bets': ('bets', {'find': {'user_id': _ID}, 'sort': _SORT_PLACED}),
+    'user bets, next page': ('bets', {
+        'find': {'user_id': _ID, **_after('placed_at')}, 'sort': _SORT_PLACED}),
+    'user league bets': ('bets', {
+        'find': {'user_id': _ID, 'league_id': _ID}, 'sort': _SORT_PLACED}),
+    'ticket bets': ('bets', {'find': {'ticket_id': _ID}, 'sort': _SORT_PLACED}),
+    'league bets': ('bets', {'find': {'league_id': _ID}, 'sort': _SORT_PLACED}),
+    'league bets by status': ('bets', {
+        'find': {'league_id': _ID, 'status': 'won'}, 'sort': _SORT_PLACED}),
+    'user stats': ('bets', {'aggregate': [
+        {'$match': {'user_id': _ID, 'league_id': _ID}},
+        {'$group': {'_id': None, 'count': {'$sum': 1}}}]}),
+    'bet changes': ('bets', {'find': _changed(league_id=_ID)}),
+    'stamp ticket bets': ('bets', {'find': {'ticket_id': _ID, 'sync_token': _ID}}),
+    'stamp league bets': ('bets', {'find': {'league_id': _ID, 'sync_token': _ID}}),
+    'ticket bets chunk': ('bets', {
+        'find': {'ticket_id': _ID, '_id': {'$gt': _ID}}, 'sort': _SORT_ID}),
+    'settle bets chunk': ('bets', {'find': {'_id': {'$in': [_ID]}, 'status': 'pending'}}),
+    'league member stats': ('bets', {'aggregate': [
+        {'$match': {'league_id': _ID}},
+        {'$group': {'_id': '$user_id', 'count': {'$sum': 1}}}]}),
+
+    # Ledger
+    'ledger entries since': ('ledger', {'find': {
+        'league_id': _ID, 'user_id': {'$in': [_ID]}, '_id': {'$gte': _ID}, 'created_at': {'$lt': _WHEN}}}),
+    'league ledger window': ('ledger', {'find': {
+        'league_id': _ID, '_id': {'$gte': _ID, '$lt': _ID}}}),
+    'latest ledger snapshots': ('ledger_snapshots', {'aggregate': [
+        {'$match': {'league_id': _ID, 'user_id': {'$in': [_ID]}, 'as_of': {'$lte': _WHEN}}},
+        {'$sort': {'league_id': 1, 'user_id': 1, 'as_of': -1}},
+        {'$group': {'_id': '$user_id', 'balance': {'$first': '$balance'}}}]}),
+
+    # Resolution jobs
+    'ticket resolution job': ('jobs', {'find': {'ticket_id': _ID}}),
+    'claim resolution job': ('jobs', {'find': {
+        'status': {'$in': ['queued', 'running']}, 'lease_expires_at': {'$lte': _WHEN}},
+        'sort': _SORT_LEASE}),
+    'checkpoint resolution job': ('jobs', {'find': {'_id': _ID, 'worker': 'host', 'checkpoint': _ID}}),
+
+    # Tombstones
+    'deletions': ('tombstones', {'find': _changed(league_id=_ID, kind='bets')}),
+    'stamp tombstones': ('tombstones', {'find': {'league_id': _ID, 'sync_token': _ID}}),
+}
+
+# Plan stages that mean a shape is not served by an index
+BAD_STAGES = {'COLLSCAN', 'SORT'}
+
+
+def explain_command(collection, shape):
+    """Build the body of an explain command for one query shape"""
+    if 'aggregate' in shape:
+        return {'aggregate': collection, 'pipeline': shape['aggregate'], 'cursor': {}}
+    command = {'find': collection, 'filter': shape['find']}
+    if 'sort' in shape:
+        command['sort'] = shape['sort']
+    return command
+
+
+def plan_stages(explain):
+    """Yield every stage name in the winning plan(s) of an explain result"""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == 'stage' and isinstance(value, str):
+                yield value
+            elif key not in ('rejectedPlans', 'command'):
+                yield from plan_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from plan_stages(item)
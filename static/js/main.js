@@ -363,44 +363,60 @@ document.addEventListener('DOMContentLoaded', () => {
   // Initialize real-time updates (if on league pages)
   if (window.location.pathname.includes('/leagues/')) {
     initializeRealTimeUpdates();
+    loadUserPicks();
   }
 });
 
-// Real-time updates for league pages
-function initializeRealTimeUpdates() {
-  // This would typically connect to WebSockets or use polling
-  // For now, we'll set up a basic polling mechanism
-  const leagueId = window.location.pathname.split('/').pop();
-  
-  if (leagueId && !isNaN(leagueId)) {
-    setInterval(async () => {
-      try {
-        // Poll for updates every 30 seconds
-        const response = await API.request(`/leagues/${leagueId}/updates`);
-        updateLeagueData(response);
-      } catch (error) {
-        console.log('Failed to fetch updates:', error);
-      }
-    }, 30000);
+// Show "your pick" badges on ticket lists, fetched in one request
+async function loadUserPicks() {
+  const slots = document.querySelectorAll('[data-ticket-id] .user-pick');
+  if (!slots.length) return;
+
+  const ticketIds = Array.from(slots, slot => slot.closest('[data-ticket-id]').dataset.ticketId);
+  try {
+    const response = await fetch(`/bets/api/user-bets?ticket_ids=${ticketIds.join(',')}`);
+    if (!response.ok) return;
+    const { bets } = await response.json();
+
+    const badgeClasses = { won: 'badge-status-won', lost: 'badge-status-lost' };
+    slots.forEach(slot => {
+      const bet = bets[slot.closest('[data-ticket-id]').dataset.ticketId];
+      if (!bet) return;
+      slot.innerHTML = `
+        <span class="badge ${badgeClasses[bet.status] || 'badge-status-open'}">
+          Your pick: ${escapeHtml(bet.selected_option)} • ${Utils.formatCurrency(bet.amount)}
+        </span>`;
+    });
+  } catch (error) {
+    console.error('Failed to load your picks:', error);
   }
 }
 
-// Update league data with real-time information
-function updateLeagueData(data) {
-  // Update leaderboard
-  if (data.leaderboard) {
-    updateLeaderboard(data.leaderboard);
-  }
-  
-  // Update ticket statuses
-  if (data.tickets) {
-    updateTicketStatuses(data.tickets);
-  }
-  
-  // Update user balance
-  if (data.userBalance) {
-    updateUserBalance(data.userBalance);
-  }
+// Live updates for league pages, streamed from /leagues/<id>/events
+function initializeRealTimeUpdates() {
+  const page = document.querySelector('[data-league-id]');
+  if (!page || !window.EventSource) return;
+
+  const userId = page.dataset.userId;
+  const source = new EventSource(`/leagues/${page.dataset.leagueId}/events`);
+
+  source.addEventListener('balance', (event) => {
+    applyBalanceDeltas(JSON.parse(event.data).deltas, userId);
+  });
+  source.addEventListener('ticket', (event) => {
+    updateTicketStatuses([JSON.parse(event.data)]);
+  });
+  source.addEventListener('leaderboard', (event) => {
+    updateLeaderboard(JSON.parse(event.data).entries);
+  });
+  // EventSource reconnects by itself; the server sends a retry interval
+}
+
+// Escape text for insertion into HTML
+function escapeHtml(text) {
+  const div = document.createElement('div');
+  div.textContent = text;
+  return div.innerHTML;
 }
 
 // Update leaderboard display
@@ -409,13 +425,11 @@ function updateLeaderboard(leaderboard) {
   if (!leaderboardContainer) return;
 
   leaderboardContainer.innerHTML = leaderboard.map((member, index) => `
-    <div class="leaderboard-item">
+    <div class="leaderboard-item" data-user-id="${member.user_id}" data-balance="${member.balance}">
       <div class="rank">${index + 1}</div>
       <div class="user">
-        <div class="avatar" style="background-color: var(--accent-neon);">
-          ${member.username[0].toUpperCase()}
-        </div>
-        <div class="name">${member.username}</div>
+        <div class="avatar">${escapeHtml(member.username[0].toUpperCase())}</div>
+        <div class="name">${escapeHtml(member.username)}</div>
       </div>
       <div class="balance">${Utils.formatCurrency(member.balance)}</div>
     </div>
@@ -424,23 +438,54 @@ function updateLeaderboard(leaderboard) {
 
 // Update ticket statuses
 function updateTicketStatuses(tickets) {
+  const badgeClasses = { open: 'badge-status-open', closed: 'badge-status-closed', resolved: 'badge-status-live' };
+
   tickets.forEach(ticket => {
     const ticketElement = document.querySelector(`[data-ticket-id="${ticket.id}"]`);
     if (ticketElement) {
       const statusBadge = ticketElement.querySelector('.status-badge');
       if (statusBadge) {
-        statusBadge.className = `badge badge-status-${ticket.status.toLowerCase()}`;
+        statusBadge.className = `status-badge badge ${badgeClasses[ticket.status] || 'badge-status-live'}`;
         statusBadge.textContent = ticket.status.toUpperCase();
       }
     }
   });
 }
 
-// Update user balance
-function updateUserBalance(balance) {
+// Apply balance changes ({user_id: delta}) to the user's balance and the leaderboard
+function applyBalanceDeltas(deltas, userId) {
+  if (userId in deltas) {
+    updateUserBalance(deltas[userId]);
+  }
+
+  const leaderboardContainer = document.querySelector('.leaderboard-list');
+  if (!leaderboardContainer) return;
+
+  const items = Array.from(leaderboardContainer.querySelectorAll('.leaderboard-item'));
+  const parseBalance = (item) => parseFloat(
+    item.dataset.balance || item.querySelector('.balance').textContent.replace(/[$,]/g, ''));
+
+  items.forEach(item => {
+    if (item.dataset.userId in deltas) {
+      const balance = parseBalance(item) + deltas[item.dataset.userId];
+      item.dataset.balance = balance;
+      item.querySelector('.balance').textContent = Utils.formatCurrency(balance);
+    }
+  });
+
+  // Keep the list ordered by balance
+  items.sort((a, b) => parseBalance(b) - parseBalance(a)).forEach((item, index) => {
+    item.querySelector('.rank').textContent = index + 1;
+    leaderboardContainer.appendChild(item);
+  });
+}
+
+// Update user balance by delta
+function updateUserBalance(delta) {
   const balanceElements = document.querySelectorAll('.user-balance');
   balanceElements.forEach(element => {
-    Utils.animateCounter(element, parseFloat(element.textContent.replace(/[$,]/g, '')), balance);
+    const current = parseFloat(element.textContent.replace(/[$,]/g, ''));
+    Utils.animateCounter(element, current, current + delta);
   });
 }
 
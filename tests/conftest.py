@@ -0,0 +1,100 @@
+"""Test fixtures: the real application on an in-memory MongoDB (mongomock).
+
+Run from the repository root with `python -m pytest`.
+"""
+import functools
+import threading
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+import database
+from database import db
+from models.stats import STATS_COUNTERS
+from models.user import User
+from schema import migrate
+
+# A server applies each write to a document atomically; mongomock matches
+# and modifies in separate steps, so concurrent tests serialize its writes
+_WRITE_LOCK = threading.RLock()
+_WRITE_METHODS = ('insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+                  'delete_one', 'delete_many', 'find_one_and_update', 'find_one_and_delete',
+                  'bulk_write')
+
+
+def _serialized(method):
+    @functools.wraps(method)
+    def write(*args, **kwargs):
+        with _WRITE_LOCK:
+            return method(*args, **kwargs)
+    return write
+
+
+for _name in _WRITE_METHODS:
+    setattr(mongomock.collection.Collection, _name,
+            _serialized(getattr(mongomock.collection.Collection, _name)))
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The application on a fresh, migrated in-memory database"""
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(database, 'MongoClient', lambda *args, **kwargs: client)
+    from app import create_app
+
+    app = create_app('testing')
+    app.config.update(WTF_CSRF_ENABLED=False)
+    # Tests run outside any context, so each test-client request gets its
+    # own flask.g (logged-in user, identity map) as it would in production
+    with app.app_context():
+        migrate(db.db)
+    yield app
+    db.close_connection()
+
+
+@pytest.fixture
+def league(app):
+    """Insert a league with three members holding 100.0 each; returns (league_id, user_ids)"""
+    user_ids = [ObjectId() for _ in range(3)]
+    league_id = db.get_collection('leagues').insert_one({
+        'name': 'Test League', 'description': 'tests', 'creator_id': user_ids[0],
+        'admins': user_ids[:1], 'member_count': len(user_ids), 'starting_balance': 100.0,
+        'status': 'active', 'invite_code': 'TESTCODE', 'version': 0
+    }).inserted_id
+    db.get_collection('memberships').insert_many([
+        dict({'league_id': league_id, 'user_id': user_id, 'username': f'user{i}', 'balance': 100.0},
+             **dict.fromkeys(STATS_COUNTERS, 0))
+        for i, user_id in enumerate(user_ids)
+    ])
+    return league_id, user_ids
+
+
+@pytest.fixture
+def ticket(league):
+    """Insert an open moneyline ticket in the league; returns its id"""
+    league_id, user_ids = league
+    return db.get_collection('tickets').insert_one({
+        'league_id': league_id, 'title': 'Home vs Away', 'description': '', 'type': 'moneyline',
+        'options': [{'option_text': 'Home', 'odds': 2.0}, {'option_text': 'Away', 'odds': 2.0}],
+        'status': 'open', 'resolution': None, 'created_by': user_ids[0], 'closes_at': None
+    }).inserted_id
+
+
+@pytest.fixture
+def client(app, league):
+    """A test client logged in as a member of the league"""
+    league_id, _ = league
+    user = User.create('member', 'member@example.com', 'password123')
+    db.get_collection('memberships').insert_one(dict(
+        {'league_id': league_id, 'user_id': user._id, 'username': user.username, 'balance': 100.0},
+        **dict.fromkeys(STATS_COUNTERS, 0)))
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'member@example.com', 'password': 'password123'})
+    return client
+
+
+def balances(league_id):
+    """Each member's balance, by user id"""
+    return {member['user_id']: member['balance']
+            for member in db.get_collection('memberships').find({'league_id': league_id})}
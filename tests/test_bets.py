@@ -0,0 +1,130 @@
+import threading
+
+from bson import ObjectId
+
+from conftest import balances
+from database import db
+from models.bet import Bet
+
+
+def run_concurrently(target, count):
+    """Call target(i) from count threads released at the same moment"""
+    start_line = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        start_line.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def league_version(league_id):
+    return db.get_collection('leagues').find_one({'_id': league_id})['version']
+
+
+def test_concurrent_bets_never_overdraw(app, league):
+    league_id, user_ids = league
+    user_id = user_ids[1]
+    tickets = [db.get_collection('tickets').insert_one({'league_id': league_id}).inserted_id
+               for _ in range(10)]
+
+    # Ten 30.0 stakes against a 100.0 balance: only three can be covered
+    placed = run_concurrently(
+        lambda i: Bet.place(user_id, league_id, tickets[i], 30.0, 'Home', 2.0), len(tickets))
+
+    assert sum(bet is not None for bet in placed) == 3
+    assert balances(league_id)[user_id] == 10.0
+    assert db.get_collection('bets').count_documents({'user_id': user_id}) == 3
+
+
+def test_second_bet_on_a_ticket_is_refunded(app, league, ticket):
+    league_id, user_ids = league
+
+    assert Bet.place(user_ids[1], league_id, ticket, 10.0, 'Home', 2.0)
+    version = league_version(league_id)
+    assert Bet.place(user_ids[1], league_id, ticket, 10.0, 'Away', 2.0) is None
+
+    member = db.get_collection('memberships').find_one({'user_id': user_ids[1]})
+    assert member['balance'] == 90.0
+    assert member['total_bets'] == 1
+    assert db.get_collection('ledger').count_documents({'user_id': user_ids[1]}) == 1
+    # The debit and its refund share one version bump
+    assert league_version(league_id) == version + 1
+    assert 'sync_token' not in member
+
+
+def test_bet_by_non_member_is_rejected(app, league, ticket):
+    league_id, _ = league
+
+    assert Bet.place(ObjectId(), league_id, ticket, 10.0, 'Home', 2.0) is None
+    assert db.get_collection('bets').count_documents({}) == 0
+
+
+def test_concurrent_batches_never_overdraw(app, league):
+    league_id, user_ids = league
+    user_id = user_ids[1]
+    tickets = [db.get_collection('tickets').insert_one({'league_id': league_id}).inserted_id
+               for _ in range(6)]
+
+    # Three batches of two 30.0 stakes each race for the same 100.0; a batch
+    # is debited as one, so two or three bets fit depending on the order
+    def batch(i):
+        return Bet.place_many(league_id, [
+            {'user_id': user_id, 'ticket_id': ticket_id, 'amount': 30.0,
+             'selected_option': 'Home', 'odds': 2.0}
+            for ticket_id in tickets[2 * i:2 * i + 2]
+        ])
+    results = [bet for bets in run_concurrently(batch, 3) for bet in bets]
+
+    placed = sum(bet is not None for bet in results)
+    assert placed in (2, 3)
+    assert balances(league_id)[user_id] == 100.0 - 30.0 * placed
+    assert db.get_collection('bets').count_documents({'user_id': user_id}) == placed
+    # Every batch cleared its debit marker
+    assert not db.get_collection('memberships').find_one({'debit_batches.0': {'$exists': True}})
+
+
+def test_batcher_places_each_bet_once(app, league, ticket):
+    from group_commit import BetBatcher
+
+    league_id, user_ids = league
+    batcher = BetBatcher()
+    batcher.enabled = True
+    batcher.window = 0.05
+
+    placed = run_concurrently(
+        lambda i: batcher.place(user_ids[i], league_id, ticket, 10.0, 'Home', 2.0), len(user_ids))
+
+    assert all(placed)
+    assert set(balances(league_id).values()) == {90.0}
+    assert db.get_collection('bets').count_documents({'ticket_id': ticket}) == len(user_ids)
+
+
+def test_failed_batch_refunds_every_stake(app, league, ticket, monkeypatch):
+    from pymongo.errors import AutoReconnect
+    import mongomock
+
+    league_id, user_ids = league
+    insert_many = mongomock.collection.Collection.insert_many
+
+    def lose_connection(collection, *args, **kwargs):
+        result = insert_many(collection, *args, **kwargs)
+        if collection.name == 'bets':
+            raise AutoReconnect('connection lost')
+        return result
+    monkeypatch.setattr(mongomock.collection.Collection, 'insert_many', lose_connection)
+
+    results = Bet.place_many(league_id, [
+        {'user_id': user_id, 'ticket_id': ticket, 'amount': 10.0, 'selected_option': 'Home', 'odds': 2.0}
+        for user_id in user_ids
+    ])
+
+    assert results == [None] * len(user_ids)
+    assert set(balances(league_id).values()) == {100.0}
+    assert db.get_collection('bets').count_documents({}) == 0
@@ -0,0 +1,59 @@
+from database import db
+from models import user as user_module
+from models.cache import TTLCache
+from models.user import User
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set('a', 1)
+
+    clock.now = 60
+    assert cache.get('a') == 1
+    clock.now = 60.5
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60, clock=Clock())
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+def test_zero_size_or_ttl_disables_the_cache():
+    for maxsize, ttl in ((0, 60), (10, 0)):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl, clock=Clock())
+        cache.set('a', 1)
+        assert cache.get('a') is None
+
+
+def test_session_user_is_cached_until_saved(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_module, '_session_cache', TTLCache(maxsize=10, ttl=60, clock=clock))
+    user = User.create('cached', 'cached@example.com', 'password123')
+    assert User.get_session_user(str(user._id)).username == 'cached'
+
+    # Changed behind the model's back: served from the cache until it expires
+    db.get_collection('users').update_one(
+        {'_id': user._id}, {'$set': {'username': 'elsewhere'}})
+    assert User.get_session_user(str(user._id)).username == 'cached'
+    clock.now = 61
+    assert User.get_session_user(str(user._id)).username == 'elsewhere'
+
+    # Saving through the model drops the cached entry straight away
+    user.username = 'renamed'
+    user.save()
+    assert User.get_session_user(str(user._id)).username == 'renamed'
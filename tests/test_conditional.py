@@ -0,0 +1,31 @@
+from models.bet import Bet
+
+
+def test_unchanged_league_version_gets_304(client, league, ticket):
+    league_id, user_ids = league
+    url = f'/leagues/api/{league_id}/leaderboard'
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    unchanged = client.get(url, headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers['ETag'] == etag
+
+    # Any write to the league bumps its version and so changes the ETag
+    assert Bet.place(user_ids[0], league_id, ticket, 10.0, 'Home', 2.0)
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_etag_differs_per_page(client, league):
+    league_id, _ = league
+    url = f'/tickets/api/{league_id}/tickets'
+    etag = client.get(url).headers['ETag']
+
+    assert client.get(url + '?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_non_member_gets_404(client):
+    assert client.get('/leagues/api/000000000000000000000000/leaderboard').status_code == 404
@@ -0,0 +1,38 @@
+from database import db
+from events import event_bus
+
+
+def stream_events(client, league_id, publish):
+    """Open the league stream, publish events, and return the SSE events received"""
+    response = client.get(f'/leagues/{league_id}/events')
+    assert response.status_code == 200
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')  # The subscription is open
+
+    publish()
+    received = []
+    for chunk in chunks:
+        if chunk.startswith(b':'):
+            break  # Keep-alive: everything published has been delivered
+        received.append(chunk.decode())
+    response.close()
+    return received
+
+
+def test_balance_deltas_only_reach_their_member(app, client, league):
+    league_id, user_ids = league
+    app.config['EVENTS_KEEPALIVE_SECONDS'] = 0.2
+    member_id = str(db.get_collection('users').find_one({'username': 'member'})['_id'])
+
+    def publish():
+        event_bus.publish(league_id, 'balance', {'deltas': {str(user_ids[0]): -10.0}})
+        event_bus.publish(league_id, 'balance', {'deltas': {member_id: -5.0}})
+        event_bus.publish(league_id, 'balance', {'deltas': {str(user_ids[1]): 20.0, member_id: 20.0}})
+        event_bus.publish(league_id, 'ticket', {'status': 'closed'})
+
+    received = stream_events(client, league_id, publish)
+
+    assert len(received) == 3
+    assert str(user_ids[0]) not in ''.join(received)
+    assert str(user_ids[1]) not in ''.join(received)
+    assert received[-1].startswith('event: ticket')
@@ -0,0 +1,50 @@
+from database import db
+from models import identity_map
+from models.ticket import Ticket
+from models.user import User
+
+
+def test_lookups_share_one_instance_per_request(app, league, ticket):
+    with app.test_request_context():
+        first = Ticket.get_by_id(ticket)
+        assert Ticket.get_by_id(str(ticket)) is first
+        cache = identity_map.get_identity_map()
+        assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_writes_invalidate_the_request_map(app, league, ticket):
+    with app.test_request_context():
+        loaded = Ticket.get_by_id(ticket)
+        assert Ticket.get_by_id(ticket).close_atomically()
+
+        reloaded = Ticket.get_by_id(ticket)
+        assert reloaded is not loaded
+        assert reloaded.status == 'closed'
+
+
+def test_alias_lookups_are_invalidated_with_the_document(app):
+    user = User.create('aliased', 'aliased@example.com', 'password123')
+    with app.test_request_context():
+        assert User.get_by_email('aliased@example.com') is User.get_by_id(user._id)
+        user.username = 'renamed'
+        user.save()
+        assert User.get_by_email('aliased@example.com').username == 'renamed'
+
+
+def test_each_request_starts_with_an_empty_map(app, league, ticket):
+    with app.test_request_context():
+        assert Ticket.get_by_id(ticket).status == 'open'
+    db.get_collection('tickets').update_one({'_id': ticket}, {'$set': {'status': 'closed'}})
+
+    with app.test_request_context():
+        assert Ticket.get_by_id(ticket).status == 'closed'
+
+
+def test_clients_do_not_share_the_logged_in_user(app, client, league):
+    league_id, _ = league
+    User.create('outsider', 'outsider@example.com', 'password123')
+    outsider = app.test_client()
+    outsider.post('/auth/login', data={'email': 'outsider@example.com', 'password': 'password123'})
+
+    assert client.get(f'/leagues/api/{league_id}/leaderboard').status_code == 200
+    assert outsider.get(f'/leagues/api/{league_id}/leaderboard').status_code == 404
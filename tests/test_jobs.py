@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from conftest import balances
+from database import db
+from jobs import job_workers
+from models.bet import Bet
+from models.job import ResolutionJob
+from models.ticket import Ticket
+
+
+def resolved_job(league_id, user_ids, ticket):
+    """Every member bets 10.0 on Home, which wins; returns the queued job"""
+    for user_id in user_ids:
+        assert Bet.place(user_id, league_id, ticket, 10.0, 'Home', 2.0)
+    return ResolutionJob.create(ticket, league_id, 'Home')
+
+
+def test_job_resumes_from_checkpoint_after_lost_lease(app, league, ticket):
+    league_id, user_ids = league
+    job = resolved_job(league_id, user_ids, ticket)
+
+    # The first worker settles one bet, then stops renewing its lease
+    first = ResolutionJob.claim('worker-a', lease_seconds=60)
+    assert first.run_chunk('worker-a', chunk_size=1, lease_seconds=60)
+    db.get_collection('jobs').update_one(
+        {'_id': job._id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+    second = ResolutionJob.claim('worker-b', lease_seconds=60)
+    assert second.checkpoint == first.checkpoint
+    assert second.processed == 1
+    # The first worker lost the job: its next chunk is not counted
+    assert first.run_chunk('worker-a', chunk_size=1, lease_seconds=60) is None
+
+    while second.run_chunk('worker-b', chunk_size=1, lease_seconds=60) is not None:
+        pass
+
+    job = ResolutionJob.get_for_ticket(ticket)
+    assert (job.status, job.processed, job.won, job.attempts) == ('done', 3, 3, 2)
+    assert set(balances(league_id).values()) == {110.0}
+    assert db.get_collection('bets').count_documents({'status': 'won'}) == 3
+
+
+def test_rerunning_a_done_job_is_a_no_op(app, league, ticket):
+    league_id, user_ids = league
+    job = job_workers.run_inline(resolved_job(league_id, user_ids, ticket))
+    assert job.status == 'done'
+    settled = balances(league_id)
+
+    assert job.restart()
+    job = job_workers.run_inline(job)
+
+    assert job.status == 'done'
+    assert balances(league_id) == settled
+    assert db.get_collection('ledger').count_documents({'kind': 'payout'}) == len(user_ids)
+
+
+def test_close_never_reopens_a_resolved_ticket(app, league, ticket):
+    resolving, closing = Ticket.get_by_id(ticket), Ticket.get_by_id(ticket)
+    assert resolving.resolve_atomically('Home')
+
+    assert not closing.close_atomically()
+    ticket_data = db.get_collection('tickets').find_one({'_id': ticket})
+    assert (ticket_data['status'], ticket_data['resolution']) == ('resolved', 'Home')
+
+
+def test_missing_job_is_queued_for_a_resolved_ticket(app, league, ticket):
+    league_id, user_ids = league
+    assert Bet.place(user_ids[0], league_id, ticket, 10.0, 'Home', 2.0)
+    # The resolving request died before it could queue the job
+    assert Ticket.get_by_id(ticket).resolve_atomically('Home')
+
+    (job,) = ResolutionJob.queue_missing()
+    assert (job.ticket_id, job.winning_option, job.total) == (ticket, 'Home', 1)
+    assert ResolutionJob.queue_missing() == []
+    assert job_workers.run_inline(job).won == 1
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from conftest import balances
+from database import db
+from jobs import job_workers
+from models import ledger
+from models.bet import Bet
+from models.job import ResolutionJob
+
+
+def open_ledger(league_id, user_ids):
+    """Record the fixture members' starting balances, as migration 8 would have"""
+    ledger.append(ledger.entry(league_id, user_id, 100.0, 'open', f'open:{league_id}:{user_id}')
+                  for user_id in user_ids)
+
+
+def assert_ledger_matches(league_id):
+    assert ledger.find_drift(league_id) == []
+    for user_id, balance in balances(league_id).items():
+        assert ledger.balance_at(league_id, user_id) == balance
+
+
+def test_ledger_fold_matches_balances(app, league, ticket, monkeypatch):
+    league_id, user_ids = league
+    open_ledger(league_id, user_ids)
+
+    assert Bet.place(user_ids[0], league_id, ticket, 10.0, 'Home', 2.0)
+    assert Bet.place(user_ids[1], league_id, ticket, 25.0, 'Away', 2.0)
+    cancelled = Bet.place(user_ids[2], league_id, ticket, 40.0, 'Home', 2.0)
+    assert Bet.cancel(cancelled._id, user_ids[2])
+    assert Bet.place(user_ids[2], league_id, ticket, 30.0, 'Home', 2.0)
+    # A rejected duplicate is refunded without leaving entries behind
+    assert Bet.place(user_ids[0], league_id, ticket, 5.0, 'Away', 2.0) is None
+    assert_ledger_matches(league_id)
+
+    job = job_workers.run_inline(ResolutionJob.create(ticket, league_id, 'Home'))
+    assert job.status == 'done'
+    assert balances(league_id) == {user_ids[0]: 110.0, user_ids[1]: 75.0, user_ids[2]: 130.0}
+    assert_ledger_matches(league_id)
+
+    # Compacting folds every entry into snapshots without changing the result
+    monkeypatch.setattr(ledger, 'SETTLE_SECONDS', 0)
+    assert ledger.compact(league_id, now=datetime.utcnow() + timedelta(seconds=1)) == len(user_ids)
+    assert_ledger_matches(league_id)
+
+
+def test_entry_appended_after_compaction_is_folded_in(app, league, monkeypatch):
+    league_id, user_ids = league
+    # Opened five minutes ago
+    opened = datetime.utcnow() - timedelta(minutes=5)
+    ledger.append(dict(ledger.entry(league_id, user_id, 100.0, 'open', f'open:{league_id}:{user_id}'),
+                       _id=ObjectId(ObjectId.from_datetime(opened).binary[:4] + ObjectId().binary[4:]))
+                  for user_id in user_ids)
+    monkeypatch.setattr(ledger, 'SETTLE_SECONDS', 0)
+    assert ledger.compact(league_id) == len(user_ids)
+
+    # Stamped before that compaction's cutoff, but only appended now
+    late = ledger.entry(league_id, user_ids[0], -10.0, 'stake', 'stake:late')
+    late['created_at'] -= timedelta(minutes=5)
+    db.get_collection('memberships').update_one(
+        {'league_id': league_id, 'user_id': user_ids[0]}, {'$inc': {'balance': -10.0}})
+    ledger.append([late])
+    assert_ledger_matches(league_id)
+
+    assert ledger.compact(league_id, now=datetime.utcnow() + timedelta(seconds=2)) == 1
+    assert_ledger_matches(league_id)
+
+
+def test_find_drift_reports_unrecorded_changes(app, league):
+    league_id, user_ids = league
+    open_ledger(league_id, user_ids)
+    db.get_collection('memberships').update_one(
+        {'league_id': league_id, 'user_id': user_ids[1]}, {'$inc': {'balance': 5.0}})
+
+    assert [(drift['user_id'], drift['ledger_balance']) for drift in ledger.find_drift(league_id)] \
+        == [(user_ids[1], 100.0)]
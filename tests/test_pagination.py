@@ -0,0 +1,50 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from database import db
+from models.bet import Bet
+from models.pagination import decode_cursor, encode_cursor, valid_cursor
+
+
+def test_cursor_round_trip():
+    value, object_id = datetime(2024, 5, 1, 12, 30, 15, 250000), ObjectId()
+    assert decode_cursor(encode_cursor(value, object_id)) == (value, object_id)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    base64.urlsafe_b64encode(b'2024-05-01T12:30:15|not-an-object-id').decode(),
+    base64.urlsafe_b64encode(b'yesterday|' + str(ObjectId()).encode()).decode(),
+    base64.urlsafe_b64encode(b'2024-05-01T12:30:15').decode(),
+])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    assert valid_cursor(cursor) is None
+
+
+def test_pages_across_equal_timestamps(app, league, ticket):
+    league_id, user_ids = league
+    placed_at = datetime(2024, 5, 1, 12, 0)
+    bet_ids = db.get_collection('bets').insert_many([
+        {'user_id': ObjectId(), 'league_id': league_id, 'ticket_id': ticket, 'amount': 1.0,
+         'selected_option': 'Home', 'odds': 2.0, 'potential_payout': 2.0, 'status': 'pending',
+         'placed_at': placed_at}
+        for _ in range(5)
+    ]).inserted_ids
+
+    pages, after = [], None
+    while True:
+        page = Bet.get_ticket_bets(ticket, limit=2, after=after)
+        pages.append([bet._id for bet in page])
+        after = page.next_cursor
+        if after is None:
+            break
+
+    # Ties on placed_at are broken by _id, so every bet appears exactly once
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted(bet_ids, reverse=True)
+
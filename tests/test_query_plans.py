@@ -0,0 +1,44 @@
+"""Query plans for every shape in schema.QUERY_SHAPES, on a real MongoDB.
+
+mongomock has no query planner, so these only run when MONGODB_TEST_URI names
+a database on a mongod that they may drop and re-create, e.g.
+
+    MONGODB_TEST_URI=mongodb://localhost:27017/friendbet_plans python -m pytest tests/test_query_plans.py
+"""
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from schema import BAD_STAGES, QUERY_SHAPES, explain_command, migrate, plan_stages
+
+
+@pytest.fixture(scope='module')
+def plan_db():
+    """A freshly migrated database on the mongod at MONGODB_TEST_URI"""
+    uri = os.environ.get('MONGODB_TEST_URI')
+    if not uri:
+        pytest.skip('MONGODB_TEST_URI is not set')
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f'no mongod at MONGODB_TEST_URI: {e}')
+
+    db = client.get_default_database('friendbet_query_plans')
+    client.drop_database(db.name)
+    migrate(db)
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+
+@pytest.mark.parametrize('name', list(QUERY_SHAPES))
+def test_query_shape_uses_an_index(plan_db, name):
+    collection, shape = QUERY_SHAPES[name]
+    explain = plan_db.command('explain', explain_command(collection, shape), verbosity='queryPlanner')
+    stages = list(plan_stages(explain.get('queryPlanner', explain)))
+
+    assert not BAD_STAGES.intersection(stages), ' <- '.join(stages)
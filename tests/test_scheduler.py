@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime, timedelta
+
+from background import ProcessThreads
+from database import db
+from models.ticket import Ticket
+from scheduler import LEASES, Lease, ticket_scheduler
+
+
+def test_due_tickets_are_closed_a_batch_at_a_time(app, league, monkeypatch):
+    league_id, user_ids = league
+    monkeypatch.setattr(Ticket, 'CLOSE_BATCH_SIZE', 2)
+    past, future = datetime.utcnow() - timedelta(minutes=1), datetime.utcnow() + timedelta(hours=1)
+
+    def insert(status, closes_at):
+        return db.get_collection('tickets').insert_one({
+            'league_id': league_id, 'title': 'Ticket', 'type': 'moneyline', 'options': [],
+            'status': status, 'created_by': user_ids[0], 'closes_at': closes_at}).inserted_id
+
+    due = [insert('open', past) for _ in range(5)]
+    later, resolved = insert('open', future), insert('resolved', past)
+
+    assert ticket_scheduler.close_due_tickets() == len(due)
+    statuses = {ticket['_id']: ticket['status'] for ticket in db.get_collection('tickets').find()}
+    assert {statuses[ticket_id] for ticket_id in due} == {'closed'}
+    assert (statuses[later], statuses[resolved]) == ('open', 'resolved')
+    assert db.get_collection('leagues').find_one({'_id': league_id})['version'] > 0
+
+
+def test_lease_is_taken_over_once_it_expires(app):
+    leader, standby = Lease('task', seconds=60), Lease('task', seconds=60)
+    assert leader.acquire()
+    assert not standby.acquire()
+    assert leader.acquire()  # Renewing
+
+    # The leader stopped renewing
+    db.get_collection(LEASES).update_one(
+        {'_id': 'task'}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    assert standby.acquire()
+    assert not leader.acquire()
+
+    standby.release()
+    assert leader.acquire()
+
+
+def test_dead_threads_are_restarted():
+    started = threading.Semaphore(0)
+    threads = ProcessThreads(started.release, 'short-lived', count=2)
+
+    threads.ensure_running()
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    for thread in threads._threads:
+        thread.join(5)
+    assert not threads.running()
+
+    threads.ensure_running()
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
@@ -0,0 +1,46 @@
+import mongomock
+import pytest
+from bson import ObjectId
+
+import schema
+from schema import migrate
+
+
+def test_migration_sets_aside_duplicate_bets():
+    db = mongomock.MongoClient().db
+    user_id, ticket_id = ObjectId(), ObjectId()
+    league_id = db.leagues.insert_one({
+        'name': 'Legacy', 'invite_code': 'LEGACY01',
+        'members': [{'user_id': user_id, 'username': 'user0', 'balance': 80.0}]
+    }).inserted_id
+    # The old read-then-insert race let the same bet through twice
+    first, pending, settled = (db.bets.insert_one({
+        'user_id': user_id, 'ticket_id': ticket_id, 'league_id': league_id,
+        'amount': 10.0, 'status': status, 'placed_at': placed_at
+    }).inserted_id for status, placed_at in (('pending', 1), ('pending', 2), ('lost', 3)))
+
+    migrate(db)
+
+    assert [bet['_id'] for bet in db.bets.find()] == [first]
+    assert {bet['_id'] for bet in db.duplicate_bets.find()} == {pending, settled}
+    # Only the pending duplicate's stake is refunded
+    assert db.memberships.find_one({'user_id': user_id})['balance'] == 90.0
+    assert db.ledger.find_one({'user_id': user_id})['amount'] == 90.0
+
+
+def test_member_move_fails_while_the_previous_release_writes(monkeypatch):
+    db = mongomock.MongoClient().db
+    member = {'user_id': ObjectId(), 'username': 'user0', 'balance': 100.0}
+    league_id = db.leagues.insert_one({'name': 'Legacy', 'members': [member]}).inserted_id
+    migrate(db, target=4)
+    move = schema._move_league_members
+
+    def move_then_old_save(db, league):
+        move(db, league)
+        # An old server's league.save() writes the array it read back
+        db.leagues.update_one({'_id': league_id}, {'$set': {'members': [dict(member, balance=90.0)]}})
+
+    monkeypatch.setattr(schema, '_move_league_members', move_then_old_save)
+    with pytest.raises(RuntimeError, match='previous release'):
+        migrate(db)
+    assert schema.get_schema_version(db) == 4
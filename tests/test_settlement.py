@@ -0,0 +1,41 @@
+from conftest import balances
+from database import db
+from models.bet import Bet
+from models.league import League
+
+
+def place_bets(league_id, user_ids, ticket):
+    """Every member stakes 10.0, alternating Home and Away"""
+    for i, user_id in enumerate(user_ids):
+        assert Bet.place(user_id, league_id, ticket, 10.0, ('Home', 'Away')[i % 2], 2.0)
+
+
+def test_settling_members_twice_pays_once(app, league, ticket):
+    league_id, user_ids = league
+    place_bets(league_id, user_ids, ticket)
+    groups = [{'status': 'won', 'amount': 20.0, 'user_ids': [user_ids[0], user_ids[2]]},
+              {'status': 'lost', 'amount': 0, 'user_ids': [user_ids[1]]}]
+
+    assert League.settle_members(league_id, ticket, groups)
+    settled = balances(league_id)
+    assert League.settle_members(league_id, ticket, groups)
+
+    assert balances(league_id) == settled
+    assert settled == {user_ids[0]: 110.0, user_ids[1]: 90.0, user_ids[2]: 110.0}
+    assert db.get_collection('ledger').count_documents({'kind': 'payout'}) == 2
+    member = db.get_collection('memberships').find_one({'user_id': user_ids[0]})
+    assert (member['won_bets'], member['pending_bets']) == (1, 0)
+
+
+def test_payout_skips_members_who_left(app, league, ticket):
+    league_id, user_ids = league
+    place_bets(league_id, user_ids, ticket)
+    league_model = League.get_by_id(league_id)
+    league_model.remove_member(user_ids[2])
+    league_model.save()
+
+    League.settle_members(league_id, ticket, [
+        {'status': 'won', 'amount': 20.0, 'user_ids': [user_ids[0], user_ids[2]]}])
+
+    payouts = db.get_collection('ledger').find({'kind': 'payout'})
+    assert [entry['user_id'] for entry in payouts] == [user_ids[0]]
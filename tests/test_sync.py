@@ -0,0 +1,71 @@
+from models.bet import Bet
+from models.league import League
+from models.ticket import Ticket
+
+
+def changes(client, league_id, kind, since=None):
+    url = {'tickets': '/tickets/api/{}/changes', 'bets': '/bets/api/{}/changes',
+           'members': '/leagues/api/{}/changes'}[kind].format(league_id)
+    response = client.get(url, query_string={} if since is None else {'since': since})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def ids(documents):
+    return {document.get('id') or document.get('_id') or document['user_id'] for document in documents}
+
+
+def test_changes_since_a_version(client, league, ticket):
+    league_id, user_ids = league
+    full = changes(client, league_id, 'tickets')
+    assert full['full'] and ids(full['tickets']) == {str(ticket)}
+    since = full['version']
+
+    bet = Bet.place(user_ids[0], league_id, ticket, 10.0, 'Home', 2.0)
+    assert Ticket.get_by_id(ticket).close_atomically()
+
+    bets = changes(client, league_id, 'bets', since)
+    assert not bets['full'] and ids(bets['bets']) == {str(bet._id)} and bets['deleted'] == []
+    tickets = changes(client, league_id, 'tickets', since)
+    assert [ticket_data['status'] for ticket_data in tickets['tickets']] == ['closed']
+    members = changes(client, league_id, 'members', since)
+    assert ids(members['members']) == {str(user_ids[0])}
+
+    # Nothing changed since the version the last response returned
+    since = members['version']
+    assert changes(client, league_id, 'bets', since)['bets'] == []
+    assert changes(client, league_id, 'tickets', since)['tickets'] == []
+
+
+def test_deletions_leave_tombstones(client, league, ticket):
+    league_id, user_ids = league
+    bet = Bet.place(user_ids[0], league_id, ticket, 10.0, 'Home', 2.0)
+    since = changes(client, league_id, 'bets')['version']
+
+    assert Bet.cancel(bet._id, user_ids[0])
+    league_model = League.get_by_id(league_id)
+    league_model.remove_member(user_ids[2])
+    league_model.save()
+
+    bets = changes(client, league_id, 'bets', since)
+    assert (bets['bets'], bets['deleted']) == ([], [str(bet._id)])
+    members = changes(client, league_id, 'members', since)
+    assert members['deleted'] == [str(user_ids[2])]
+    assert str(user_ids[2]) not in ids(members['members'])
+    # A full listing has no deletions to report
+    assert changes(client, league_id, 'bets')['deleted'] == []
+
+
+def test_stale_since_gets_a_full_listing(client, league, ticket):
+    league_id, user_ids = league
+    version = changes(client, league_id, 'tickets')['version']
+
+    stale = changes(client, league_id, 'tickets', version + 100)
+    assert stale['full'] and ids(stale['tickets']) == {str(ticket)}
+    members = changes(client, league_id, 'members', version + 100)
+    assert members['full'] and len(members['members']) == len(user_ids) + 1
+
+
+def test_since_must_be_a_version(client, league):
+    league_id, _ = league
+    assert client.get(f'/bets/api/{league_id}/changes?since=abc').status_code == 400